@@ -0,0 +1,96 @@
+"""
+Measure GET /resume/{key} latency with and without POST /resume streams in flight.
+
+    cd backend && python -m benchmarks.get_latency --streams 50 --gets 500
+
+Seeds one finished resume, times GETs on an idle server, then times the same GETs
+while many POST streams are following jobs that keep publishing progress. Any
+blocking call in a handler shows up as a loaded p99 far above the idle one.
+Exits non-zero if the loaded p99 is over --max-p99-ratio times the idle p99
+(with --min-p99-ms of slack for very fast idle runs).
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from benchmarks.harness import setup_env, install_stub_worker, summarize
+
+
+async def time_gets(client, key: str, requests: int, concurrency: int) -> list[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one() -> float:
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(f"/resume/{key}")
+            assert response.status_code == 200, response.text
+            return time.perf_counter() - start
+
+    return await asyncio.gather(*(one() for _ in range(requests)))
+
+
+async def run(app, args) -> tuple[list[float], list[float], int]:
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=120) as client:
+        # seed a finished resume to download
+        response = await client.post("/resume", data={"job_info": "Seed posting for GET latency"})
+        key = json.loads(response.text.rsplit("data: ", 1)[1])['key']
+
+        idle = await time_gets(client, key, args.gets, args.concurrency)
+
+        async def post(index: int) -> int:
+            async with client.stream("POST", "/resume", data={"job_info": f"Loaded posting {index}"}) as response:
+                return sum([len(chunk) async for chunk in response.aiter_text()])
+
+        streams = [asyncio.create_task(post(i)) for i in range(args.streams)]
+        await asyncio.sleep(args.warmup)
+        loaded = await time_gets(client, key, args.gets, args.concurrency)
+        still_streaming = sum(not stream.done() for stream in streams)
+        await asyncio.gather(*streams)
+
+    return idle, loaded, still_streaming
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=50, help="concurrent POST /resume streams")
+    parser.add_argument("--gets", type=int, default=500, help="GET requests per phase")
+    parser.add_argument("--concurrency", type=int, default=10, help="concurrent GET requests")
+    parser.add_argument("--job-seconds", type=float, default=5.0, help="simulated generation time")
+    parser.add_argument("--progress-interval", type=float, default=0.25, help="seconds between progress events per job")
+    parser.add_argument("--warmup", type=float, default=0.5, help="seconds to let the streams start")
+    parser.add_argument("--max-p99-ratio", type=float, default=3.0)
+    parser.add_argument("--min-p99-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    setup_env()
+    import tasks
+    import main as app_main
+
+    counter = {'generations': 0}
+    install_stub_worker(tasks, args.job_seconds, counter, progress_interval=args.progress_interval)
+
+    idle, loaded, still_streaming = asyncio.run(run(app_main.app, args))
+    idle_summary, loaded_summary = summarize(idle), summarize(loaded)
+
+    print(json.dumps({
+        'streams': args.streams,
+        'streams_active_after_gets': still_streaming,
+        'idle': idle_summary,
+        'loaded': loaded_summary,
+    }, indent=2))
+
+    budget_ms = max(idle_summary['p99_ms'] * args.max_p99_ratio, args.min_p99_ms)
+    if loaded_summary['p99_ms'] > budget_ms:
+        print(f"FAIL: loaded p99 {loaded_summary['p99_ms']:.1f}ms is over {budget_ms:.1f}ms")
+        return 1
+    print("OK: GET latency stays flat under streaming load")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+import statistics
+
+# benchmarks run from backend/ like the app itself
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def use_fake_redis() -> None:
+    """
+    Point every redis client the app creates at one in-process fakeredis server.
+    Must be called before importing main or tasks.
+    """
+    import fakeredis
+    import redis
+    import redis.asyncio
+
+    server = fakeredis.FakeServer()
+    redis.Redis.from_url = classmethod(lambda cls, *args, **kwargs: fakeredis.FakeRedis(server=server))
+    redis.asyncio.Redis.from_url = classmethod(lambda cls, *args, **kwargs: fakeredis.FakeAsyncRedis(server=server))
+    redis.asyncio.BlockingConnectionPool.from_url = classmethod(
+        lambda cls, *args, **kwargs: fakeredis.FakeAsyncRedis(server=server).connection_pool
+    )
+
+
+def setup_env(fake_redis: bool = True) -> None:
+    """
+    Environment the app asserts on at import time. No real API calls are made by benchmarks.
+    """
+    os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+    os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark-stub-key")
+    # benchmarks send far more requests per minute than one tenant may
+    os.environ.setdefault("TENANT_RATE_LIMIT", "1000000")
+    if fake_redis:
+        use_fake_redis()
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    """
+    Latency summary in milliseconds
+    """
+    return {
+        'count': len(samples),
+        'mean_ms': statistics.fmean(samples) * 1000 if samples else 0.0,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+    }
+
+
+def parse_sse(text: str) -> list[tuple[str, str]]:
+    """
+    (event, data) pairs of an SSE response body
+    """
+    events = []
+    for block in text.split("\n\n"):
+        event, data = None, []
+        for line in block.splitlines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data.append(line[len("data: "):])
+        if event:
+            events.append((event, "\n".join(data)))
+    return events
+
+
+def install_stub_worker(
+        tasks_module,
+        job_seconds: float,
+        counter: dict,
+        progress_interval: float | None = None
+    ) -> None:
+    """
+    Replace Celery with an in-process worker that "generates" a fixed PDF after job_seconds.
+    counter['generations'] counts how many jobs were actually started.
+    :param progress_interval: seconds between progress events while "generating", none if not given
+    """
+    def enqueue(key: str, job_info: str, token: str, profile=None, deadline_seconds=None) -> None:
+        counter['generations'] += 1
+
+        def run() -> None:
+            jobs = tasks_module.jobs
+            jobs.publish(key, 'progress', 'Generating AI resume...')
+            deadline = time.monotonic() + job_seconds
+            while progress_interval and time.monotonic() + progress_interval < deadline:
+                time.sleep(progress_interval)
+                jobs.publish(key, 'progress', 'Tailored experience: benchmark')
+            time.sleep(max(0.0, deadline - time.monotonic()))
+            pdf = b"%PDF-1.4 benchmark " + key.encode()
+            digest = tasks_module.tex_digest(key)
+            tasks_module.artifacts.put(digest, pdf)
+            tasks_module.r.set(key, json.dumps({'artifact': digest}), ex=tasks_module.RESULT_TTL_SECONDS)
+            jobs.publish(key, 'done', json.dumps({'key': key}))
+
+        threading.Thread(target=run, daemon=True).start()
+
+    # the web handlers queue jobs through job_queue
+    from resumecompiler import job_queue
+    job_queue.enqueue_resume_job = enqueue
+
+
+def install_pipeline_worker(tasks_module, ai_interface, compile_fn, loop) -> None:
+    """
+    Replace Celery with jobs run on the benchmark's event loop through the real
+    generation path (field populator, streaming parser, renderer), with the given
+    AI interface and compile_fn(tex_source, name) -> PDF bytes.
+    """
+    from resumecompiler.construct_latex import render_latex_resume
+    from resumecompiler.resume_field_populator import AIResumeFieldPopulator
+    from resumecompiler import metrics
+
+    async def run(key: str, job_info: str) -> None:
+        jobs = tasks_module.jobs
+        try:
+            jobs.set_state(key, 'generating')
+            jobs.publish(key, 'progress', 'Generating AI resume...')
+
+            def on_item(kind, index, item):
+                if kind == 'change':
+                    jobs.publish(key, 'progress', tasks_module.change_string(item))
+
+            tex_source, _ = await render_latex_resume(AIResumeFieldPopulator(ai_interface), job_info, on_item=on_item)
+            digest = tasks_module.tex_digest(tex_source)
+            if not tasks_module.artifacts.exists(digest):
+                jobs.set_state(key, 'compiling')
+                pdf_bytes = await compile_fn(tex_source, f"Resume_{key[:16]}")
+                with metrics.stage("artifact_write"):
+                    tasks_module.artifacts.put(digest, pdf_bytes)
+            tasks_module.r.set(key, json.dumps({'artifact': digest}), ex=tasks_module.RESULT_TTL_SECONDS)
+            jobs.publish(key, 'done', json.dumps({'key': key}))
+        except Exception as e:
+            jobs.publish(key, 'error', f'{e.__class__.__name__}: {e}')
+
+    def enqueue(key: str, job_info: str, token: str, profile=None, deadline_seconds=None) -> None:
+        # called from a worker thread by the web handlers
+        asyncio.run_coroutine_threadsafe(run(key, job_info), loop)
+
+    # the web handlers queue jobs through job_queue
+    from resumecompiler import job_queue
+    job_queue.enqueue_resume_job = enqueue
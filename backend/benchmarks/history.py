@@ -0,0 +1,122 @@
+"""
+Measure result history listing at scale, and how compact its records are.
+
+    cd backend && python -m benchmarks.history --records 200000 -n 50
+
+Fills one tenant's history (in fakeredis, or the Redis at REDIS_URL with --real-redis)
+with records built from the recorded responses in benchmarks/fixtures/responses.json,
+then times reading pages of GET /resumes from the newest records and from deep in the
+index, with and without full records. Exits non-zero if any p95 is over --max-ms.
+fakeredis runs in this process, so its numbers are several times slower than a real
+Redis (and its garbage collection pauses make p99 noisy), and filling it takes a minute
+or two at the default size.
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+from benchmarks.harness import setup_env, summarize
+from benchmarks.stub_ai import load_fixtures
+
+
+def fill(store, records: list, count: int, tenant: str) -> None:
+    """
+    Write count records laid out as HistoryStore.commit does, pipelined in chunks.
+    They expire after an hour, so a run against a real Redis cleans up after itself.
+    """
+    from resumecompiler.history import encode_record
+
+    start = time.time() - count
+    pipe = store.r.pipeline()
+    for i in range(count):
+        record = records[i % len(records)].model_copy(update={
+            'id': f"{i:016x}", 'key': f"{i:064x}", 'tenant': tenant, 'created': start + i,
+        })
+        pipe.set(store._record_key(record.id), encode_record(record), ex=3600)
+        pipe.zadd(store._index_key(tenant), {json.dumps(record.summary()): record.created})
+        if i % 5000 == 4999:
+            pipe.execute()
+    pipe.expire(store._index_key(tenant), 3600)
+    pipe.execute()
+
+
+async def time_pages(history, tenant: str, before: str | None, limit: int, full: bool, iterations: int) -> list[float]:
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        async for page in history.pages(tenant, before, limit):
+            if full:
+                await history.records([summary for _, summary in page])
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=200_000, help="records in the tenant's history")
+    parser.add_argument("--limit", type=int, default=50, help="records per page")
+    parser.add_argument("-n", "--iterations", type=int, default=200, help="pages read per scenario")
+    parser.add_argument("--max-ms", type=float, default=50.0, help="allowed p95 per page")
+    parser.add_argument("--real-redis", action="store_true", help="use the Redis at REDIS_URL instead of fakeredis")
+    args = parser.parse_args()
+
+    setup_env(fake_redis=not args.real_redis)
+    import os
+    import redis
+    import redis.asyncio
+    from resumecompiler.models import ResumeCustomizationResult
+    from resumecompiler.history import AsyncHistoryReader, HistoryRecord, HistoryStore, encode_record
+
+    store = HistoryStore(redis.Redis.from_url(os.getenv("REDIS_URL")), prefix="benchmark-history")
+    history = AsyncHistoryReader(redis.asyncio.Redis.from_url(os.getenv("REDIS_URL")), prefix="benchmark-history")
+    tenant = "benchmark"
+
+    records = []
+    for fixture in load_fixtures():
+        result = ResumeCustomizationResult.model_validate(fixture["result"])
+        records.append(HistoryRecord(
+            id="", key="", tenant=tenant, created=0.0, retention="standard",
+            job_info=fixture["job_info"], resume=result.resume, changelog=result.changelog, artifact="0" * 64,
+        ))
+    raw_bytes = sum(len(record.model_dump_json()) for record in records)
+    stored_bytes = sum(len(encode_record(record)) for record in records)
+
+    async def run() -> dict:
+        store.r.delete(store._index_key(tenant))
+        start = time.perf_counter()
+        fill(store, records, args.records, tenant)
+        fill_seconds = time.perf_counter() - start
+
+        middle = repr(time.time() - args.records / 2)
+        scenarios = {}
+        for name, before, full in (
+            ("newest", None, False),
+            ("newest_full", None, True),
+            ("middle", middle, False),
+            ("middle_full", middle, True),
+        ):
+            scenarios[name] = summarize(await time_pages(history, tenant, before, args.limit, full, args.iterations))
+        return {'fill_seconds': fill_seconds, 'scenarios': scenarios}
+
+    report = {
+        'records': args.records,
+        'limit': args.limit,
+        'bytes_per_record': {'json': raw_bytes / len(records), 'stored': stored_bytes / len(records)},
+        **asyncio.run(run()),
+    }
+    print(json.dumps(report, indent=2))
+
+    worst = max(scenario['p95_ms'] for scenario in report['scenarios'].values())
+    ratio = stored_bytes / raw_bytes
+    if worst > args.max_ms:
+        print(f"FAIL: slowest page p95 {worst:.2f}ms (max {args.max_ms}ms)")
+        return 1
+    print(f"OK: pages of {args.limit} out of {args.records} records in p95 {worst:.2f}ms or less, "
+          f"records stored at {ratio:.0%} of their JSON size")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
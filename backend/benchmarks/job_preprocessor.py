@@ -0,0 +1,86 @@
+"""
+Measure how much the job posting preprocessor shrinks postings, and what it costs per request.
+
+    cd backend && python -m benchmarks.job_preprocessor -n 200
+
+Runs compact_job_info over the postings in benchmarks/fixtures/postings.json (written to
+look like copies of LinkedIn, Greenhouse, Workday, Lever, Handshake and Indeed pages, with
+their page chrome and boilerplate) and the ones in benchmarks/fixtures/responses.json. Tokens are estimated at
+CHARS_PER_TOKEN characters each. Exits non-zero if the corpus shrinks by less than
+--min-reduction or the p99 preprocessing time is over --max-ms.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+from benchmarks.harness import summarize
+from benchmarks.stub_ai import load_fixtures
+
+
+POSTINGS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "postings.json")
+
+
+def load_postings(path: str = POSTINGS_PATH) -> list[dict]:
+    """
+    [{"name", "job_info"}] of the posting corpus and the recorded responses' postings
+    """
+    with open(path) as f:
+        postings = json.load(f)
+    return postings + [{"name": f["name"], "job_info": f["job_info"]} for f in load_fixtures()]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--iterations", type=int, default=200, help="runs per posting")
+    parser.add_argument("--max-tokens", type=int, help="token budget, JOB_INFO_MAX_TOKENS by default")
+    parser.add_argument("--min-reduction", type=float, default=0.3, help="required share of tokens removed")
+    parser.add_argument("--max-ms", type=float, default=5.0, help="allowed p99 per posting")
+    parser.add_argument("--show", action="store_true", help="print each compacted posting")
+    args = parser.parse_args()
+
+    from resumecompiler.job_preprocessor import compact_job_info, estimate_tokens
+
+    report = {'postings': {}}
+    all_latencies = []
+    raw_total = compacted_total = 0
+    for posting in load_postings():
+        latencies = []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            compacted = compact_job_info(posting["job_info"], args.max_tokens)
+            latencies.append(time.perf_counter() - start)
+        all_latencies += latencies
+
+        raw, kept = estimate_tokens(posting["job_info"]), estimate_tokens(compacted)
+        raw_total += raw
+        compacted_total += kept
+        report['postings'][posting["name"]] = {
+            'raw_tokens': raw,
+            'compacted_tokens': kept,
+            'reduction': 1 - kept / raw if raw else 0.0,
+            'p50_ms': summarize(latencies)['p50_ms'],
+        }
+        if args.show:
+            print(f"===== {posting['name']} ({raw} -> {kept} tokens)\n{compacted}\n")
+
+    reduction = 1 - compacted_total / raw_total
+    report['total'] = {
+        'raw_tokens': raw_total,
+        'compacted_tokens': compacted_total,
+        'reduction': reduction,
+        **summarize(all_latencies),
+    }
+    print(json.dumps(report, indent=2))
+
+    p99 = report['total']['p99_ms']
+    if reduction < args.min_reduction or p99 > args.max_ms:
+        print(f"FAIL: {reduction:.0%} fewer tokens (need {args.min_reduction:.0%}), p99 {p99:.2f}ms (max {args.max_ms}ms)")
+        return 1
+    print(f"OK: {reduction:.0%} fewer tokens ({raw_total} -> {compacted_total}), p99 {p99:.2f}ms per posting")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Compare generation latency through the model router with calling the primary model directly,
+against a local stub Anthropic server whose primary model is sometimes slow, 429s or 529s.
+
+    cd backend && python -m benchmarks.model_router -n 200 -c 20
+
+"direct" is AnthropicAIInterface on Sonnet 4 with the SDK's own retries. "routed" is
+ModelRouter with Sonnet 4 as primary, hedging with Haiku after --hedge-after seconds.
+Exits non-zero if the routed p99 isn't below the direct p99, or if any routed request failed.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import contextlib
+
+from benchmarks.harness import setup_env, summarize
+
+
+async def run_mode(generate, requests: int, concurrency: int) -> tuple[list[float], int]:
+    """
+    :return: (latencies of successful requests, failure count)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = 0
+
+    async def one(i: int) -> float | None:
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await generate(f"Backend SWE intern posting {i}")
+            except Exception:
+                failures += 1
+                return None
+            return time.perf_counter() - start
+
+    latencies = await asyncio.gather(*(one(i) for i in range(requests)))
+    return [latency for latency in latencies if latency is not None], failures
+
+
+async def run(args) -> dict:
+    from resumecompiler.claude_interface import AnthropicAIInterface
+    from resumecompiler.model_router import MODEL_REQUESTS, ModelRouter, stats_summary
+    from resumecompiler.resume_repository import get_resume_repository
+
+    base_resume = get_resume_repository().get().resume
+    direct = AnthropicAIInterface(model=args.model)
+
+    async def generate_direct(job_info: str) -> None:
+        await direct.generate_customized_resume(base_resume, job_info)
+
+    async def generate_routed(job_info: str) -> None:
+        router = ModelRouter(args.model, deadline_seconds=args.deadline, hedge_after=args.hedge_after)
+        await router.generate_customized_resume(base_resume, job_info)
+
+    report = {}
+    for name, generate in (("direct", generate_direct), ("routed", generate_routed)):
+        start = time.perf_counter()
+        latencies, failures = await run_mode(generate, args.requests, args.concurrency)
+        report[name] = {
+            **summarize(latencies),
+            'max_ms': max(latencies, default=0.0) * 1000,
+            'failures': failures,
+            'wall_seconds': time.perf_counter() - start,
+        }
+    report['model_stats'] = stats_summary()
+    report['model_requests'] = MODEL_REQUESTS.drain()
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--requests", type=int, default=200, help="generations per mode")
+    parser.add_argument("-c", "--concurrency", type=int, default=20)
+    parser.add_argument("--model", default="claude-sonnet-4-20250514", help="primary model")
+    parser.add_argument("--hedge-after", type=float, default=1.0, help="seconds before hedging")
+    parser.add_argument("--deadline", type=float, default=3.0, help="latency budget passed to the router")
+    parser.add_argument("--config", help="stub server behavior, see benchmarks.stub_anthropic_server")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own output")
+    args = parser.parse_args()
+
+    from benchmarks.stub_anthropic_server import create_app, parse_config, start_in_thread
+    base_url, server = start_in_thread(create_app(parse_config(args.config), args.seed))
+    os.environ["ANTHROPIC_BASE_URL"] = base_url
+    setup_env(fake_redis=False)
+
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+            report = asyncio.run(run(args))
+    finally:
+        server.should_exit = True
+    print(json.dumps(report, indent=2))
+
+    direct, routed = report['direct'], report['routed']
+    if routed['failures'] or routed['p99_ms'] >= direct['p99_ms']:
+        print(
+            f"FAIL: routed p99 {routed['p99_ms']:.0f}ms ({routed['failures']} failures) "
+            f"vs direct p99 {direct['p99_ms']:.0f}ms ({direct['failures']} failures)"
+        )
+        return 1
+    print(f"OK: routed p99 {routed['p99_ms']:.0f}ms vs direct p99 {direct['p99_ms']:.0f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""
+Offline benchmark of the resume pipeline, with a stub LLM replaying recorded fixtures.
+
+    cd backend && python -m benchmarks.pipeline --levels 1,8,32
+    python -m benchmarks.pipeline --save-baseline benchmarks/baseline.json
+
+Scenarios, each run at every concurrency level:
+  construct  construct_latex_resume with the stub AI interface
+  compile    compile_latex_async on the constructed .tex files (skipped without pdflatex)
+  endpoint   POST /resume until 'done', then GET /resume/{key}, on fakeredis with jobs
+             run in-process through the real generation path (stubbed compile without pdflatex)
+
+Reports throughput, p50/p95/p99 per scenario and per pipeline stage (from the
+resume_stage_seconds observations), and the tracemalloc peak of a second pass.
+Compares against --baseline (benchmarks/baseline.json if it exists) and exits
+non-zero when a scenario's p95, throughput or peak memory is worse than the
+baseline by more than --tolerance.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.harness import setup_env, install_pipeline_worker, parse_sse, summarize
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+class StageRecorder:
+    """
+    Keeps every resume_stage_seconds observation, for exact per-stage percentiles.
+    """
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.samples: dict[str, list[float]] = {}
+        self._observe = histogram.observe
+
+    def __enter__(self):
+        def observe(value, **labels):
+            self.samples.setdefault(labels.get("stage", ""), []).append(value)
+            self._observe(value, **labels)
+        self.histogram.observe = observe
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe = self._observe
+
+
+async def run_concurrently(op, first: int, total: int, concurrency: int) -> tuple[list[float], float]:
+    """
+    Run op(i) for i in range(first, first + total), at most concurrency at a time.
+    :return: (latency of each op, wall-clock seconds)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> float:
+        async with semaphore:
+            start = time.perf_counter()
+            await op(i)
+            return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(one(i) for i in range(first, first + total)))
+    return list(latencies), time.perf_counter() - start
+
+
+async def measure(name: str, op, total: int, concurrency: int, metrics_module, verbose: bool = False) -> dict:
+    # the pipeline's progress prints would swamp the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if verbose else devnull):
+        with StageRecorder(metrics_module.STAGE_SECONDS) as recorder:
+            latencies, wall = await run_concurrently(op, 0, total, concurrency)
+
+        # second pass for memory, tracemalloc slows everything down too much to time with it on.
+        # It gets its own indices, so ops can use them to avoid cached results from the first pass
+        tracemalloc.start()
+        await run_concurrently(op, total, total, concurrency)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    result = {
+        'scenario': name,
+        'concurrency': concurrency,
+        'throughput_per_s': total / wall,
+        **summarize(latencies),
+        'peak_kb': peak / 1024,
+        'stages': {stage: summarize(samples) for stage, samples in sorted(recorder.samples.items())},
+    }
+    print(
+        f"{name:<10} c={concurrency:<4} {result['throughput_per_s']:>8.1f}/s  "
+        f"p50 {result['p50_ms']:>8.1f}ms  p95 {result['p95_ms']:>8.1f}ms  "
+        f"p99 {result['p99_ms']:>8.1f}ms  peak {result['peak_kb']:>8.0f}KB"
+    )
+    return result
+
+
+async def run(args) -> list[dict]:
+    import httpx
+    import tasks
+    import main as app_main
+    from resumecompiler import metrics
+    from resumecompiler.construct_latex import compile_latex_async, compile_latex_source_async, construct_latex_resume
+    from resumecompiler.latex_pool import close_compile_pool
+    from resumecompiler.resume_field_populator import AIResumeFieldPopulator
+    from benchmarks.stub_ai import StubAIInterface, load_fixtures
+
+    fixtures = load_fixtures()
+    ai = StubAIInterface(fixtures, args.first_token_seconds, args.tokens_per_second)
+    has_pdflatex = shutil.which("pdflatex") is not None and not args.stub_compile
+
+    async def stub_compile(tex_source: str, name: str) -> bytes:
+        with metrics.stage("compile"):
+            await asyncio.sleep(args.compile_seconds)
+        return b"%PDF-1.4 benchmark " + name.encode()
+
+    install_pipeline_worker(
+        tasks, ai,
+        compile_latex_source_async if has_pdflatex else stub_compile,
+        asyncio.get_running_loop()
+    )
+
+    def posting(i: int, run_id: str) -> str:
+        # unique text per request, so no request is answered from the result cache
+        return f"{fixtures[i % len(fixtures)]['job_info']}\n\nRequisition {run_id}-{i}"
+
+    results = []
+    work_dir = tempfile.mkdtemp(prefix="resume-bench-")
+    transport = httpx.ASGITransport(app=app_main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=300) as client:
+            for level in args.levels:
+                total = max(args.requests, level)
+                tex_paths = {}
+
+                async def construct(i: int) -> None:
+                    name = f"bench_{level}_{i}.tex"
+                    path, _ = await construct_latex_resume(AIResumeFieldPopulator(ai), posting(i, "c"), name)
+                    tex_paths[i] = path
+
+                results.append(await measure("construct", construct, total, level, metrics, args.verbose))
+
+                if has_pdflatex:
+                    async def compile_one(i: int) -> None:
+                        await compile_latex_async(tex_paths[i], work_dir)
+                    results.append(await measure("compile", compile_one, total, level, metrics, args.verbose))
+                for path in tex_paths.values():
+                    os.remove(path)
+
+                async def endpoint(i: int) -> None:
+                    response = await client.post("/resume", data={"job_info": posting(i, f"e{level}")})
+                    event, data = parse_sse(response.text)[-1]
+                    assert event == 'done', data
+                    pdf = await client.get(f"/resume/{json.loads(data)['key']}")
+                    assert pdf.status_code == 200
+
+                results.append(await measure("endpoint", endpoint, total, level, metrics, args.verbose))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        await close_compile_pool()
+    return results
+
+
+def compare(results: list[dict], baseline: dict, tolerance: float, slack_ms: float) -> list[str]:
+    """
+    :return: one message per regression against the baseline
+    """
+    regressions = []
+    base_by_key = {(b['scenario'], b['concurrency']): b for b in baseline['results']}
+    for result in results:
+        base = base_by_key.get((result['scenario'], result['concurrency']))
+        if base is None:
+            continue
+        label = f"{result['scenario']} c={result['concurrency']}"
+        if result['p95_ms'] > base['p95_ms'] * (1 + tolerance) + slack_ms:
+            regressions.append(f"{label}: p95 {result['p95_ms']:.1f}ms vs baseline {base['p95_ms']:.1f}ms")
+        if result['throughput_per_s'] < base['throughput_per_s'] * (1 - tolerance):
+            regressions.append(
+                f"{label}: throughput {result['throughput_per_s']:.1f}/s vs baseline {base['throughput_per_s']:.1f}/s"
+            )
+        if result['peak_kb'] > base['peak_kb'] * (1 + tolerance) + 1024:
+            regressions.append(f"{label}: peak memory {result['peak_kb']:.0f}KB vs baseline {base['peak_kb']:.0f}KB")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("-n", "--requests", type=int, default=32, help="operations per scenario and level")
+    parser.add_argument("--first-token-seconds", type=float, default=0.05, help="stub LLM time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=10000, help="stub LLM streaming rate")
+    parser.add_argument("--compile-seconds", type=float, default=0.2, help="stubbed compile time without pdflatex")
+    parser.add_argument("--stub-compile", action="store_true", help="stub the compile even if pdflatex is installed")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", help="write this run's results as a new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed relative regression")
+    parser.add_argument("--slack-ms", type=float, default=5.0, help="allowed absolute p95 regression")
+    parser.add_argument("--json", help="also write the full results (with per-stage percentiles) here")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own output")
+    args = parser.parse_args()
+    args.levels = [int(level) for level in args.levels.split(",")]
+
+    setup_env()
+    results = asyncio.run(run(args))
+
+    print("\nPer-stage p50 / p95 / p99 (ms) at the highest concurrency level:")
+    for result in results:
+        if result['concurrency'] != args.levels[-1]:
+            continue
+        for stage, summary in result['stages'].items():
+            print(
+                f"  {result['scenario']:<10} {stage:<16} "
+                f"{summary['p50_ms']:>8.2f} {summary['p95_ms']:>8.2f} {summary['p99_ms']:>8.2f}"
+            )
+
+    report = {
+        'settings': {k: v for k, v in vars(args).items() if k not in ('baseline', 'save_baseline', 'json', 'verbose')},
+        'results': results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved baseline to {args.save_baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}, run with --save-baseline to create one.")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline['settings'] != report['settings']:
+        print("\nWARNING: baseline was recorded with different settings, comparison may not be meaningful.")
+
+    regressions = compare(results, baseline, args.tolerance, args.slack_ms)
+    if regressions:
+        print("\nFAIL: regressions against baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("\nOK: no regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
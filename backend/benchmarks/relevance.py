@@ -0,0 +1,100 @@
+"""
+Measure how much the relevance scorer narrows what the model may edit, and what ranking costs.
+
+    cd backend && python -m benchmarks.relevance -n 200
+
+Ranks static/base_resume.json against the postings of benchmarks.job_preprocessor (compacted
+first, as the server does) and compares the fields the model may edit with and without
+focusing, and the uncached prompt tokens the list of focused fields adds. The resume itself
+stays in the cached part of the prompt either way. Postings that would skip the model are
+listed. Exits non-zero if the editable fields shrink by less than --min-reduction or the
+p99 ranking time is over --max-ms.
+"""
+import sys
+import json
+import time
+import argparse
+
+from benchmarks.harness import summarize
+from benchmarks.job_preprocessor import load_postings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--iterations", type=int, default=200, help="rankings per posting")
+    parser.add_argument("--resume", default="base_resume", help="base resume in static/")
+    parser.add_argument("--min-reduction", type=float, default=0.4, help="required share of editable fields removed")
+    parser.add_argument("--max-ms", type=float, default=5.0, help="allowed p99 per ranking")
+    parser.add_argument("--show", action="store_true", help="print the focused fields of each posting")
+    args = parser.parse_args()
+
+    from resumecompiler.job_preprocessor import compact_job_info, estimate_tokens
+    from resumecompiler.relevance import RELEVANCE_MIN_SCORE, RelevanceIndex, reorder_skills
+    from resumecompiler.resume_patch import addressed_fields
+    from resumecompiler.claude_interface import focus_prompt
+    from resumecompiler.resume_repository import ResumeRepository
+
+    resume = ResumeRepository().get(args.resume).resume
+    start = time.perf_counter()
+    index = RelevanceIndex(resume)
+    build_ms = (time.perf_counter() - start) * 1000
+    # bullets and project skill lines, what a focus picks from
+    full_fields = sum(1 for item in index.items if item.kind != "skill")
+
+    report = {'index_build_ms': build_ms, 'postings': {}}
+    all_latencies = []
+    full_total = focused_total = focus_tokens = 0
+    skipped = []
+    for posting in load_postings():
+        job_info = compact_job_info(posting["job_info"])
+        latencies = []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            # bypass the memo so every iteration really ranks
+            ranking = index._rank(job_info)
+            latencies.append(time.perf_counter() - start)
+        all_latencies += latencies
+
+        skip = ranking.best_score() < RELEVANCE_MIN_SCORE
+        focus = ranking.focus()
+        focused = 0 if skip else len(focus)
+        tokens = 0 if skip or not focus else estimate_tokens(focus_prompt.format(paths="\n".join(sorted(focus))))
+        full_total += full_fields
+        focused_total += focused
+        focus_tokens += tokens
+        if skip:
+            skipped.append(posting["name"])
+        report['postings'][posting["name"]] = {
+            'best_score': round(ranking.best_score(), 2),
+            'skipped': skip,
+            'editable_fields': focused,
+            'focus_tokens': tokens,
+            'skill_reorders': len(reorder_skills(resume, ranking)[1]),
+            'p50_ms': summarize(latencies)['p50_ms'],
+        }
+        if args.show:
+            print(f"===== {posting['name']} ({'skipped' if skip else f'{full_fields} -> {focused} fields'})")
+            print(addressed_fields(resume, focus) if not skip else "", end="\n\n")
+
+    reduction = 1 - focused_total / full_total
+    report['total'] = {
+        'full_fields': full_total,
+        'editable_fields': focused_total,
+        'focus_tokens': focus_tokens,
+        'reduction': reduction,
+        'skipped': skipped,
+        **summarize(all_latencies),
+    }
+    print(json.dumps(report, indent=2))
+
+    p99 = report['total']['p99_ms']
+    if reduction < args.min_reduction or p99 > args.max_ms:
+        print(f"FAIL: {reduction:.0%} fewer editable fields (need {args.min_reduction:.0%}), p99 {p99:.2f}ms (max {args.max_ms}ms)")
+        return 1
+    print(f"OK: {reduction:.0%} fewer editable fields ({full_total} -> {focused_total}), "
+          f"{len(skipped)} postings skip the model, p99 {p99:.2f}ms per ranking")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""
+Fire N identical concurrent POST /resume requests and check that exactly one job runs.
+
+    cd backend && python -m benchmarks.single_flight -n 50
+
+Uses an in-process fakeredis server and a stub worker, so no Redis, Celery or
+Anthropic API is needed. Exits non-zero if more (or less) than one generation ran.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from benchmarks.harness import setup_env, install_stub_worker, parse_sse, summarize
+
+
+async def fire(app, requests: int, job_info: str) -> tuple[list[float], list[str]]:
+    import httpx
+
+    async def one(client: httpx.AsyncClient) -> tuple[float, str | None]:
+        start = time.perf_counter()
+        response = await client.post("/resume", data={"job_info": job_info})
+        events = parse_sse(response.text)
+        key = json.loads(events[-1][1])['key'] if events and events[-1][0] == 'done' else None
+        return time.perf_counter() - start, key
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+        results = await asyncio.gather(*(one(client) for _ in range(requests)))
+    return [latency for latency, _ in results], [key for _, key in results]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--requests", type=int, default=50, help="concurrent identical requests")
+    parser.add_argument("--job-seconds", type=float, default=1.0, help="simulated generation time")
+    args = parser.parse_args()
+
+    setup_env()
+    import tasks
+    import main as app_main
+
+    counter = {'generations': 0}
+    install_stub_worker(tasks, args.job_seconds, counter)
+
+    latencies, keys = asyncio.run(fire(app_main.app, args.requests, "Backend SWE intern, Python, Redis"))
+    completed = sum(key is not None for key in keys)
+
+    print(json.dumps({
+        'requests': args.requests,
+        'completed': completed,
+        'distinct_keys': len(set(keys) - {None}),
+        'generations': counter['generations'],
+        'latency': summarize(latencies),
+    }, indent=2))
+
+    if counter['generations'] != 1 or completed != args.requests:
+        print(f"FAIL: expected 1 generation for {args.requests} identical requests, got {counter['generations']}")
+        return 1
+    print("OK: single generation")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Measure cold start of the web server and worker processes: import time and time to first response.
+
+    cd backend && python -m benchmarks.startup -n 5
+
+Starts fresh interpreters (with -X importtime) that import main, as uvicorn does, or tasks,
+as a Celery worker does, against fakeredis. The web server then answers a first
+GET /tenants/default, which loads the default base resume and template. Reports the median
+of each, the packages that took longest to import and whether each role loaded the LLM SDK.
+fakeredis and the benchmark harness are imported before timing starts. Exits non-zero if
+the web server imports the worker code or the SDK, or its median time to first response is
+over --max-ms.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from collections import defaultdict
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# written to stderr once the harness is set up, so only the app's imports are profiled
+MARKER = "startup-benchmark-imports"
+
+CHILD = f"""
+import sys, time, json
+from benchmarks.harness import setup_env
+setup_env()
+print("{MARKER}", file=sys.stderr, flush=True)
+start = time.perf_counter()
+role = sys.argv[1]
+module = __import__("main" if role == "web" else "tasks")
+imported = time.perf_counter()
+first_response = None
+if role == "web":
+    import asyncio
+    import httpx
+
+    async def first_request():
+        transport = httpx.ASGITransport(app=module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            (await client.get("/tenants/default")).raise_for_status()
+
+    asyncio.run(first_request())
+    first_response = time.perf_counter()
+print(json.dumps({{
+    'import_ms': (imported - start) * 1000,
+    'first_response_ms': (first_response - start) * 1000 if first_response else None,
+    'sdk_loaded': 'anthropic' in sys.modules,
+    'worker_loaded': 'tasks' in sys.modules,
+}}))
+"""
+
+
+def parse_importtime(stderr: str) -> dict[str, float]:
+    """
+    Milliseconds spent importing each top level package, from -X importtime output
+    """
+    packages = defaultdict(float)
+    for line in stderr.split(MARKER, 1)[-1].splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        packages[name.strip().split(".")[0]] += int(self_us) / 1000
+    return packages
+
+
+def run_role(role: str) -> tuple[dict, dict[str, float]]:
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD, role],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    return json.loads(process.stdout.strip().splitlines()[-1]), parse_importtime(process.stderr)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--iterations", type=int, default=5, help="cold starts per role")
+    parser.add_argument("--top", type=int, default=8, help="slowest packages to list per role")
+    parser.add_argument("--max-ms", type=float, default=2000.0, help="allowed median web time to first response")
+    args = parser.parse_args()
+
+    report = {}
+    for role in ("web", "worker"):
+        runs, packages = [], defaultdict(list)
+        for _ in range(args.iterations):
+            result, imports = run_role(role)
+            runs.append(result)
+            for package, ms in imports.items():
+                packages[package].append(ms)
+        slowest = sorted(packages, key=lambda package: -statistics.median(packages[package]))[:args.top]
+        report[role] = {
+            'import_ms': statistics.median(run['import_ms'] for run in runs),
+            'first_response_ms': statistics.median(run['first_response_ms'] for run in runs)
+                if role == "web" else None,
+            'sdk_loaded': any(run['sdk_loaded'] for run in runs),
+            'worker_loaded': any(run['worker_loaded'] for run in runs),
+            'slowest_imports_ms': {package: statistics.median(packages[package]) for package in slowest},
+        }
+    print(json.dumps(report, indent=2))
+
+    web = report['web']
+    if web['sdk_loaded'] or web['worker_loaded']:
+        print("FAIL: the web server imports the LLM SDK or the worker tasks")
+        return 1
+    if web['first_response_ms'] > args.max_ms:
+        print(f"FAIL: web server answered after {web['first_response_ms']:.0f}ms (max {args.max_ms:.0f}ms)")
+        return 1
+    print(f"OK: web server imports in {web['import_ms']:.0f}ms and answers after {web['first_response_ms']:.0f}ms, "
+          f"worker imports in {report['worker']['import_ms']:.0f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+import os
+import json
+import asyncio
+import hashlib
+
+from resumecompiler.models import *
+from resumecompiler.stream_parser import StreamingResultParser
+
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "responses.json")
+
+# rough size of one streamed token, used to turn tokens/s into chunk timing
+CHARS_PER_TOKEN = 4
+
+
+def load_fixtures(path: str = FIXTURES_PATH) -> list[dict]:
+    """
+    Recorded postings and the ResumeCustomizationResult generated for each:
+    [{"name", "job_info", "result"}]
+    """
+    with open(path) as f:
+        return json.load(f)
+
+
+class StubAIInterface(BaseAIInterface):
+    """
+    Deterministic stand-in for the Anthropic interface. Replays a recorded result,
+    streaming its JSON through the same parser as real responses so on_item fires
+    the same way, after a fixed time to first token and at a fixed token rate.
+    Postings without a recording get the one picked by a hash of their text.
+    """
+
+    def __init__(
+            self,
+            fixtures: list[dict] | None = None,
+            first_token_seconds: float = 0.05,
+            tokens_per_second: float = 2000,
+            chunk_tokens: int = 8
+        ):
+        fixtures = fixtures if fixtures is not None else load_fixtures()
+        self.results = [ResumeCustomizationResult.model_validate(f["result"]) for f in fixtures]
+        self.by_job_info = {f["job_info"]: result for f, result in zip(fixtures, self.results)}
+        self.first_token_seconds = first_token_seconds
+        self.chunk_chars = chunk_tokens * CHARS_PER_TOKEN
+        self.chunk_seconds = chunk_tokens / tokens_per_second if tokens_per_second else 0.0
+        self.calls = 0
+
+    def pick(self, job_info: str) -> ResumeCustomizationResult:
+        result = self.by_job_info.get(job_info)
+        if result is None:
+            index = int(hashlib.sha256(job_info.encode('utf-8')).hexdigest(), 16) % len(self.results)
+            result = self.results[index]
+        return result
+
+    async def generate_customized_resume(
+            self,
+            base_resume: Resume,
+            job_info: str,
+            on_item: ItemCallback | None = None
+        ) -> ResumeCustomizationResult:
+        self.calls += 1
+        text = self.pick(job_info).model_dump_json()
+        parser = StreamingResultParser(on_item)
+
+        await asyncio.sleep(self.first_token_seconds)
+        for i in range(0, len(text), self.chunk_chars):
+            parser.feed(text[i:i + self.chunk_chars])
+            if self.chunk_seconds:
+                await asyncio.sleep(self.chunk_seconds)
+        return ResumeCustomizationResult.model_validate_json(parser.text)
+
+    def name(self) -> str:
+        return "Stub AI Interface (recorded fixtures)"
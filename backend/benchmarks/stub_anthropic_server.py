@@ -0,0 +1,143 @@
+"""
+Local stand-in for the Anthropic Messages API, for exercising the model router.
+
+    cd backend && python -m benchmarks.stub_anthropic_server --port 8765
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8765 ...
+
+Each model's behavior (delays, share of slow responses, 429s and 529s) is configurable
+with --config, a JSON object of model -> ModelBehavior fields. Responses are streamed
+like the real API and are valid (empty) results in both patch and full mode.
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+from dataclasses import dataclass, fields
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class ModelBehavior:
+    first_token_seconds: float = 0.2
+    stream_seconds: float = 0.3
+    # share of responses whose first token takes slow_seconds instead
+    slow_rate: float = 0.0
+    slow_seconds: float = 5.0
+    # share of requests rejected with 429 rate_limit_error / 529 overloaded_error
+    rate_limit_rate: float = 0.0
+    overload_rate: float = 0.0
+
+
+DEFAULT_BEHAVIOR = {
+    "claude-sonnet-4-20250514": ModelBehavior(0.3, 0.5, slow_rate=0.1, slow_seconds=6.0, rate_limit_rate=0.1, overload_rate=0.05),
+    "claude-3-5-haiku-20241022": ModelBehavior(0.15, 0.25),
+}
+
+
+def parse_config(config: str | None) -> dict[str, ModelBehavior]:
+    if not config:
+        return dict(DEFAULT_BEHAVIOR)
+    names = {f.name for f in fields(ModelBehavior)}
+    return {
+        model: ModelBehavior(**{k: v for k, v in values.items() if k in names})
+        for model, values in json.loads(config).items()
+    }
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _error(status: int, error_type: str, message: str) -> JSONResponse:
+    return JSONResponse({"type": "error", "error": {"type": error_type, "message": message}}, status_code=status)
+
+
+def create_app(behaviors: dict[str, ModelBehavior], seed: int | None = None) -> FastAPI:
+    app = FastAPI()
+    rng = random.Random(seed)
+    app.state.requests = {}
+
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        body = await request.json()
+        model = body["model"]
+        behavior = behaviors.get(model, ModelBehavior())
+        app.state.requests[model] = app.state.requests.get(model, 0) + 1
+
+        roll = rng.random()
+        if roll < behavior.rate_limit_rate:
+            return _error(429, "rate_limit_error", f"{model} is rate limited")
+        if roll < behavior.rate_limit_rate + behavior.overload_rate:
+            return _error(529, "overloaded_error", f"{model} is overloaded")
+        slow = rng.random() < behavior.slow_rate
+
+        system = "".join(block["text"] for block in body.get("system", []))
+        text = '{"edits": []}' if '"edits"' in system else '{"resume": null, "changelog": []}'
+        if text.startswith('{"resume"'):
+            # full mode must echo the resume, take it from the prompt
+            resume = body["messages"][0]["content"][0]["text"].split("(in JSON format):", 1)[1]
+            resume = resume.split("Here are the constraints", 1)[0].strip()
+            text = json.dumps({"resume": json.loads(resume), "changelog": []})
+
+        async def stream():
+            await asyncio.sleep(behavior.slow_seconds if slow else behavior.first_token_seconds)
+            yield _sse("message_start", {"type": "message_start", "message": {
+                "id": f"msg_stub_{time.time_ns()}", "type": "message", "role": "assistant", "model": model,
+                "content": [], "stop_reason": None, "stop_sequence": None,
+                "usage": {"input_tokens": 100, "output_tokens": 1},
+            }})
+            yield _sse("content_block_start", {
+                "type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}
+            })
+            chunks = [text[i:i + 32] for i in range(0, len(text), 32)]
+            for chunk in chunks:
+                await asyncio.sleep(behavior.stream_seconds / len(chunks))
+                yield _sse("content_block_delta", {
+                    "type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": chunk}
+                })
+            yield _sse("content_block_stop", {"type": "content_block_stop", "index": 0})
+            yield _sse("message_delta", {
+                "type": "message_delta",
+                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"output_tokens": max(1, len(text) // 4)},
+            })
+            yield _sse("message_stop", {"type": "message_stop"})
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+def start_in_thread(app: FastAPI, port: int = 0):
+    """
+    Serve app on 127.0.0.1 from a daemon thread.
+    :return: (base URL, uvicorn server, to stop it with server.should_exit = True)
+    """
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return f"http://127.0.0.1:{port}", server
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--config", help="JSON object of model -> ModelBehavior fields")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    uvicorn.run(create_app(parse_config(args.config), args.seed), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,94 @@
-from fastapi import FastAPI, Form, HTTPException
-from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from fastapi import FastAPI, Form, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-import redis
+from contextlib import asynccontextmanager
+import redis.asyncio
 import hashlib
 import asyncio
 
 import os
-import sys
+import io
 import json
-import shutil
-from dotenv import load_dotenv
-import time
+import zipfile
+from dataclasses import replace
+from kombu.exceptions import OperationalError
+from pydantic import ValidationError
+
+from resumecompiler.artifact_store import BaseAsyncArtifactReader, cached_artifact, create_async_artifact_reader
+from resumecompiler.similarity_cache import normalize_job_info, read_similarity_stats, similarity_threshold
+from resumecompiler.job_state import create_job, fail_job, follow_job_events, lease_key
+from resumecompiler.job_preprocessor import JOB_INFO_MAX_CHARS, compact_job_info
+from resumecompiler.history import RETENTION_TIERS, AsyncHistoryReader, history_cursor, parse_history_cursor
+from resumecompiler import metrics
+from resumecompiler import tenants
+from resumecompiler import job_queue
+from resumecompiler.tenants import (
+    BUDGET_TIERS, DEFAULT_TENANT, TenantProfile, check_rate_limit, get_profile, valid_tenant
+)
+
+
+# Every handler uses async Redis so no request blocks the event loop. Blocking XREADs
+# hold their connection for up to 15s, so event streams get their own pool and can't
+# starve short commands like the GET /resume/{key} lookups. Pools only connect on first
+# use, so importing the app doesn't need Redis; the lifespan checks the connection.
+ar = redis.asyncio.Redis(connection_pool=redis.asyncio.BlockingConnectionPool.from_url(
+    os.getenv("REDIS_URL"),
+    max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", 64))
+))
+stream_redis = redis.asyncio.Redis.from_url(os.getenv("REDIS_URL"))
+
+artifacts: BaseAsyncArtifactReader = create_async_artifact_reader(ar)
+history = AsyncHistoryReader(ar)
+
+
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", 10))
+# most history records one GET /resumes request returns
+HISTORY_MAX_LIMIT = 1000
+# most postings one POST /resume/batch request may send
+BATCH_MAX_POSTINGS = int(os.getenv("BATCH_MAX_POSTINGS", 50))
+
+
+async def flush_metrics_periodically() -> None:
+    while True:
+        await asyncio.sleep(METRICS_FLUSH_SECONDS)
+        try:
+            await metrics.flush_async(ar)
+        except redis.RedisError as e:
+            print(f"Could not flush metrics: {e}")
+
+
+async def prewarm(profile: TenantProfile) -> None:
+    """
+    Queue compiling the profile's base resume on the compile workers
+    """
+    try:
+        # publishing to the broker is blocking I/O
+        await asyncio.to_thread(job_queue.enqueue_prewarm, profile)
+    except OperationalError as e:
+        print(f"Could not queue base resume compile: {e}")
 
-from resumecompiler.construct_latex import compile_latex, compile_latex_async, construct_latex_resume
-from resumecompiler.resume_field_populator import DefaultResumeFieldPopulator, AIResumeFieldPopulator
-import tasks
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Test Redis connection
+    try:
+        await ar.ping()
+        print("Connected to Redis!")
+    except redis.ConnectionError:
+        print("Failed to connect to Redis.")
+    # compile the default base resume ahead of the first request that leaves it unchanged,
+    # without holding up startup if the broker is slow to answer
+    prewarming = asyncio.create_task(prewarm(tenants.default_profile()))
+    flusher = asyncio.create_task(flush_metrics_periodically())
+    yield
+    prewarming.cancel()
+    flusher.cancel()
+    await metrics.flush_async(ar)
+    await stream_redis.aclose()
+    await ar.aclose()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -27,116 +98,459 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-load_dotenv()
-assert os.getenv("REDIS_URL"), "Missing REDIS_URL environment variable"
-r = redis.Redis.from_url(os.getenv("REDIS_URL"))
 
-# Test Redis connection
-try:
-    r.ping()
-    print("Connected to Redis!")
-except ConnectionError:
-    print("Failed to connect to Redis.")
+def sse_response(event, data, event_id=None):
+    # If data is multiline, prefix each line with 'data: '
+    if isinstance(data, str):
+        data_lines = data.splitlines()
+        data_field = '\n'.join(f'data: {line}' for line in data_lines)
+    else:
+        data_field = f'data: {data}'
+    # ids let a reconnecting client resume with Last-Event-ID
+    id_field = f"id: {event_id}\n" if event_id else ""
+    return f"{id_field}event: {event}\n{data_field}\n\n"
+
 
+SSE_KEEPALIVE = ": keepalive\n\n"
+
+
+def preprocess_job_info(job_info: str) -> str:
+    """
+    Compact a pasted posting once, before it keys the caches and reaches the prompt
+    """
+    if len(job_info) > JOB_INFO_MAX_CHARS:
+        raise HTTPException(status_code=413, detail=f"Job posting is over {JOB_INFO_MAX_CHARS} characters")
+    with metrics.stage("job_preprocess"):
+        return compact_job_info(job_info)
+
+
+def job_key(job_info: str, profile: TenantProfile) -> str:
+    """
+    Unique primary key of a (compacted) job posting, computed from its normalized
+    text and the tenant's resume, template and model
+    """
+    return profile.job_key(normalize_job_info(job_info))
+
+
+def check_tenant(tenant: str, authorization: str | None) -> None:
+    """
+    :param authorization: the Authorization header, "Bearer <token>" with the tenant's token
+    """
+    if not valid_tenant(tenant):
+        raise HTTPException(status_code=400, detail="Invalid tenant ID")
+    token = authorization.removeprefix("Bearer").strip() if authorization else None
+    if not tenants.authenticated(tenant, token):
+        raise HTTPException(status_code=401, detail="Missing or invalid token for this tenant")
+
+
+async def tenant_profile(
+        tenant: str | None,
+        authorization: str | None,
+        budget: str | None = None
+    ) -> TenantProfile:
+    """
+    Profile of the tenant named by the X-Tenant-ID header, the default one if there is none.
+    Anyone may generate resumes as the default tenant, any other tenant needs its token.
+    :param budget: "fast", "balanced" or "best", overrides the tenant's model with that tier's
+    """
+    if tenant is not None:
+        check_tenant(tenant, authorization)
+    tenant = tenant or DEFAULT_TENANT
+    if budget is not None and budget not in BUDGET_TIERS:
+        raise HTTPException(status_code=400, detail=f"Budget must be one of {', '.join(BUDGET_TIERS)}")
+    profile = await get_profile(ar, tenant)
+    return replace(profile, model=BUDGET_TIERS[budget]) if budget else profile
+
+
+async def check_tenant_rate(profile: TenantProfile, keys: list[str]) -> None:
+    """
+    Count a request against the tenant's rate limit if any of its keys would start a new job.
+    A batch counts once, however many postings it has, and requests that only join jobs
+    already in flight don't count.
+    """
+    in_flight = await ar.exists(*(lease_key(key) for key in keys)) if keys else 0
+    if not await check_rate_limit(ar, profile.tenant, min(len(keys) - in_flight, 1)):
+        raise HTTPException(status_code=429, detail="Too many resumes requested, try again in a minute")
+
+
+async def is_cached(key: str) -> bool:
+    """
+    True if the key points at a PDF that is still in the artifact store. A key that
+    expired is pointed back at its PDF if the job is still in its tenant's history.
+    """
+    artifact = cached_artifact(await ar.get(key))
+    if artifact is not None:
+        return await artifacts.exists(artifact)
+
+    artifact = await history.artifact(key)
+    restored = artifact is not None and await artifacts.exists(artifact)
+    metrics.record_cache("history", restored)
+    if restored:
+        await ar.set(key, json.dumps({'artifact': artifact}), ex=job_queue.RESULT_TTL_SECONDS)
+    return restored
+
+
+async def start_job(key: str, job_info: str, profile: TenantProfile, deadline: float | None = None) -> None:
+    """
+    Queue the job for this key unless the same job is already queued or running
+    somewhere in the cluster, in which case callers just follow its existing event stream.
+    """
+    token = await create_job(ar, key)
+    if token is None:
+        return
+    try:
+        # publishing to the broker is blocking I/O
+        await asyncio.to_thread(job_queue.enqueue_resume_job, key, job_info, token, profile, deadline)
+    except Exception as e:
+        # nothing will run the job, end it for everyone following its stream
+        await fail_job(ar, key, token, f'Could not queue the job: {e}')
+        raise
+
+
+async def stream_job_events(key: str, last_event_id: str = '0'):
+    async for _, event_id, event, data in follow_job_events(stream_redis, {key: last_event_id}):
+        yield sse_response(event, data, event_id) if event else SSE_KEEPALIVE
 
 
 @app.post("/resume")
-async def generate_resume(job_info: str = Form(...)) -> StreamingResponse:
+async def generate_resume(
+        job_info: str = Form(...),
+        budget: str | None = Form(None),
+        deadline: float | None = Form(None),
+        x_tenant_id: str | None = Header(None),
+        authorization: str | None = Header(None)
+    ) -> StreamingResponse:
     """
-    Generate tailored PDF resume from the job info.
-    Saves the PDF in local memory, and return key to retrieve it 
-    through GET /resume/{key} endpoint
+    Generate tailored PDF resume from the job info, with the base resume and
+    template of the tenant given by the X-Tenant-ID header.
+    Optional budget (model tier) and deadline (seconds) steer the model routing.
+    Generation runs on the Celery workers; this streams the job's progress and
+    ends with the key to retrieve the PDF through GET /resume/{key} endpoint
     """
-    def sse_response(event, data):
-        # If data is multiline, prefix each line with 'data: '
-        if isinstance(data, str):
-            data_lines = data.splitlines()
-            data_field = '\n'.join(f'data: {line}' for line in data_lines)
-        else:
-            data_field = f'data: {data}'
-        return f"event: {event}\n{data_field}\n\n"
+    # 1. generate unique primary key from the compacted job_info and the tenant's profile
+    profile = await tenant_profile(x_tenant_id, authorization, budget)
+    job_info = preprocess_job_info(job_info)
+    key = job_key(job_info, profile)
 
-    async def event_generator():
+    # 2. check if key exists in redis and its PDF is still stored
+    with metrics.stage("cache_check"):
+        cached = await is_cached(key)
+    metrics.record_cache("result", cached)
+    if not cached:
+        await check_tenant_rate(profile, [key])
 
-        # 1. generate unique primary key from job_info
-        key = hashlib.sha256(job_info.encode('utf-8')).hexdigest()
+    async def event_generator():
         yield sse_response('progress', 'Checking cache...')
-
-        # 2. check if key exists in redis
-        if r.exists(key):
+        if cached:
             yield sse_response('done', json.dumps({'key': key}))
             return
 
-        # 3. generate .tex file using AI
-        yield sse_response('progress', 'Generating AI resume...')
-        tex_file_path, changelog = construct_latex_resume(
-            AIResumeFieldPopulator(),
-            job_info=job_info
-        )
-
-        # send changes made in changelog
-        for change in changelog:
-            change_string = f'>> Original: {change.before}\n' \
-                          + f'>> After: {change.after}\n' \
-                          + f'>> Reason: {change.reason}'
-            yield sse_response('progress', change_string)
-
-        # 4. compile to PDF (blocking on windows)
-        yield sse_response('progress', 'Compiling LaTeX to PDF...')
-        try:
-            if sys.platform.startswith("win"):
-                compile_latex(tex_file_path, "build")
-            else:
-                await compile_latex_async(tex_file_path, "build")
-        except Exception as e:
-            yield sse_response('error', f'Failed to compile LaTeX: {e}')
+        # 3. queue the job (or join the one already running) and follow its progress
+        await start_job(key, job_info, profile, deadline)
+        async for message in stream_job_events(key):
+            yield message
+
+    return StreamingResponse(event_generator(), media_type='text/event-stream')
+
+
+@app.get("/resume/{key}/events")
+async def get_resume_events(key: str, last_event_id: str | None = Header(None)) -> StreamingResponse:
+    """
+    Reconnect to a job's progress stream, replaying events after Last-Event-ID (or from the start)
+    """
+    async def event_generator():
+        if await is_cached(key):
+            yield sse_response('done', json.dumps({'key': key}))
             return
+        async for message in stream_job_events(key, last_event_id or '0'):
+            yield message
 
-        name = os.path.splitext(os.path.basename(tex_file_path))[0]
-        pdf_path = os.path.join("build", name, f"{name}.pdf")
-        dir_path = os.path.join("build", name)
+    return StreamingResponse(event_generator(), media_type='text/event-stream')
 
-        # Delete the .tex file
-        try:
-            os.remove(tex_file_path)
-            yield sse_response('progress', 'Cleaned up intermediate files.')
-        except Exception as e:
-            yield sse_response('progress', f'Warning: Could not delete .tex file: {e}')
-
-        # Wait until PDF exists (with a timeout)
-        yield sse_response('progress', f'Waiting for PDF file to fully load.')
-        timeout = 5  # seconds
-        start = time.time()
-        while not os.path.exists(pdf_path):
-            if time.time() - start > timeout:
-                yield sse_response('error', 'PDF file was not created in time.')
-                return
-            time.sleep(0.1)
-
-        # 5. store PDF path in redis for 5 mins
-        ttl_seconds = 300
-        r.set(key, json.dumps({'pdf_path': pdf_path}), ex=ttl_seconds)
-        tasks.cleanup_directory.apply_async(args=[dir_path], countdown=ttl_seconds+1)
-
-        # 6. return the key
-        yield sse_response('done', json.dumps({'key': key}))
+
+@app.post("/resume/batch")
+async def generate_resume_batch(
+        job_infos: list[str] = Form(...),
+        budget: str | None = Form(None),
+        deadline: float | None = Form(None),
+        x_tenant_id: str | None = Header(None),
+        authorization: str | None = Header(None)
+    ) -> StreamingResponse:
+    """
+    Generate tailored PDF resumes for many (up to BATCH_MAX_POSTINGS) job postings at once.
+    Duplicate postings are generated once, and the unique ones are queued for the
+    LLM and compile workers, whose pool sizes bound how many run in parallel.
+    Streams every job's events tagged with its key, then a 'done' event with the
+    batch manifest. All PDFs can be downloaded through GET /resume/batch/{batch_id}/zip
+    """
+    if len(job_infos) > BATCH_MAX_POSTINGS:
+        raise HTTPException(status_code=413, detail=f"A batch may have at most {BATCH_MAX_POSTINGS} postings")
+    profile = await tenant_profile(x_tenant_id, authorization, budget)
+    job_infos = [preprocess_job_info(job_info) for job_info in job_infos]
+    keys = [job_key(job_info, profile) for job_info in job_infos]
+    unique_jobs = dict(zip(keys, job_infos))
+    batch_id = hashlib.sha256(''.join(sorted(unique_jobs)).encode('utf-8')).hexdigest()[:16]
+
+    statuses = {key: 'done' for key in unique_jobs if await is_cached(key)}
+    await check_tenant_rate(profile, [key for key in unique_jobs if key not in statuses])
+
+    async def event_generator():
+        for key, job_info in unique_jobs.items():
+            if key not in statuses:
+                await start_job(key, job_info, profile, deadline)
+
+        pending = {key: '0' for key in unique_jobs if key not in statuses}
+        async for key, _, event, data in follow_job_events(stream_redis, pending):
+            if event is None:
+                yield SSE_KEEPALIVE
+                continue
+            if event in ('done', 'error'):
+                statuses[key] = event
+            yield sse_response('progress', json.dumps({'key': key, 'event': event, 'data': data}))
+
+        # manifest keeps the order of the submitted postings, duplicates included
+        manifest = {
+            'batch_id': batch_id,
+            'items': [{'index': i, 'key': key, 'status': statuses.get(key, 'error')} for i, key in enumerate(keys)],
+            'zip': f'/resume/batch/{batch_id}/zip'
+        }
+        await ar.set(f'batch:{batch_id}', json.dumps(manifest), ex=300)
+        yield sse_response('done', json.dumps(manifest))
 
     return StreamingResponse(event_generator(), media_type='text/event-stream')
 
 
+@app.get("/resume/batch/{batch_id}/zip")
+async def get_resume_batch_zip(batch_id: str) -> Response:
+    """
+    Zip of every successfully generated PDF in a batch, named by job key
+    """
+    manifest = await ar.get(f'batch:{batch_id}')
+    if not manifest:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    pdfs = {}
+    for key in dict.fromkeys(item['key'] for item in json.loads(manifest)['items']):
+        artifact = cached_artifact(await ar.get(key))
+        pdf_bytes = await artifacts.get(artifact) if artifact else None
+        if pdf_bytes is not None:
+            pdfs[f'{key[:12]}.pdf'] = pdf_bytes
+
+    def build_zip() -> bytes:
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            for name, pdf_bytes in pdfs.items():
+                archive.writestr(name, pdf_bytes)
+        return buffer.getvalue()
+
+    return Response(
+        await asyncio.to_thread(build_zip),
+        media_type='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="resumes_{batch_id}.zip"'}
+    )
+
 
 @app.get("/resume/{key}")
-async def get_resume(key: str) -> FileResponse:
+async def get_resume(key: str) -> Response:
     """
-    Get a previously generated resume using key as PDF FileResponse
+    Get a previously generated resume using key as a PDF Response
     """
-    cached = r.get(key)
+    cached = await ar.get(key)
     if not cached:
         raise HTTPException(status_code=404, detail="Resume not found")
-    
-    # check PDF path exists, then return it through FileResponse
-    data = json.loads(cached)
-    pdf_path = data.get('pdf_path')
-    if not pdf_path or not os.path.exists(pdf_path):
+
+    # PDF bytes live in the shared artifact store, so any replica can serve them
+    digest = json.loads(cached).get('artifact')
+    pdf_bytes = await artifacts.get(digest) if digest else None
+    if pdf_bytes is None:
         raise HTTPException(status_code=404, detail="PDF file not found")
-    return FileResponse(pdf_path, media_type='application/pdf', filename=os.path.basename(pdf_path))
\ No newline at end of file
+    return Response(
+        pdf_bytes,
+        media_type='application/pdf',
+        headers={'Content-Disposition': f'attachment; filename="{digest[:12]}.pdf"'}
+    )
+
+
+@app.get("/tenants/{tenant}")
+async def get_tenant(tenant: str, authorization: str | None = Header(None)) -> JSONResponse:
+    """
+    Digests of the tenant's base resume and template, and its model
+    """
+    check_tenant(tenant, authorization)
+    return JSONResponse((await get_profile(ar, tenant)).to_dict())
+
+
+@app.put("/tenants/{tenant}/resume")
+async def put_tenant_resume(
+        tenant: str,
+        request: Request,
+        authorization: str | None = Header(None)
+    ) -> JSONResponse:
+    """
+    Set the tenant's base resume from a Resume JSON body
+    """
+    check_tenant(tenant, authorization)
+    try:
+        digest = await tenants.put_resume(ar, tenant, await request.body())
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid resume: {e}")
+    await prewarm(await get_profile(ar, tenant))
+    return JSONResponse({'tenant': tenant, 'resume_digest': digest})
+
+
+@app.put("/tenants/{tenant}/template")
+async def put_tenant_template(
+        tenant: str,
+        request: Request,
+        authorization: str | None = Header(None)
+    ) -> JSONResponse:
+    """
+    Set the tenant's LaTeX template (preamble and heading, like static/template.tex) from the body
+    """
+    check_tenant(tenant, authorization)
+    try:
+        digest = await tenants.put_template(ar, tenant, (await request.body()).decode('utf-8'))
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid template: {e}")
+    await prewarm(await get_profile(ar, tenant))
+    return JSONResponse({'tenant': tenant, 'template_digest': digest})
+
+
+@app.put("/tenants/{tenant}/model")
+async def put_tenant_model(
+        tenant: str,
+        model: str = Form(...),
+        authorization: str | None = Header(None)
+    ) -> JSONResponse:
+    """
+    Set the Anthropic model ID used for the tenant's resumes, one of MODEL_TIERS or a budget name
+    """
+    check_tenant(tenant, authorization)
+    try:
+        model = await tenants.set_model(ar, tenant, model)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return JSONResponse({'tenant': tenant, 'model': model})
+
+
+@app.put("/tenants/{tenant}/retention")
+async def put_tenant_retention(
+        tenant: str,
+        tier: str = Form(...),
+        authorization: str | None = Header(None)
+    ) -> JSONResponse:
+    """
+    Set how long the tenant's results are kept in its history, one of HISTORY_RETENTION_TIERS
+    """
+    check_tenant(tenant, authorization)
+    try:
+        await tenants.set_retention(ar, tenant, tier)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return JSONResponse({'tenant': tenant, 'retention': tier, 'days': RETENTION_TIERS[tier]})
+
+
+@app.get("/resumes")
+async def list_resumes(
+        limit: int = 50,
+        before: str | None = None,
+        full: bool = False,
+        x_tenant_id: str | None = Header(None),
+        authorization: str | None = Header(None)
+    ) -> StreamingResponse:
+    """
+    The tenant's past results, newest first, as newline-delimited JSON: one summary
+    (id, key, created, title, changes, artifact) per line, with the posting, resume and
+    changelog too if full is set. The last line is {"next": cursor}, pass it as before to get the
+    next page, or null after the oldest record.
+    """
+    tenant = x_tenant_id or DEFAULT_TENANT
+    check_tenant(tenant, authorization)
+    if not 0 < limit <= HISTORY_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"Limit must be between 1 and {HISTORY_MAX_LIMIT}")
+    if before is not None:
+        try:
+            parse_history_cursor(before)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    async def lines():
+        cursor, count = None, 0
+        async for page in history.pages(tenant, before, limit):
+            records = await history.records([summary for _, summary in page]) if full else [None] * len(page)
+            for (created, summary), record in zip(page, records):
+                cursor, count = history_cursor(created, summary['id']), count + 1
+                if full:
+                    if record is None:
+                        # expired since the page was read
+                        continue
+                    summary = {**summary, **record.model_dump(include={'job_info', 'resume', 'changelog'})}
+                yield json.dumps(summary) + "\n"
+        yield json.dumps({'next': cursor if count == limit else None}) + "\n"
+
+    return StreamingResponse(lines(), media_type='application/x-ndjson')
+
+
+@app.get("/resumes/{record_id}")
+async def get_resume_record(
+        record_id: str,
+        x_tenant_id: str | None = Header(None),
+        authorization: str | None = Header(None)
+    ) -> JSONResponse:
+    """
+    One past result of the tenant: the posting, tailored resume, changelog and PDF key
+    """
+    tenant = x_tenant_id or DEFAULT_TENANT
+    check_tenant(tenant, authorization)
+    record = await history.get(tenant, record_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Resume not found")
+    return JSONResponse(record.model_dump())
+
+
+@app.get("/resumes/{record_id}/pdf")
+async def get_resume_record_pdf(
+        record_id: str,
+        x_tenant_id: str | None = Header(None),
+        authorization: str | None = Header(None)
+    ) -> Response:
+    """
+    PDF of one past result of the tenant, if it is still in the artifact store
+    """
+    tenant = x_tenant_id or DEFAULT_TENANT
+    check_tenant(tenant, authorization)
+    record = await history.get(tenant, record_id)
+    pdf_bytes = await artifacts.get(record.artifact) if record is not None and record.artifact else None
+    if pdf_bytes is None:
+        # POST /resume with the same posting recompiles it from the record, without the model
+        raise HTTPException(status_code=404, detail="PDF not found")
+    return Response(
+        pdf_bytes,
+        media_type='application/pdf',
+        headers={'Content-Disposition': f'attachment; filename="{record.artifact[:12]}.pdf"'}
+    )
+
+
+@app.get("/stats/similarity")
+async def get_similarity_stats() -> JSONResponse:
+    """
+    Hit/miss counts and best-similarity histogram of the near-duplicate posting cache
+    """
+    return JSONResponse({'threshold': similarity_threshold(), **await read_similarity_stats(ar)})
+
+
+@app.get("/metrics")
+async def get_metrics() -> PlainTextResponse:
+    """
+    Per-stage latency histograms, token counts and cache hit counts of every
+    web and worker process, in Prometheus text format
+    """
+    await metrics.flush_async(ar)
+    pipe = ar.pipeline(transaction=False)
+    pipe.hgetall(metrics.METRICS_KEY)
+    pipe.hgetall(metrics.METRICS_META_KEY)
+    totals, meta = await pipe.execute()
+    return PlainTextResponse(
+        metrics.render_prometheus(totals, meta),
+        media_type='text/plain; version=0.0.4'
+    )
@@ -0,0 +1,295 @@
+import hashlib
+import asyncio
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+
+import redis
+import redis.asyncio
+
+
+def tex_digest(source: str) -> str:
+    """
+    Content address of a rendered .tex source. Identical renders share one PDF.
+    """
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def render_digest(resume_digest: str, template_digest: str) -> str:
+    """
+    Address of a resume rendered into a template, known before rendering anything.
+    """
+    return hashlib.sha256(f"{resume_digest}:{template_digest}".encode('utf-8')).hexdigest()
+
+
+def cached_artifact(cached: bytes | None) -> str | None:
+    """
+    :param cached: value of a job key
+    :return: artifact digest of its PDF, None for keys written before PDFs were
+             content-addressed, which only carry a pdf_path
+    """
+    return json.loads(cached).get('artifact') if cached else None
+
+
+class BaseArtifactStore(ABC):
+    @abstractmethod
+    def put(self, digest: str, data: bytes) -> None:
+        pass
+
+    @abstractmethod
+    def get(self, digest: str) -> bytes | None:
+        pass
+
+    @abstractmethod
+    def exists(self, digest: str) -> bool:
+        pass
+
+
+class BaseAsyncArtifactReader(ABC):
+    """
+    Read side of an artifact store for the web server, safe to await on its event loop.
+    """
+
+    @abstractmethod
+    async def get(self, digest: str) -> bytes | None:
+        pass
+
+    @abstractmethod
+    async def exists(self, digest: str) -> bool:
+        pass
+
+
+# store a PDF and evict least recently used ones in one step, so two workers putting the
+# same digest count its bytes once. Returns the evicted digests and sizes.
+PUT_ARTIFACT_SCRIPT = """
+if redis.call('hsetnx', KEYS[2], ARGV[1], string.len(ARGV[2])) == 0 then
+    redis.call('zadd', KEYS[4], ARGV[3], ARGV[1])
+    return {}
+end
+redis.call('set', KEYS[1], ARGV[2])
+redis.call('zadd', KEYS[4], ARGV[3], ARGV[1])
+local total = redis.call('incrby', KEYS[3], string.len(ARGV[2]))
+local evicted = {}
+while total > tonumber(ARGV[4]) do
+    local oldest = redis.call('zpopmin', KEYS[4])
+    if #oldest == 0 then
+        break
+    end
+    local size = tonumber(redis.call('hget', KEYS[2], oldest[1]) or 0)
+    redis.call('del', ARGV[5] .. oldest[1])
+    redis.call('hdel', KEYS[2], oldest[1])
+    total = redis.call('decrby', KEYS[3], size)
+    table.insert(evicted, oldest[1])
+    table.insert(evicted, size)
+end
+return evicted
+"""
+
+
+class _RedisArtifactKeys:
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.lru_key = f"{prefix}:lru"
+        self.sizes_key = f"{prefix}:sizes"
+        self.total_key = f"{prefix}:bytes"
+
+    def _data_key(self, digest: str) -> str:
+        return f"{self.prefix}:pdf:{digest}"
+
+
+class RedisArtifactStore(_RedisArtifactKeys, BaseArtifactStore):
+    """
+    Stores PDF bytes in Redis so every replica can serve them.
+    Keeps a last-access sorted set and evicts least recently used PDFs
+    once the total size goes over the byte budget.
+    """
+
+    def __init__(self, client: redis.Redis, max_bytes: int, prefix: str = "artifact"):
+        super().__init__(prefix)
+        self.r = client
+        self.max_bytes = max_bytes
+
+    def put(self, digest: str, data: bytes) -> None:
+        evicted = self.r.eval(
+            PUT_ARTIFACT_SCRIPT, 4,
+            self._data_key(digest), self.sizes_key, self.total_key, self.lru_key,
+            digest, data, time.time(), self.max_bytes, self._data_key("")
+        )
+        for evicted_digest, size in zip(evicted[::2], evicted[1::2]):
+            print(f"Evicted artifact {evicted_digest.decode()[:12]} ({size} bytes)")
+
+    def get(self, digest: str) -> bytes | None:
+        data = self.r.get(self._data_key(digest))
+        if data is not None:
+            # xx: a PDF evicted since the read stays out of the LRU
+            self.r.zadd(self.lru_key, {digest: time.time()}, xx=True)
+        return data
+
+    def exists(self, digest: str) -> bool:
+        return bool(self.r.exists(self._data_key(digest)))
+
+
+class AsyncRedisArtifactReader(_RedisArtifactKeys, BaseAsyncArtifactReader):
+    """
+    Reads PDFs written by RedisArtifactStore through an async client, touching their LRU entry.
+    """
+
+    def __init__(self, client: redis.asyncio.Redis, prefix: str = "artifact"):
+        super().__init__(prefix)
+        self.r = client
+
+    async def get(self, digest: str) -> bytes | None:
+        data = await self.r.get(self._data_key(digest))
+        if data is not None:
+            await self.r.zadd(self.lru_key, {digest: time.time()}, xx=True)
+        return data
+
+    async def exists(self, digest: str) -> bool:
+        return bool(await self.r.exists(self._data_key(digest)))
+
+
+class LocalArtifactStore(BaseArtifactStore):
+    """
+    Stores PDF bytes in a sharded directory (root/ab/cd/<digest>.pdf).
+    File mtimes double as last-access times for LRU eviction under the byte budget.
+    Only shared between replicas if root is on a shared volume.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        # bytes stored, counted on the first put so startup doesn't walk the whole directory
+        self._total: int | None = None
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}.pdf")
+
+    def _scan(self) -> list[tuple[str, int, float]]:
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if not filename.endswith(".pdf"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def put(self, digest: str, data: bytes) -> None:
+        path = self._path(digest)
+        if os.path.exists(path):
+            os.utime(path)
+            return
+
+        # write then rename so readers never see a partial PDF
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        if self._total is not None:
+            self._total += len(data)
+        self._evict()
+
+    def get(self, digest: str) -> bytes | None:
+        path = self._path(digest)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return data
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self._path(digest))
+
+    def _evict(self) -> None:
+        if self._total is not None and self._total <= self.max_bytes:
+            return
+        entries = self._scan()
+        self._total = sum(size for _, size, _ in entries)
+        for path, size, _ in sorted(entries, key=lambda e: e[2]):
+            if self._total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._total -= size
+            print(f"Evicted artifact {os.path.basename(path)} ({size} bytes)")
+
+
+class ThreadedArtifactReader(BaseAsyncArtifactReader):
+    """
+    Runs a blocking store's reads (e.g. file I/O of LocalArtifactStore) in a worker thread.
+    """
+
+    def __init__(self, store: BaseArtifactStore):
+        self.store = store
+
+    async def get(self, digest: str) -> bytes | None:
+        return await asyncio.to_thread(self.store.get, digest)
+
+    async def exists(self, digest: str) -> bool:
+        return await asyncio.to_thread(self.store.exists, digest)
+
+
+class RenderIndex:
+    """
+    Which artifact each (resume, template) pair compiled to, so a generation that produced
+    a resume seen before (often the base resume itself, when nothing was worth changing)
+    reuses its PDF without rendering, preflighting or queueing a compile. Entries outlive
+    the job keys, the artifact store's own eviction decides how long the PDFs stay.
+    """
+
+    def __init__(self, client: redis.Redis, ttl_seconds: int | None = None, prefix: str = "rendered"):
+        self.r = client
+        self.ttl_seconds = ttl_seconds or int(os.getenv("RENDER_INDEX_TTL_SECONDS", 7 * 24 * 3600))
+        self.prefix = prefix
+
+    def _key(self, digest: str) -> str:
+        return f"{self.prefix}:{digest}"
+
+    def get(self, digest: str) -> str | None:
+        """
+        :param digest: render_digest of the resume and template
+        :return: artifact digest of its PDF, if it was rendered before
+        """
+        artifact = self.r.get(self._key(digest))
+        return artifact.decode() if artifact else None
+
+    def put(self, digest: str, artifact: str) -> None:
+        self.r.set(self._key(digest), artifact, ex=self.ttl_seconds)
+
+
+def create_artifact_store(client: redis.Redis) -> BaseArtifactStore:
+    """
+    Build the artifact store configured through environment variables.
+    ARTIFACT_STORE=redis (default) or local, ARTIFACT_STORE_MAX_BYTES, ARTIFACT_STORE_DIR
+    """
+    max_bytes = int(os.getenv("ARTIFACT_STORE_MAX_BYTES", 512 * 1024 * 1024))
+    backend = os.getenv("ARTIFACT_STORE", "redis")
+    if backend == "local":
+        return LocalArtifactStore(os.getenv("ARTIFACT_STORE_DIR", "artifacts"), max_bytes)
+    if backend == "redis":
+        return RedisArtifactStore(client, max_bytes)
+    raise ValueError(f"Unknown ARTIFACT_STORE backend: {backend}")
+
+
+def create_async_artifact_reader(client: redis.asyncio.Redis) -> BaseAsyncArtifactReader:
+    """
+    Async reader for the artifact store configured through the same environment variables.
+    """
+    backend = os.getenv("ARTIFACT_STORE", "redis")
+    if backend == "local":
+        max_bytes = int(os.getenv("ARTIFACT_STORE_MAX_BYTES", 512 * 1024 * 1024))
+        return ThreadedArtifactReader(LocalArtifactStore(os.getenv("ARTIFACT_STORE_DIR", "artifacts"), max_bytes))
+    if backend == "redis":
+        return AsyncRedisArtifactReader(client)
+    raise ValueError(f"Unknown ARTIFACT_STORE backend: {backend}")
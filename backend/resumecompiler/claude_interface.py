@@ -1,21 +1,39 @@
 import anthropic
 from dotenv import load_dotenv
 import os
-import requests
 import json
+import asyncio
+import httpx
+import time
 
 from enum import Enum
+from typing import Collection
 from pydantic import BaseModel
 
 from resumecompiler.resume_field_populator import BaseAIInterface
 from resumecompiler.models import *
+from resumecompiler.stream_parser import StreamingResultParser
+from resumecompiler.resume_patch import PatchError, apply_edits, preview_edit
+from resumecompiler.relevance import RELEVANCE_TOP_K
+from resumecompiler.repair import REPAIRS, Fixes, InvalidFragment, loads_tolerant, repair_full, repair_patch
+from resumecompiler.resume_repository import resume_entry
+from resumecompiler.metrics import LLM_TOKENS, STAGE_SECONDS, stage, timed
 
 
 # Load anthropic API key
 load_dotenv()
-assert os.environ.get('ANTHROPIC_API_KEY', '') != '', "Add anthropic API key to .env"
 
 
+editing_guidelines = """
+You only make changes when they pertain to the specific job description given
+and have a large positive impact on making the candidate seem more desirable.
+
+This could include adding specific hard or soft skill keywords by modifying bullet points or
+changing/reordering the skills section to highlight specific relevant skills.
+
+However, do not make up any skills, experiences, or figures that aren't specifically stated on the resume.
+"""
+
 system_prompt = f"""
 You are an expert resume writer who tailors resumes to specific job postings.
 Always output only valid JSON.
@@ -26,31 +44,79 @@ Your response must follow this JSON schema:
 
 `resume` should preserve all existing structure from the input resume JSON unless modified to improve alignment with the job posting.
 `changelog` must contain one entry per change made, explaining the reasoning. Each reason should be 15 words max.
+{editing_guidelines}"""
 
-You only make changes when they pertain to the specific job description given
-and have a large positive impact on making the candidate seem more desirable.
+# patch mode: the model only returns edited fields, addressed by path
+patch_system_prompt = f"""
+You are an expert resume writer who tailors resumes to specific job postings.
+Always output only valid JSON.
+Never include extra text, explanations, or formatting outside the JSON.
 
-This could include adding specific hard or soft skill keywords by modifying bullet points or
-changing/reordering the skills section to highlight specific relevant skills.
+Your response must follow this JSON schema:
+{json.dumps(ResumePatchResult.model_json_schema(), indent=2)}
 
-However, do not make up any skills, experiences, or figures that aren't specifically stated on the resume.
-"""
+`edits` must contain one entry per change made, and nothing for fields you leave unchanged.
+`path` is the address of the field exactly as listed in the resume, e.g. experiences[2].bullets[1] or skills.sections["Tools"].
+`value` is the full new value of that field. To reorder a list, address the list itself (e.g. projects[0].bullets)
+and give every item in the new order.
+`reason` explains the change. Each reason should be 15 words max.
+If nothing should change, return {{"edits": []}}.
+{editing_guidelines}"""
 
-prompt = """
-Here is the job posting:
+# Prompts are split so everything that is the same on every request (system prompt,
+# schema, rules and base resume) forms a cacheable prefix, and the job posting comes last.
+resume_prompt = """
+Here is my current resume (in JSON format):
 
-{job_description}
+{resume}
 
-Here is my current resume (in JSON format):
+Here are the constraints and rules:
+{rules}
+"""
+
+patch_resume_prompt = """
+Here is my current resume, one editable field per line as `path: value`:
 
 {resume}
 
 Here are the constraints and rules:
 {rules}
+"""
 
+job_prompt = """
+Here is the job posting:
+
+{job_description}
+{focus}
 Please return only valid JSON following the schema in the system prompt.
 """
 
+# patch mode: the fields worth tailoring to this posting, named after it so the resume
+# block above stays the same for every posting
+focus_prompt = """
+Only edit these fields, the ones most relevant to this posting. Edits to any other field are rejected:
+{paths}
+"""
+
+# sent with one fragment of a response that couldn't be repaired locally
+fragment_system_prompt = """
+You fix fragments of a resume JSON document that did not meet their schema.
+Always output only valid JSON for the given schema.
+Never include extra text, explanations, or formatting outside the JSON.
+"""
+
+fragment_prompt = """
+This {kind} from a tailored resume did not meet its JSON schema:
+
+{fragment}
+
+Validation error:
+{error}
+
+Return only the corrected {kind}, keeping its content otherwise unchanged, following this schema:
+{schema}
+"""
+
 rules_and_constraints = """
 Any special characters in latex like # $ % & _ { } ~ ^ \\ must be escaped with a backslash.
 In particular avoid the characters ~ ^ \\ as they are more complex to deal with.
@@ -71,65 +137,281 @@ Do **NOT** add any hard skills to the resume that aren't explicitly already list
 """
 
 
+MAX_TOKENS = 4096
+FRAGMENT_MAX_TOKENS = 1024
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def build_request(
+        system: str,
+        resume_content: str,
+        job_description: str,
+        model: str,
+        focus: Collection[str] | None = None
+    ) -> dict:
+    """
+    Keyword arguments for messages.create/stream, laid out for provider-side prompt caching.
+    The system prompt and the resume block end in cache breakpoints, so only the
+    trailing job posting block is new input on repeat calls.
+    :param focus: paths of the only fields the model may edit, listed with the posting
+    """
+    focus_text = focus_prompt.format(paths="\n".join(sorted(focus))) if focus else ""
+    return {
+        "model": model,
+        "max_tokens": MAX_TOKENS,
+        "system": [{"type": "text", "text": system, "cache_control": CACHE_CONTROL}],
+        "messages": [{
+            "role": "user",
+            "content": [
+                {"type": "text", "text": resume_content, "cache_control": CACHE_CONTROL},
+                {"type": "text", "text": job_prompt.format(job_description=job_description, focus=focus_text)},
+            ]
+        }],
+    }
+
+
 class AnthropicModel(Enum):
     opus_4_1 = "claude-opus-4-1-20250805"
     sonnet_4 = "claude-sonnet-4-20250514"
     haiku_3_5 = "claude-3-5-haiku-20241022"
     haiku_3 = "claude-3-haiku-20240307"
 
+
+_client: anthropic.AsyncAnthropic | None = None
+_limiter: asyncio.Semaphore | None = None
+
+
+def get_async_client() -> anthropic.AsyncAnthropic:
+    """
+    Process-wide async client, so every generation shares one HTTP connection pool.
+    """
+    global _client
+    if _client is None:
+        # checked here rather than at import, so processes that never call the API start without it
+        assert os.environ.get('ANTHROPIC_API_KEY', '') != '', "Add anthropic API key to .env"
+        max_connections = int(os.getenv("ANTHROPIC_MAX_CONNECTIONS", 100))
+        _client = anthropic.AsyncAnthropic(
+            http_client=anthropic.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections
+                )
+            )
+        )
+    return _client
+
+
+def get_limiter() -> asyncio.Semaphore:
+    """
+    Process-wide cap on in-flight generations (ANTHROPIC_MAX_CONCURRENCY).
+    """
+    global _limiter
+    if _limiter is None:
+        _limiter = asyncio.Semaphore(int(os.getenv("ANTHROPIC_MAX_CONCURRENCY", 32)))
+    return _limiter
+
+
+usage_totals: dict[str, int] = {
+    "requests": 0,
+    "input_tokens": 0,
+    "output_tokens": 0,
+    "cache_creation_input_tokens": 0,
+    "cache_read_input_tokens": 0,
+}
+
+
+def record_usage(usage: anthropic.types.Usage) -> None:
+    """
+    Add one response's token usage, including prompt cache reads/writes, to the process totals.
+    """
+    usage_totals["requests"] += 1
+    for field in ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens"):
+        tokens = getattr(usage, field, None) or 0
+        usage_totals[field] += tokens
+        LLM_TOKENS.inc(tokens, type=field.removesuffix("_input_tokens").removesuffix("_tokens"))
+    print(
+        f"Tokens: {usage.input_tokens} input, {usage.output_tokens} output, "
+        f"{usage.cache_read_input_tokens or 0} cache read, {usage.cache_creation_input_tokens or 0} cache write"
+    )
+
+
 class AnthropicAIInterface(BaseAIInterface):
-    def __init__(self):
+    def __init__(
+            self,
+            client: anthropic.AsyncAnthropic | None = None,
+            response_mode: str | None = None,
+            model: str | None = None
+        ):
         """
-        Initializes client
+        Uses the shared async client unless one is given.
+        :param response_mode: "patch" (only edited fields are generated) or "full"
+            (the whole resume is generated), RESUME_RESPONSE_MODE by default
+        :param model: model ID, ANTHROPIC_MODEL (or Sonnet 4) by default
         """
-        self.client = anthropic.Anthropic()
+        self.client = client or get_async_client()
+        self.model = model or os.getenv("ANTHROPIC_MODEL", AnthropicModel.sonnet_4.value)
+        self.response_mode = response_mode or os.getenv("RESUME_RESPONSE_MODE", "patch")
+        assert self.response_mode in ("patch", "full"), f"Unknown response mode {self.response_mode}"
 
-    def generate_customized_resume(
+    @timed("generate")
+    async def generate_customized_resume(
             self,
             base_resume: Resume,
             job_info: str,
-            model: AnthropicModel = AnthropicModel.sonnet_4
+            on_item: ItemCallback | None = None,
+            model: AnthropicModel | None = None
         ) -> ResumeCustomizationResult:
         """
         Generates a resume tailored to the job posting along with a log of changes made.
+        Streams the response, validating and reporting each section to on_item as it closes.
+        Malformed output is repaired locally where possible, and only the fragments that
+        can't be are sent back to the model, instead of regenerating everything.
+        In patch mode the prompt only lists the RELEVANCE_TOP_K fields that best match the posting.
+        :param model: overrides the interface's model for this call
         """
-        print(f"\nPrompting {model.name}...")
-
-        # Use Python SDK to get anthropic LLM response
-        # pass in system prompt & formatted base prompt from above
-        response = self.client.messages.create(
-            model=model.value,
-            max_tokens=4096,
-            system=system_prompt,
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt.format(
-                        job_description=job_info,
-                        resume=json.dumps(base_resume.model_dump_json(), indent=2),
+        model_id = model.value if model is not None else self.model
+        if self.response_mode == "full":
+            parser = StreamingResultParser(on_item, strict=False)
+            with stage("prompt_build"):
+                request = build_request(
+                    system_prompt,
+                    resume_prompt.format(
+                        resume=resume_entry(base_resume).prompt_json,
                         rules=rules_and_constraints
-                    )
-                }
-            ],
-        )
-        print(f"{model.name} response received.")
-        response_content = response.content[0].text.lstrip('```json').rstrip('```')
+                    ),
+                    job_info,
+                    model_id
+                )
+            await self._stream(parser, request)
+            with stage("parse_validate"):
+                data = self._parse(parser.text)
+                repaired = repair_full(data, base_resume)
+            if repaired.invalid:
+                repaired = repair_full(data, base_resume, await self._reask(repaired.invalid, model_id))
+            return repaired.value.model_copy(update={"truncated": parser.truncated})
+
+        # patch mode: every field is listed in the cached resume block, but only the bullets
+        # that best match the posting (named with it) may change. Skills are left to
+        # RelevanceAIInterface, which reorders them without the model.
+        entry = resume_entry(base_resume)
+        focus = None
+        if RELEVANCE_TOP_K > 0:
+            with stage("relevance"):
+                # if nothing scores, every field may change (RelevanceAIInterface skips those postings)
+                focus = entry.relevance.rank(job_info).focus() or None
+
+        # report each edit as a changelog entry as soon as its path checks out
+        accepted = 0
+        def on_edit(kind: str, index: int | None, item: BaseModel) -> None:
+            nonlocal accepted
+            if on_item is None:
+                return
+            if kind == "truncated":
+                on_item(kind, index, item)
+            if kind != "edit":
+                return
+            try:
+                change = preview_edit(base_resume, item, focus)
+            except PatchError:
+                return
+            on_item("change", accepted, change)
+            accepted += 1
+
+        parser = StreamingResultParser(on_edit, strict=False)
+        with stage("prompt_build"):
+            request = build_request(
+                patch_system_prompt,
+                patch_resume_prompt.format(
+                    resume=entry.prompt_fields,
+                    rules=rules_and_constraints
+                ),
+                job_info,
+                model_id,
+                focus
+            )
+        await self._stream(parser, request)
+        with stage("parse_validate"):
+            data = self._parse(parser.text)
+            repaired = repair_patch(data)
+        if repaired.invalid:
+            repaired = repair_patch(data, await self._reask(repaired.invalid, model_id))
+        with stage("parse_validate"):
+            resume, changelog = apply_edits(base_resume, repaired.value.edits, focus)
+        return ResumeCustomizationResult(resume=resume, changelog=changelog, truncated=parser.truncated)
 
-        # try converting to JSON
+    async def _stream(self, parser: StreamingResultParser, request: dict) -> None:
+        """
+        Stream one completion into the parser. Invalid sections and truncated output are
+        left for the repair stage, though truncation is reported as soon as the stop reason arrives.
+        """
+        with stage("llm_queue_wait"):
+            await get_limiter().acquire()
         try:
-            output = json.loads(response_content)
-        except:
-            print(response_content)
-            raise RuntimeError("Anthropic model response was not JSON. Might have run out of tokens too.")
-        
-        # try converting to specified schema
+            print(f"\nPrompting {request['model']} ({self.response_mode} mode)...")
+            start = time.perf_counter()
+            first_token = True
+
+            # Use Python SDK to stream anthropic LLM response
+            async with self.client.messages.stream(**request) as stream:
+                async for event in stream:
+                    if event.type == "text":
+                        if first_token:
+                            STAGE_SECONDS.observe(time.perf_counter() - start, stage="llm_ttft")
+                            first_token = False
+                        parser.feed(event.text)
+                    elif event.type == "message_delta" and event.delta.stop_reason == "max_tokens":
+                        print(f"Anthropic model response was cut off at {request['max_tokens']} tokens, repairing.")
+                        parser.truncate(request["max_tokens"])
+                message = await stream.get_final_message()
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage="llm_total")
+            record_usage(message.usage)
+            print(f"{request['model']} response received.")
+        finally:
+            get_limiter().release()
+
+    @staticmethod
+    def _parse(text: str) -> dict:
         try:
-            result = ResumeCustomizationResult.model_validate(output)
-        except:
-            print(output)
-            raise RuntimeError("Anthropic model response was JSON, but did not meet the schema.")
+            return loads_tolerant(text)
+        except ValueError:
+            print(text)
+            raise RuntimeError("Anthropic model response was not valid JSON and could not be repaired.")
 
-        return result
+    async def _reask(self, fragments: list[InvalidFragment], model_id: str) -> Fixes:
+        """
+        Send each fragment that couldn't be repaired locally back to the model on its own.
+        :return: corrected fragments by (kind, index), without the ones that still failed
+        """
+        with stage("fragment_repair"):
+            items = await asyncio.gather(*(self._reask_fragment(f, model_id) for f in fragments))
+        return {(f.kind, f.index): item for f, item in zip(fragments, items) if item is not None}
+
+    async def _reask_fragment(self, fragment: InvalidFragment, model_id: str) -> BaseModel | None:
+        print(f"Re-asking {model_id} for invalid {fragment.kind} {fragment.index if fragment.index is not None else ''}")
+        request = {
+            "model": model_id,
+            "max_tokens": FRAGMENT_MAX_TOKENS,
+            "system": fragment_system_prompt,
+            "messages": [{"role": "user", "content": fragment_prompt.format(
+                kind=fragment.kind,
+                fragment=fragment.raw,
+                error=fragment.error[:1000],
+                schema=json.dumps(fragment.schema.model_json_schema()),
+            )}],
+        }
+        try:
+            async with get_limiter():
+                message = await self.client.messages.create(**request)
+            record_usage(message.usage)
+            text = "".join(block.text for block in message.content if block.type == "text")
+            item = fragment.schema.model_validate(loads_tolerant(text))
+        except (anthropic.APIError, ValueError) as e:
+            # ValidationError is a ValueError too
+            print(f"Could not repair {fragment.kind}: {e}")
+            REPAIRS.inc(kind="fragment_failed")
+            return None
+        REPAIRS.inc(kind="fragment")
+        return item
     
     def name(self) -> str:
         return f"Anthropic AI Interface"
\ No newline at end of file
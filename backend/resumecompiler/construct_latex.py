@@ -1,10 +1,16 @@
+import shutil
 import subprocess
+import tempfile
 import os
 from pathlib import Path
 from datetime import datetime
-import asyncio
 
 from resumecompiler.resume_field_populator import BaseResumeFieldPopulator
+from resumecompiler.latex_pool import PDFLATEX_ARGS, LatexCompileError, get_compile_pool, read_log, sandbox_env, scratch_dir
+from resumecompiler.renderer import get_renderer
+from resumecompiler.metrics import stage, timed
+from resumecompiler.repair import sanitize_resume
+from resumecompiler.preflight import compile_errors, preflight
 from resumecompiler.models import *
 
 
@@ -16,82 +22,180 @@ def compile_latex(tex_path: str, output_dir: str = 'build') -> None:
     name = Path(tex_path).stem
     output_dir = os.path.join(output_dir, name)
     os.makedirs(output_dir, exist_ok=True)
+    # pdflatex only reads files from the output directory, so the source is copied there
+    local_path = os.path.join(output_dir, f"{name}.tex")
+    if os.path.abspath(tex_path) != os.path.abspath(local_path):
+        shutil.copyfile(tex_path, local_path)
 
     # to debug, remove "-interaction=nonstopmode"
     # and remove the stdout & stderr specifiers
     print(f"Compiling {tex_path} -> PDF")
     subprocess.run(
-        ["pdflatex", "-output-directory", output_dir, tex_path],
+        ["pdflatex", "-no-shell-escape", "-output-directory", ".", f"{name}.tex"],
         stdout=subprocess.DEVNULL,
         stderr=subprocess.DEVNULL,
+        cwd=output_dir,
+        env=sandbox_env(output_dir),
         check=True
     )
     print(f"Output saved at {name}.pdf.\n")
 
 
+@timed("compile")
 async def compile_latex_async(tex_path: str, output_dir: str = 'build') -> None:
     """
-    Asynchronously compile the latex at the given path to a PDF using pdflatex.
+    Asynchronously compile the latex at the given path to a PDF.
+    Runs on the shared warm compile pool, which bounds concurrent pdflatex processes.
     """
     name = Path(tex_path).stem
-    output_dir = os.path.join(output_dir, name)
-    os.makedirs(output_dir, exist_ok=True)
-
     print(f"Compiling {tex_path} -> PDF (async)")
-    process = await asyncio.create_subprocess_exec(
-        "pdflatex", "-output-directory", output_dir, tex_path,
-        stdout=asyncio.subprocess.DEVNULL,
-        stderr=asyncio.subprocess.DEVNULL
-    )
-    await process.communicate()
-    if process.returncode != 0:
-        raise RuntimeError(f"pdflatex failed with exit code {process.returncode}")
+    try:
+        await get_compile_pool().submit(tex_path, output_dir)
+    except LatexCompileError as e:
+        with open(tex_path) as f:
+            raise LatexCompileError(str(e), e.log, compile_errors(e.log, f.read())) from None
     print(f"Output saved at {name}.pdf.\n")
 
 
-def construct_latex_resume(
+@timed("compile")
+def compile_latex_source(source: str, name: str = "resume") -> bytes:
+    """
+    Compile .tex source to a PDF in a per-job scratch directory (RAM-backed where available).
+    Blocking. The scratch directory is removed before returning.
+    :raises LatexCompileError: with the errors from pdflatex's log
+    :return: PDF bytes
+    """
+    with tempfile.TemporaryDirectory(prefix=f"{name}-", dir=scratch_dir()) as scratch:
+        tex_path = os.path.join(scratch, f"{name}.tex")
+        with open(tex_path, "w") as f:
+            f.write(source)
+
+        print(f"Compiling {name} -> PDF in {scratch}")
+        # the log file has everything pdflatex prints
+        process = subprocess.run(
+            ["pdflatex", *PDFLATEX_ARGS, "-output-directory", ".", f"{name}.tex"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            cwd=scratch,
+            env=sandbox_env(scratch)
+        )
+        if process.returncode != 0:
+            log = read_log(scratch, name)
+            raise LatexCompileError(
+                f"pdflatex failed with exit code {process.returncode}", log, compile_errors(log, source)
+            )
+        with open(os.path.join(scratch, f"{name}.pdf"), "rb") as f:
+            return f.read()
+
+
+@timed("compile")
+async def compile_latex_source_async(source: str, name: str = "resume") -> bytes:
+    """
+    Asynchronously compile .tex source to PDF bytes on the shared warm compile pool.
+    :raises LatexCompileError: with the errors from pdflatex's log
+    """
+    print(f"Compiling {name} -> PDF (async)")
+    try:
+        pdf_bytes = await get_compile_pool().compile_source(source, name)
+    except LatexCompileError as e:
+        raise LatexCompileError(str(e), e.log, compile_errors(e.log, source)) from None
+    print(f"Compiled {name}.pdf ({len(pdf_bytes)} bytes).\n")
+    return pdf_bytes
+
+
+def sanitize_latex(resume: Resume) -> Resume:
+    """
+    Escape LaTeX special characters the LLM left in any field, so they can't fail the compile
+    """
+    with stage("latex_sanitize"):
+        resume, fixed = sanitize_resume(resume)
+    if fixed:
+        print(f"Escaped LaTeX special characters in {', '.join(fixed)}")
+    return resume
+
+
+async def populate_resume(
+        field_populator: BaseResumeFieldPopulator,
+        job_info: str = "No job info given. Assume it's a generic SWE internship.",
+        on_item: ItemCallback | None = None
+    ) -> tuple[Resume, list[ChangeLog]]:
+    """
+    Get the resume data to render from the field populator, with LaTeX special characters escaped
+    :return: (resume, changelog)
+    """
+    print(f"Populating resume data from {field_populator.name()}...")
+    resume, changelog = await field_populator.get_resume_data(job_info, on_item=on_item)
+    print(f"Resume data populated.\n")
+    return sanitize_latex(resume), changelog
+
+
+def render_resume_source(
+        resume: Resume,
+        template: str | None = None,
+        on_warning: Callable[[str], None] | None = None
+    ) -> str:
+    """
+    Render the .tex source of a resume in memory, without writing it to tex/,
+    and preflight it so that a resume that can't compile fails before pdflatex runs.
+    :param template: LaTeX template source, static/template.tex by default
+    :param on_warning: called with anything that would spoil the PDF, e.g. running onto a second page
+    :raises PreflightError: if the source can't compile
+    """
+    with stage("render"):
+        tex_source = get_renderer().render(resume, template)
+
+    with stage("preflight"):
+        report = preflight(resume, tex_source)
+    for warning in report.warnings:
+        print(warning)
+        if on_warning is not None:
+            on_warning(warning)
+    return tex_source
+
+
+@timed("construct")
+async def render_latex_resume(
         field_populator: BaseResumeFieldPopulator,
         job_info: str = "No job info given. Assume it's a generic SWE internship.",
-        output_filename: str = ""
+        on_item: ItemCallback | None = None,
+        template: str | None = None,
+        on_warning: Callable[[str], None] | None = None
+    ) -> tuple[str, list[ChangeLog]]:
+    """
+    Populate, render and preflight a custom resume, see render_resume_source
+    :raises PreflightError: if the source can't compile
+    :return: (.tex source, changelog)
+    """
+    resume, changelog = await populate_resume(field_populator, job_info, on_item)
+    return render_resume_source(resume, template, on_warning), changelog
+
+
+@timed("construct")
+async def construct_latex_resume(
+        field_populator: BaseResumeFieldPopulator,
+        job_info: str = "No job info given. Assume it's a generic SWE internship.",
+        output_filename: str = "",
+        on_item: ItemCallback | None = None
     ) -> tuple[str, list[ChangeLog]]:
     """
     Construct a .tex file of a custom resume from a template & Resume object
     """
     print(f"Populating resume data from {field_populator.name()}...")
-    resume, changelog = field_populator.get_resume_data(job_info)
+    resume, changelog = await field_populator.get_resume_data(job_info, on_item=on_item)
     print(f"Resume data populated.\n")
+    resume = sanitize_latex(resume)
 
     # by default use current time to add to filename
     if not output_filename:
-        output_filename = f"AbhinavUppala_Resume_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.tex"
+        output_filename = f"Resume_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.tex"
         print("Filename not specified. Using current datetime for filename.")
     print(f"Writing to file {output_filename} ...")
 
-    # read template.tex
-    with open(os.path.join(".", "static", "template.tex")) as f:
-        template_str = f.read()
-
-    # use given field populator to add resume info to template doc
-    template_str += "\n" + ComponentCompiler.compile_education(resume.education)
-    
-    template_str += '\n\\section{Experience}\n\\resumeSubHeadingListStart'
-    for experience in resume.experiences:
-        template_str += "\n" + ComponentCompiler.compile_experience(experience)
-    template_str += '\n\\resumeSubHeadingListEnd'
-
-    template_str += '\n\\section{Projects}\n\\resumeSubHeadingListStart'
-    for project in resume.projects:
-        template_str += "\n" + ComponentCompiler.compile_project(project)
-    template_str += '\n\\resumeSubHeadingListEnd'
-
-    template_str += "\n" + ComponentCompiler.compile_skills(resume.skills)
-    template_str += '\n\\end{document}'
-    
     # write to new tex file
     result_path = os.path.join(".", "tex", output_filename)
     os.makedirs(os.path.join(".", "tex"), exist_ok=True)
-    with open(result_path, "w") as f:
-        f.write(template_str)
-    
+    with stage("render"):
+        get_renderer().write(resume, result_path)
+
     print(f"Saved latex resume to {result_path}.\n")
-    return result_path, changelog
\ No newline at end of file
+    return result_path, changelog
@@ -0,0 +1,245 @@
+import os
+import json
+import time
+import zlib
+import secrets
+from typing import AsyncIterator
+
+import redis
+import redis.asyncio
+from pydantic import BaseModel
+
+from resumecompiler.models import *
+
+
+# Every finished job is kept as a history record of its tenant, long after its job key
+# (RESULT_TTL_SECONDS) expired, so coming back to a posting doesn't pay for the LLM again:
+#   history:<tenant>            sorted set of record summaries (JSON) by creation time
+#   history:record:<id>         zlib compressed HistoryRecord
+#   history:key:<job key>       {id, artifact} of the latest record for a job key
+#   history:pending:<job key>   record of a job that is still compiling
+# PDFs stay in the artifact store under their content digest, records only name them.
+
+# retention tier -> days a tenant's records are kept, "name=days,..."
+RETENTION_TIERS = {
+    name.strip(): int(days)
+    for name, days in (
+        tier.split("=") for tier in os.getenv("HISTORY_RETENTION_TIERS", "free=7,standard=30,archive=365").split(",")
+    )
+}
+DEFAULT_RETENTION_TIER = os.getenv("HISTORY_DEFAULT_TIER", "standard")
+assert DEFAULT_RETENTION_TIER in RETENTION_TIERS, f"Unknown history tier {DEFAULT_RETENTION_TIER}"
+
+# a job whose compile never finishes leaves nothing behind after this long
+PENDING_TTL_SECONDS = 3600
+# records read from Redis per round trip when listing
+HISTORY_BATCH_SIZE = 100
+# longest title kept in a record's summary
+TITLE_MAX_CHARS = 100
+
+
+class HistoryRecord(BaseModel):
+    id: str
+    key: str
+    tenant: str
+    created: float
+    retention: str
+    job_info: str
+    resume: Resume
+    changelog: list[ChangeLog]
+    # artifact digest of the PDF, set once it is compiled
+    artifact: str | None = None
+
+    def summary(self) -> dict:
+        """
+        What GET /resumes lists for the record, small enough to keep in the index itself.
+        """
+        title = next((line.strip() for line in self.job_info.splitlines() if line.strip()), "")
+        return {
+            'id': self.id,
+            'key': self.key,
+            'created': self.created,
+            'title': title[:TITLE_MAX_CHARS],
+            'changes': len(self.changelog),
+            'artifact': self.artifact,
+        }
+
+
+def history_cursor(created: float, record_id: str) -> str:
+    """
+    Position of a record in its tenant's history, for AsyncHistoryReader.pages
+    """
+    return f"{created!r}:{record_id}"
+
+
+def parse_history_cursor(cursor: str) -> tuple[float, str | None]:
+    """
+    :return: (created, record id), the id is None for a cursor that is just a time
+    :raises ValueError: if it isn't a cursor
+    """
+    created, _, record_id = cursor.partition(":")
+    return float(created), record_id or None
+
+
+def encode_record(record: HistoryRecord) -> bytes:
+    return zlib.compress(record.model_dump_json().encode('utf-8'))
+
+
+def decode_record(data: bytes) -> HistoryRecord:
+    return HistoryRecord.model_validate_json(zlib.decompress(data))
+
+
+def retention_seconds(tier: str) -> int:
+    return RETENTION_TIERS.get(tier, RETENTION_TIERS[DEFAULT_RETENTION_TIER]) * 24 * 3600
+
+
+class _HistoryKeys:
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+
+    def _index_key(self, tenant: str) -> str:
+        return f"{self.prefix}:{tenant}"
+
+    def _record_key(self, record_id: str) -> str:
+        return f"{self.prefix}:record:{record_id}"
+
+    def _job_key(self, key: str) -> str:
+        return f"{self.prefix}:key:{key}"
+
+    def _pending_key(self, key: str) -> str:
+        return f"{self.prefix}:pending:{key}"
+
+
+class HistoryStore(_HistoryKeys):
+    """
+    Worker side of the result history. A generation stages its record, and the record
+    is only committed to the tenant's history once the job's PDF exists.
+    """
+
+    def __init__(self, client: redis.Redis, prefix: str = "history"):
+        super().__init__(prefix)
+        self.r = client
+
+    def stage(
+            self,
+            key: str,
+            tenant: str,
+            job_info: str,
+            resume: Resume,
+            changelog: list[ChangeLog],
+            retention: str = DEFAULT_RETENTION_TIER
+        ) -> None:
+        record = HistoryRecord(
+            id=secrets.token_hex(8),
+            key=key,
+            tenant=tenant,
+            created=time.time(),
+            retention=retention,
+            job_info=job_info,
+            resume=resume,
+            changelog=changelog,
+        )
+        self.r.set(self._pending_key(key), encode_record(record), ex=PENDING_TTL_SECONDS)
+
+    def commit(self, key: str, artifact: str) -> HistoryRecord | None:
+        """
+        Add the job's staged record to its tenant's history, pointing at the finished PDF,
+        and drop the tenant's records that are past their retention.
+        :return: the record, or None if nothing was staged (e.g. the job was restored from history)
+        """
+        data = self.r.getdel(self._pending_key(key))
+        if data is None:
+            return None
+        record = decode_record(data).model_copy(update={'artifact': artifact})
+        ttl = retention_seconds(record.retention)
+        index = self._index_key(record.tenant)
+
+        pipe = self.r.pipeline()
+        pipe.set(self._record_key(record.id), encode_record(record), ex=ttl)
+        pipe.set(self._job_key(key), json.dumps({'id': record.id, 'artifact': artifact}), ex=ttl)
+        pipe.zadd(index, {json.dumps(record.summary()): record.created})
+        pipe.zremrangebyscore(index, "-inf", f"({time.time() - ttl}")
+        pipe.expire(index, ttl)
+        pipe.execute()
+        return record
+
+    def find(self, key: str) -> HistoryRecord | None:
+        """
+        :return: latest record of a job key, if it is still retained
+        """
+        latest = self.r.get(self._job_key(key))
+        if latest is None:
+            return None
+        data = self.r.get(self._record_key(json.loads(latest)['id']))
+        return decode_record(data) if data is not None else None
+
+
+class AsyncHistoryReader(_HistoryKeys):
+    """
+    Web server side of the result history: listing, lookups by id and by job key.
+    """
+
+    def __init__(self, client: redis.asyncio.Redis, prefix: str = "history"):
+        super().__init__(prefix)
+        self.r = client
+
+    async def artifact(self, key: str) -> str | None:
+        """
+        :return: artifact digest of the latest retained record of a job key
+        """
+        latest = await self.r.get(self._job_key(key))
+        return json.loads(latest)['artifact'] if latest is not None else None
+
+    async def get(self, tenant: str, record_id: str) -> HistoryRecord | None:
+        data = await self.r.get(self._record_key(record_id))
+        if data is None:
+            return None
+        record = decode_record(data)
+        return record if record.tenant == tenant else None
+
+    async def pages(
+            self,
+            tenant: str,
+            before: str | None = None,
+            limit: int = 50
+        ) -> AsyncIterator[list[tuple[float, dict]]]:
+        """
+        Summaries of up to limit records, newest first, HISTORY_BATCH_SIZE per round trip.
+        :param before: history_cursor of the last record of the previous page, or a time to
+                       only list records created before it
+        :return: lists of (created, summary)
+        :raises ValueError: if before isn't a cursor
+        """
+        index = self._index_key(tenant)
+        position = parse_history_cursor(before) if before is not None else None
+        while limit > 0:
+            num = min(limit, HISTORY_BATCH_SIZE)
+            pipe = self.r.pipeline(transaction=False)
+            if position is None:
+                pipe.zrevrangebyscore(index, "+inf", "-inf", start=0, num=num, withscores=True)
+            else:
+                created, after_id = position
+                if after_id is not None:
+                    # records created in the same instant as the cursor's: members with equal
+                    # scores are ordered by their JSON, so by id, which each summary starts with
+                    pipe.zrevrangebyscore(index, created, created, withscores=True)
+                pipe.zrevrangebyscore(index, f"({created!r}", "-inf", start=0, num=num, withscores=True)
+            *ties, older = await pipe.execute()
+
+            page = [(created, json.loads(member)) for member, created in (ties[0] if ties else [])]
+            page = [(created, summary) for created, summary in page if summary['id'] < position[1]]
+            page = (page + [(created, json.loads(member)) for member, created in older])[:num]
+            if not page:
+                return
+            yield page
+            limit -= len(page)
+            position = (page[-1][0], page[-1][1]['id'])
+
+    async def records(self, summaries: list[dict]) -> list[HistoryRecord | None]:
+        """
+        Full records of a batch of summaries in one round trip, None for ones that expired.
+        """
+        if not summaries:
+            return []
+        blobs = await self.r.mget([self._record_key(summary['id']) for summary in summaries])
+        return [decode_record(blob) if blob is not None else None for blob in blobs]
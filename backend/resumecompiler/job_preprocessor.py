@@ -0,0 +1,206 @@
+import os
+import re
+import html
+from dataclasses import dataclass, field
+
+from resumecompiler.metrics import Counter
+from resumecompiler.similarity_cache import BOILERPLATE_LINES
+
+
+# longer postings are rejected rather than preprocessed
+JOB_INFO_MAX_CHARS = int(os.getenv("JOB_INFO_MAX_CHARS", 100_000))
+# compacted postings are cut down to about this many tokens
+JOB_INFO_MAX_TOKENS = int(os.getenv("JOB_INFO_MAX_TOKENS", 1500))
+# rough size of a token of English text, as the Anthropic tokenizer splits it
+CHARS_PER_TOKEN = 4
+
+JOB_INFO_TOKENS = Counter(
+    "resume_job_info_tokens_total",
+    "Estimated tokens of job postings as pasted (raw) and after preprocessing (compacted)",
+    ("stage",)
+)
+
+
+HTML_ITEM = re.compile(r"<li\b[^>]*>", re.I)
+HTML_BREAKS = re.compile(r"<(br|/?p|/?div|/?ul|/?ol|/?h[1-6]|/?tr)\b[^>]*>", re.I)
+HTML_TAG = re.compile(r"<[^>]+>")
+URL_PATTERN = re.compile(r"(https?://|www\.)\S+")
+BULLET = re.compile(r"^\s*([-*•·◦▪–—]|\d{1,2}[.)])\s+")
+
+# job board and careers site navigation, on top of the job board buttons normalize_job_info drops
+CHROME_LINES = re.compile(
+    r"^(home|jobs|careers|menu|search( for jobs)?|messaging|notifications|my network|skip to (main )?content|"
+    r"back to (search|jobs|all jobs)|(similar|recommended) jobs|set alert( for similar jobs)?|follow us|"
+    r"about the job|full job description|job type|time type|locations?|posted on|job requisition id|internship|"
+    r"(accept|reject|manage)( all)?( cookies)?|cookie (settings|preferences)|log ?in|sign ?up|"
+    r"follow|like|comment|repost|send|more|about|help|privacy|terms|job (details|id:? ?\S*)|"
+    r"\d+ (views|clicks|followers)|(full|part)[- ]time|remote|hybrid|on-?site|promoted|actively (hiring|recruiting))$"
+)
+# sentences that are the same in every posting of every company
+BOILERPLATE_SENTENCES = re.compile(
+    r"equal (employment )?opportunity|without regard to|protected (veteran|characteristic|class)|"
+    r"reasonable accommodation|e-verify|pay transparency|background check|privacy (policy|notice)|"
+    r"recruit(ing|ment) (agencies|agency|fraud)|unsolicited resumes|all rights reserved|"
+    r"affirmative action|drug[- ]free|\bcookies?\b|by (applying|submitting)"
+)
+
+# section kinds by heading, in the order they are tested; "drop" sections never reach the prompt
+SECTION_KINDS = (
+    ("drop", re.compile(
+        r"benefit|perk|compensation|salary|pay range|pay transparency|equal|\beeo|diversity|inclusion|"
+        r"accommodation|privacy|how to apply|application process|what we offer|why (join|work)|life at|"
+        r"our values|culture|legal|disclaimer|e-verify|total rewards|location|statement|working model|^pay$|^why\b"
+    )),
+    ("requirements", re.compile(
+        r"requirement|qualification|what you('ll)? (need|bring)|who you are|must[- ]have|skill|"
+        r"you have|about you|preferred|nice[- ]to[- ]have|bonus|tech(nology)? stack|tools|experience|education"
+    )),
+    ("role", re.compile(
+        r"responsibilit|what you('ll)? (do|work on)|the role|about the (role|job|position|team|opportunity)|"
+        r"duties|day[- ]to[- ]day|your impact|overview|description|summary|the team|projects?"
+    )),
+    ("company", re.compile(r"about|who we are|company|mission|business group")),
+)
+# lowercase words in a title-case heading, e.g. "What you'll do"
+MINOR_WORDS = {"a", "an", "and", "at", "do", "for", "in", "of", "on", "or", "the", "to", "we", "you", "you'll", "you’ll", "your"}
+# sections dropped first when over the token budget, the untitled lead paragraphs are "intro"
+TRIM_ORDER = ("company", "other", "intro", "role", "requirements")
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+@dataclass
+class Section:
+    kind: str
+    heading: str | None = None
+    lines: list[str] = field(default_factory=list)
+
+    def render(self) -> str:
+        return "\n".join(([self.heading] if self.heading else []) + self.lines)
+
+
+def _clean_lines(job_info: str) -> list[str]:
+    """
+    Plain text lines of a posting, without HTML, URLs, page chrome or boilerplate sentences.
+    Blank lines are kept (as "") since they separate paragraphs.
+    """
+    text = html.unescape(job_info)
+    if "<" in text and ">" in text:
+        text = HTML_TAG.sub(" ", HTML_BREAKS.sub("\n", HTML_ITEM.sub("\n- ", text)))
+    text = URL_PATTERN.sub("", text)
+
+    lines = []
+    for line in text.splitlines():
+        line = " ".join(line.split())
+        line = BULLET.sub("- ", line)
+        key = line.lower().strip(" -:")
+        if BOILERPLATE_LINES.match(key) or CHROME_LINES.match(key) or BOILERPLATE_SENTENCES.search(key):
+            line = ""
+        lines.append(line)
+    return lines
+
+
+def _heading_kind(line: str) -> str | None:
+    """
+    :return: kind of section the line is the heading of, or None if it isn't a heading
+    """
+    title = line.strip("#*_ ").rstrip(":").strip("*_ ")
+    words = title.split()
+    if not words or len(words) > 8 or line.startswith("- ") or ":" in title or title.endswith((".", ",", ";")):
+        return None
+    structural = line.rstrip().endswith(":") or line.startswith(("#", "**")) or \
+        (title.isupper() and sum(c.isalpha() for c in title) > 2)
+    # a short title-case line naming a known section is a heading even without a colon
+    titled = len(words) <= 4 and all(w[0].isupper() or w.lower() in MINOR_WORDS for w in words)
+    if not (structural or titled):
+        return None
+    lowered = title.lower()
+    for kind, pattern in SECTION_KINDS:
+        if pattern.search(lowered):
+            return kind
+    return "other" if structural else None
+
+
+def _sections(lines: list[str]) -> list[Section]:
+    sections = [Section("intro")]
+    for line in lines:
+        kind = _heading_kind(line) if line else None
+        if kind is not None:
+            sections.append(Section(kind, line.strip("#* ").rstrip("*_ ")))
+        elif line or (sections[-1].lines and sections[-1].lines[-1]):
+            sections[-1].lines.append(line)
+    for section in sections:
+        while section.lines and not section.lines[-1]:
+            section.lines.pop()
+    return [s for s in sections if s.lines and s.kind != "drop"]
+
+
+def _dedupe(sections: list[Section]) -> None:
+    """
+    Drop repeated lines (bullets listed under two headings, postings pasted twice), keeping the first.
+    """
+    seen: set[str] = set()
+    for section in sections:
+        kept = []
+        for line in section.lines:
+            key = re.sub(r"[^a-z0-9+#]+", "", line.lower())
+            if key:
+                if key in seen:
+                    continue
+                seen.add(key)
+            elif not kept or not kept[-1]:
+                continue
+            kept.append(line)
+        section.lines = kept
+    sections[:] = [s for s in sections if any(s.lines)]
+
+
+def _fit(sections: list[Section], max_tokens: int) -> None:
+    """
+    Drop whole sections, least useful first, then trailing lines, until the text fits max_tokens.
+    """
+    def tokens() -> int:
+        return estimate_tokens("\n\n".join(section.render() for section in sections))
+
+    for kind in TRIM_ORDER:
+        for section in reversed([s for s in sections if s.kind == kind]):
+            if tokens() <= max_tokens:
+                return
+            if len(sections) == 1:
+                break
+            if section.kind == "intro" and len(section.lines) > 1:
+                # keep the first line, usually the job title
+                section.lines = section.lines[:1]
+            else:
+                sections.remove(section)
+    while tokens() > max_tokens and sections:
+        last = sections[-1]
+        if len(last.lines) > 1:
+            last.lines.pop()
+        elif len(sections) > 1:
+            sections.pop()
+        else:
+            last.lines[0] = last.lines[0][:max_tokens * CHARS_PER_TOKEN]
+            return
+
+
+def compact_job_info(job_info: str, max_tokens: int | None = None) -> str:
+    """
+    Compact a pasted job posting for the prompt and the cache key: HTML, URLs, navigation,
+    EEO statements, benefits and other boilerplate sections are removed, repeated lines are
+    dropped, and the rest is cut to max_tokens, keeping requirements and responsibilities longest.
+    Compacting compacted text changes nothing.
+    """
+    max_tokens = max_tokens or JOB_INFO_MAX_TOKENS
+    sections = _sections(_clean_lines(job_info))
+    _dedupe(sections)
+    _fit(sections, max_tokens)
+    # a posting that is all boilerplate is kept as it is rather than sent empty
+    compacted = "\n\n".join(section.render() for section in sections) or \
+        " ".join(job_info.split())[:max_tokens * CHARS_PER_TOKEN]
+
+    JOB_INFO_TOKENS.inc(estimate_tokens(job_info), stage="raw")
+    JOB_INFO_TOKENS.inc(estimate_tokens(compacted), stage="compacted")
+    return compacted
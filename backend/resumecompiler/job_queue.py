@@ -0,0 +1,63 @@
+import os
+
+from celery import Celery, chain
+from dotenv import load_dotenv
+
+from resumecompiler.tenants import TenantProfile, default_profile
+
+
+# The web server only queues jobs, so it sends the tasks by name and never imports
+# tasks.py, which pulls in the LLM SDK, the LaTeX toolchain and every worker client.
+load_dotenv()
+assert os.getenv("REDIS_URL"), "Missing REDIS_URL environment variable"
+celery_app = Celery(
+    "worker",
+    broker=os.getenv("REDIS_URL"),
+    backend=os.getenv("REDIS_URL")
+)
+celery_app.conf.update(
+    # a task is only acked once it finishes, so a worker crash or restart redelivers it
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+    # LLM and compile workers scale separately:
+    # celery -A tasks.celery_app worker -Q llm / -Q compile
+    task_routes={
+        'tasks.generate_resume_task': {'queue': 'llm'},
+        'tasks.compile_resume_task': {'queue': 'compile'},
+        'tasks.prewarm_base_task': {'queue': 'compile'},
+    },
+)
+
+# how long a job key points at its PDF
+RESULT_TTL_SECONDS = 300
+
+
+def enqueue_resume_job(
+        key: str,
+        job_info: str,
+        token: str,
+        profile: TenantProfile | None = None,
+        deadline_seconds: float | None = None
+    ) -> None:
+    """
+    Queue generation then compilation of the resume for this job key.
+    :param token: lease token from JobStore.create, which callers must claim first
+    :param profile: tenant whose resume, template and model to use, the default one if None
+    :param deadline_seconds: latency budget for the generation, see ModelRouter
+    """
+    profile = (profile or default_profile()).to_dict()
+    chain(
+        celery_app.signature('tasks.generate_resume_task', kwargs={
+            'key': key, 'job_info': job_info, 'token': token, 'profile': profile, 'deadline_seconds': deadline_seconds
+        }),
+        celery_app.signature('tasks.compile_resume_task', kwargs={'key': key, 'token': token, 'profile': profile})
+    ).apply_async()
+
+
+def enqueue_prewarm(profile: TenantProfile | None = None) -> None:
+    """
+    Queue compiling the base resume of a tenant (the default one if None), e.g. at startup
+    or when its resume or template changes.
+    """
+    celery_app.send_task('tasks.prewarm_base_task', args=((profile or default_profile()).to_dict(),))
@@ -0,0 +1,211 @@
+import time
+import uuid
+import asyncio
+
+import redis
+import redis.asyncio
+
+
+# how long finished jobs (and their event streams) are kept around
+FINISHED_TTL_SECONDS = 300
+# upper bound for a running job, in case its worker disappears for good
+RUNNING_TTL_SECONDS = 3600
+
+# how long a queued job may wait for a worker before another request may take it over
+QUEUED_LEASE_SECONDS = 600
+# how long a running job's lease lasts without a heartbeat from its worker
+RUNNING_LEASE_SECONDS = 60
+
+TERMINAL_EVENTS = ('done', 'error')
+
+
+# only extend the lease if it still holds our token
+RENEW_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+# claim the key for a new job in one round trip, so sync workers and async handlers share it
+CREATE_JOB_SCRIPT = """
+local state = redis.call('hget', KEYS[1], 'state')
+local active = state and state ~= 'done' and state ~= 'error'
+if active and redis.call('exists', KEYS[2]) == 1 then
+    return false
+end
+if active then
+    -- the previous owner's lease ran out, tell anyone following its stream
+    redis.call('xadd', KEYS[3], '*', 'event', 'progress', 'data', 'Previous job stalled, restarting...')
+else
+    redis.call('del', KEYS[3])
+end
+redis.call('del', KEYS[1])
+redis.call('hset', KEYS[1], 'state', 'queued', 'created', ARGV[2], 'updated', ARGV[2], 'token', ARGV[1])
+redis.call('expire', KEYS[1], ARGV[3])
+redis.call('set', KEYS[2], ARGV[1], 'EX', ARGV[4])
+return ARGV[1]
+"""
+
+
+# end a job that never reached a worker, if this token still owns the key
+FAIL_JOB_SCRIPT = """
+if redis.call('get', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('xadd', KEYS[3], '*', 'event', 'error', 'data', ARGV[2])
+redis.call('hset', KEYS[2], 'state', 'error', 'updated', ARGV[3])
+redis.call('expire', KEYS[2], ARGV[4])
+redis.call('expire', KEYS[3], ARGV[4])
+redis.call('del', KEYS[1])
+return 1
+"""
+
+
+def state_key(key: str) -> str:
+    return f"job:{key}"
+
+
+def events_key(key: str) -> str:
+    return f"job:{key}:events"
+
+
+def lease_key(key: str) -> str:
+    return f"job:{key}:lease"
+
+
+def _create_job_args(key: str) -> tuple:
+    return (
+        3, state_key(key), lease_key(key), events_key(key),
+        uuid.uuid4().hex, time.time(), RUNNING_TTL_SECONDS, QUEUED_LEASE_SECONDS
+    )
+
+
+class JobStore:
+    """
+    Job-state record, in-flight lease and progress event stream for each resume job, kept in Redis.
+
+    job:<key>         hash with state (queued, generating, compiling, done, error) and timestamps
+    job:<key>:lease   token of the job that currently owns the key, expires unless kept alive
+    job:<key>:events  stream of (event, data) entries, replayable from any id
+
+    The lease makes jobs single-flight across the cluster: while it is held, other
+    requests for the key follow the existing event stream instead of starting a job.
+    If the worker crashes, the lease expires and the next request takes the key over.
+    """
+
+    def __init__(self, client: redis.Redis):
+        self.r = client
+
+    def create(self, key: str) -> str | None:
+        """
+        Register a new job for the key unless one is already queued or running.
+        Jobs that ended (in an error, or done but with their result since evicted)
+        or whose lease expired can be started again.
+        :return: lease token if the caller should enqueue the job, otherwise None
+        """
+        token = self.r.eval(CREATE_JOB_SCRIPT, *_create_job_args(key))
+        return token.decode() if token else None
+
+    def renew_lease(self, key: str, token: str, ttl: int = RUNNING_LEASE_SECONDS) -> bool:
+        """
+        Extend the lease if this token still owns the key.
+        :return: False if another job has taken the key over
+        """
+        return bool(self.r.eval(RENEW_LEASE_SCRIPT, 1, lease_key(key), token, ttl))
+
+    async def hold_lease(self, key: str, token: str, interval: float = RUNNING_LEASE_SECONDS / 3) -> None:
+        """
+        Keep renewing the lease until cancelled, for the duration of a long-running step.
+        """
+        while True:
+            await asyncio.to_thread(self.renew_lease, key, token)
+            await asyncio.sleep(interval)
+
+    def get(self, key: str) -> dict[str, str]:
+        return {k.decode(): v.decode() for k, v in self.r.hgetall(state_key(key)).items()}
+
+    def set_state(self, key: str, state: str, **fields) -> None:
+        self.r.hset(state_key(key), mapping={'state': state, 'updated': time.time(), **fields})
+
+    def publish(self, key: str, event: str, data: str) -> None:
+        """
+        Append an event to the job's stream. 'done' and 'error' also finish the job.
+        """
+        pipe = self.r.pipeline()
+        pipe.xadd(events_key(key), {'event': event, 'data': data})
+        if event in TERMINAL_EVENTS:
+            pipe.hset(state_key(key), mapping={'state': event, 'updated': time.time()})
+            pipe.expire(state_key(key), FINISHED_TTL_SECONDS)
+            pipe.expire(events_key(key), FINISHED_TTL_SECONDS)
+            pipe.delete(lease_key(key))
+        else:
+            pipe.expire(events_key(key), RUNNING_TTL_SECONDS)
+        pipe.execute()
+
+
+async def create_job(client: redis.asyncio.Redis, key: str) -> str | None:
+    """
+    JobStore.create for the web server's async client.
+    :return: lease token if the caller should enqueue the job, otherwise None
+    """
+    token = await client.eval(CREATE_JOB_SCRIPT, *_create_job_args(key))
+    return token.decode() if token else None
+
+
+async def fail_job(client: redis.asyncio.Redis, key: str, token: str, message: str) -> bool:
+    """
+    Publish an 'error' event and release the lease of a job that couldn't be queued,
+    so requests following it don't wait for the lease to expire.
+    :return: False if another job owns the key by now
+    """
+    return bool(await client.eval(
+        FAIL_JOB_SCRIPT, 3, lease_key(key), state_key(key), events_key(key),
+        token, message, time.time(), FINISHED_TTL_SECONDS
+    ))
+
+
+async def follow_job_events(
+        client: redis.asyncio.Redis,
+        last_ids: dict[str, str],
+        block_ms: int = 15000
+    ):
+    """
+    Yield (key, event id, event, data) for each of the given jobs' streams, starting
+    after the given ids ('0' for the beginning), until every job has finished.
+    A job that never started or whose stream has expired ends with an 'error' event.
+    Yields (None, None, None, None) when nothing arrived within block_ms, so callers can send keepalives.
+    """
+    pending = {events_key(key): key for key in last_ids}
+    cursors = {events_key(key): last_id for key, last_id in last_ids.items()}
+
+    check_missing = True
+    while pending:
+        if check_missing:
+            # a missing stream means the job is gone, don't wait on it forever
+            for stream in list(pending):
+                if not await client.exists(stream, state_key(pending[stream])):
+                    yield pending[stream], None, 'error', 'Job not found or expired.'
+                    cursors.pop(stream)
+                    pending.pop(stream)
+            if not pending:
+                return
+
+        response = await client.xread(cursors, block=block_ms)
+        check_missing = not response
+        if not response:
+            yield None, None, None, None
+            continue
+
+        for stream, entries in response:
+            stream = stream.decode()
+            for entry_id, fields in entries:
+                entry_id = entry_id.decode()
+                cursors[stream] = entry_id
+                event, data = fields[b'event'].decode(), fields[b'data'].decode()
+                yield pending[stream], entry_id, event, data
+                if event in TERMINAL_EVENTS:
+                    cursors.pop(stream)
+                    pending.pop(stream)
+                    break
@@ -0,0 +1,451 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: dumps are only serialized within one process
+    fcntl = None
+
+
+# Lines that configure pdftex internals which are not saved in a dumped
+# format, so they must be replayed in every job instead of the preamble.
+UNDUMPABLE_MARKERS = ("glyphtounicode", "\\pdfgentounicode")
+BEGIN_DOCUMENT = "\\begin{document}"
+# what pdflatex logs when the format, not the document, is the problem
+FORMAT_ERRORS = ("I can't find the format file", "Fatal format file error", "doesn't match")
+# tenant templates are compiled as uploaded, so pdflatex never runs shell commands
+PDFLATEX_ARGS = ("-interaction=nonstopmode", "-halt-on-error", "-no-shell-escape")
+
+
+def sandbox_env(output_dir: str) -> dict[str, str]:
+    """
+    Environment for pdflatex that only lets it read files of the TeX distribution and of
+    its own job (run from output_dir), and write to output_dir: no absolute paths, no ..
+    and no dot files, so \\input{/app/.env} in a template fails.
+    """
+    env = dict(os.environ)
+    env["openin_any"] = "p"
+    env["openout_any"] = "p"
+    env["shell_escape"] = "f"
+    env["TEXMFOUTPUT"] = os.path.abspath(output_dir)
+    return env
+
+
+def split_preamble(source: str) -> tuple[str, str]:
+    """
+    Split a full .tex source into (dumpable preamble, per-job body).
+    The body keeps any undumpable preamble lines plus everything from \\begin{document}.
+    """
+    idx = source.find(BEGIN_DOCUMENT)
+    if idx == -1:
+        raise ValueError("LaTeX source has no \\begin{document}")
+
+    preamble_lines, replay_lines = [], []
+    for line in source[:idx].splitlines():
+        if any(marker in line for marker in UNDUMPABLE_MARKERS):
+            replay_lines.append(line)
+        else:
+            preamble_lines.append(line)
+
+    preamble = "\n".join(preamble_lines)
+    body = "\n".join(replay_lines) + "\n" + source[idx:]
+    return preamble, body
+
+
+class LatexCompileError(RuntimeError):
+    """
+    pdflatex failed to build a PDF.
+    :param log: contents of its .log file, where the errors are
+    :param issues: the errors found in the log, see preflight.compile_errors
+    """
+
+    def __init__(self, message: str, log: str = "", issues: list | None = None):
+        super().__init__(message)
+        self.log = log
+        self.issues = issues or []
+
+    def __str__(self) -> str:
+        if not self.issues:
+            return super().__str__()
+        return "; ".join(str(issue) for issue in self.issues[:3])
+
+
+def read_log(output_dir: str, name: str) -> str:
+    """
+    :return: pdflatex's log of the named job, empty if it wrote none
+    """
+    try:
+        with open(os.path.join(output_dir, f"{name}.log"), errors="replace") as f:
+            return f.read()
+    except OSError:
+        return ""
+
+
+def format_failed(log: str) -> bool:
+    """
+    Whether a warm compile failed because of its format rather than the document body.
+    pdflatex writes no log at all when it can't load the format.
+    """
+    return not log or any(error in log for error in FORMAT_ERRORS)
+
+
+def scratch_dir() -> str:
+    """
+    Parent directory for per-job scratch directories: LATEX_SCRATCH_DIR, else /dev/shm
+    when it is a writable tmpfs (Linux), else the system temp directory.
+    """
+    configured = os.getenv("LATEX_SCRATCH_DIR")
+    if configured:
+        return configured
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+@dataclass
+class CompileJob:
+    source: str
+    name: str
+    # all of pdflatex's output (aux, log, pdf) goes here
+    output_dir: str
+    future: asyncio.Future = field(repr=False)
+    # existing .tex file to use for a full compile, the source is written out if not given
+    tex_path: str | None = None
+
+
+class LatexCompilePool:
+    """
+    Fixed-size pool of pdflatex workers fed from a queue.
+
+    Each distinct preamble is dumped once into a custom format, so jobs only
+    typeset the document body instead of reloading every package. The most recently used
+    max_formats formats are kept (one per tenant template), older ones are deleted.
+    format_dir may be shared by every worker process on the host: dumps are serialized
+    with a file lock and renamed into place when complete, and a format another process
+    deleted is dumped again.
+    The pool size caps how many TeX processes run at once on this box.
+    """
+
+    def __init__(
+            self,
+            size: int | None = None,
+            timeout: float | None = None,
+            format_dir: str = os.path.join("build", ".formats"),
+            max_formats: int | None = None
+        ):
+        self.size = size or int(os.getenv("LATEX_POOL_SIZE", os.cpu_count() or 2))
+        self.timeout = timeout or float(os.getenv("LATEX_JOB_TIMEOUT", 30))
+        self.format_dir = format_dir
+        self.max_formats = max_formats or int(os.getenv("LATEX_MAX_FORMATS", 32))
+
+        self._queue: asyncio.Queue[CompileJob] = asyncio.Queue()
+        self._workers: dict[int, asyncio.Task] = {}
+        # preamble digest -> format name (None if dumping it failed), least recently used first
+        self._formats: OrderedDict[str, str | None] = OrderedDict()
+        self._format_lock = asyncio.Lock()
+        self._closed = False
+
+    # ================= lifecycle =================
+
+    def start(self) -> None:
+        """
+        Spawn worker tasks on the running event loop. Safe to call repeatedly.
+        """
+        for worker_id in range(self.size):
+            task = self._workers.get(worker_id)
+            if task is None or task.done():
+                self._spawn(worker_id)
+
+    async def close(self) -> None:
+        """
+        Stop all workers and fail any jobs still waiting in the queue.
+        """
+        self._closed = True
+        for task in self._workers.values():
+            task.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        self._workers.clear()
+
+        while not self._queue.empty():
+            job = self._queue.get_nowait()
+            if not job.future.done():
+                job.future.set_exception(RuntimeError("LaTeX compile pool was closed"))
+
+    def _spawn(self, worker_id: int) -> None:
+        task = asyncio.create_task(self._worker(worker_id), name=f"latex-worker-{worker_id}")
+        task.add_done_callback(lambda t, wid=worker_id: self._on_worker_exit(wid, t))
+        self._workers[worker_id] = task
+
+    def _on_worker_exit(self, worker_id: int, task: asyncio.Task) -> None:
+        # crash recovery: a worker should only ever exit when cancelled
+        if self._closed or task.cancelled():
+            return
+        print(f"LaTeX worker {worker_id} died ({task.exception()!r}), restarting.")
+        self._spawn(worker_id)
+
+    # ================= public API =================
+
+    async def submit(self, tex_path: str, output_dir: str = 'build') -> str:
+        """
+        Queue a .tex file for compilation and wait for it.
+        :return: path of the generated PDF
+        """
+        name = Path(tex_path).stem
+        with open(tex_path) as f:
+            source = f.read()
+        return await self._submit(source, name, os.path.join(output_dir, name), tex_path)
+
+    async def compile_source(self, source: str, name: str = "resume") -> bytes:
+        """
+        Compile .tex source in a per-job scratch directory (RAM-backed where available)
+        and return the PDF bytes. Nothing is left on disk once this returns.
+        """
+        scratch = tempfile.mkdtemp(prefix=f"{name}-", dir=scratch_dir())
+        try:
+            pdf_path = await self._submit(source, name, scratch)
+            with open(pdf_path, "rb") as f:
+                return f.read()
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    async def _submit(self, source: str, name: str, output_dir: str, tex_path: str | None = None) -> str:
+        if self._closed:
+            raise RuntimeError("LaTeX compile pool was closed")
+        self.start()
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(CompileJob(source, name, output_dir, future, tex_path))
+        return await future
+
+    # ================= workers =================
+
+    async def _worker(self, worker_id: int) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                pdf_path = await self._compile(job)
+            except asyncio.CancelledError:
+                if not job.future.done():
+                    job.future.set_exception(RuntimeError("LaTeX worker was cancelled"))
+                raise
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                if not job.future.done():
+                    job.future.set_result(pdf_path)
+            finally:
+                self._queue.task_done()
+
+    async def _compile(self, job: CompileJob) -> str:
+        name, output_dir = job.name, job.output_dir
+        os.makedirs(output_dir, exist_ok=True)
+
+        try:
+            preamble, body = split_preamble(job.source)
+        except ValueError:
+            preamble, body = None, None
+
+        fmt_name = await self._get_format(preamble) if preamble is not None else None
+        if fmt_name is not None:
+            with open(os.path.join(output_dir, f"{name}.body.tex"), "w") as f:
+                f.write(body)
+            returncode = await self._run_pdflatex(
+                ["-fmt", fmt_name, "-jobname", name, f"{name}.body.tex"], output_dir
+            )
+            if returncode == 0:
+                return os.path.join(output_dir, f"{name}.pdf")
+
+            if format_failed(read_log(output_dir, name)):
+                # stale, corrupt or deleted by another process, dump it again on the next job
+                print(f"Format {fmt_name} can't be loaded, falling back to full compile of {name}.")
+                digest = self._preamble_hash(preamble)
+                self._formats.pop(digest, None)
+                self._remove_format(digest)
+            else:
+                # most likely the body itself, the full compile's log has the errors to report
+                print(f"Warm compile of {name} failed, falling back to full compile.")
+
+        # pdflatex only reads files from the job's directory, so the source is written there
+        tex_path = os.path.join(output_dir, f"{name}.tex")
+        if job.tex_path is None or os.path.abspath(job.tex_path) != os.path.abspath(tex_path):
+            with open(tex_path, "w") as f:
+                f.write(job.source)
+        returncode = await self._run_pdflatex([f"{name}.tex"], output_dir)
+        if returncode != 0:
+            raise LatexCompileError(
+                f"pdflatex failed with exit code {returncode}",
+                read_log(output_dir, name)
+            )
+        return os.path.join(output_dir, f"{name}.pdf")
+
+    async def _run_pdflatex(self, args: list[str], output_dir: str) -> int:
+        """
+        Run one pdflatex process from output_dir (file arguments are relative to it), killing
+        it if it exceeds the per-job timeout. Its diagnostics are in the .log file it writes there.
+        """
+        process = await asyncio.create_subprocess_exec(
+            "pdflatex", *PDFLATEX_ARGS, "-output-directory", ".", *args,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+            cwd=output_dir,
+            env=self._env(output_dir)
+        )
+        try:
+            await asyncio.wait_for(process.wait(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise TimeoutError(f"pdflatex timed out after {self.timeout}s")
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+        return process.returncode
+
+    # ================= preamble formats =================
+
+    @staticmethod
+    def _preamble_hash(preamble: str) -> str:
+        return hashlib.sha256(preamble.encode('utf-8')).hexdigest()[:16]
+
+    def _env(self, output_dir: str) -> dict[str, str]:
+        # let kpathsea find our dumped formats before the system ones
+        env = sandbox_env(output_dir)
+        env["TEXFORMATS"] = os.path.abspath(self.format_dir) + os.pathsep + env.get("TEXFORMATS", "")
+        return env
+
+    @staticmethod
+    def _format_name(digest: str) -> str:
+        return f"resume-{digest}"
+
+    def _format_path(self, fmt_name: str) -> str:
+        return os.path.join(self.format_dir, f"{fmt_name}.fmt")
+
+    def _remove_format(self, digest: str) -> None:
+        # _get_format reuses a .fmt file it finds, so a dropped format must not stay on disk.
+        # Processes already compiling with it keep their open file.
+        try:
+            os.remove(self._format_path(self._format_name(digest)))
+        except FileNotFoundError:
+            pass
+
+    def _cached_format(self, digest: str) -> tuple[bool, str | None]:
+        """
+        :return: whether this process knows the preamble's format, and its name. A format
+                 whose file another process has deleted since is forgotten.
+        """
+        if digest not in self._formats:
+            return False, None
+        fmt_name = self._formats[digest]
+        if fmt_name is not None and not os.path.exists(self._format_path(fmt_name)):
+            del self._formats[digest]
+            return False, None
+        self._formats.move_to_end(digest)
+        return True, fmt_name
+
+    @asynccontextmanager
+    async def _dump_lock(self):
+        # held across processes sharing format_dir, so each format is dumped once per host
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.format_dir, "dump.lock"), "w") as f:
+            await asyncio.to_thread(fcntl.flock, f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    async def _get_format(self, preamble: str) -> str | None:
+        """
+        Return the format name for this preamble, dumping it on first use.
+        None means the dump failed and jobs should use a full compile.
+        """
+        digest = self._preamble_hash(preamble)
+        found, fmt_name = self._cached_format(digest)
+        if found:
+            return fmt_name
+
+        async with self._format_lock:
+            found, fmt_name = self._cached_format(digest)
+            if found:
+                return fmt_name
+
+            fmt_name = self._format_name(digest)
+            os.makedirs(self.format_dir, exist_ok=True)
+            async with self._dump_lock():
+                if not os.path.exists(self._format_path(fmt_name)):
+                    if not await self._dump_format(preamble, fmt_name):
+                        self._remember_format(digest, None)
+                        return None
+
+            self._remember_format(digest, fmt_name)
+            return fmt_name
+
+    async def _dump_format(self, preamble: str, fmt_name: str) -> bool:
+        """
+        Dump the preamble under a name of this process and rename it into place once
+        complete, so no process loads a partly written format.
+        :return: False if pdflatex failed, its log is left in format_dir
+        """
+        job_name = f"{fmt_name}-{os.getpid()}"
+        print(f"Dumping LaTeX format {fmt_name}...")
+        with open(os.path.join(self.format_dir, f"{job_name}.tex"), "w") as f:
+            f.write(preamble + "\n\\dump\n")
+        try:
+            returncode = await self._run_pdflatex(
+                ["-ini", "-jobname", job_name, "&pdflatex", f"{job_name}.tex"],
+                self.format_dir
+            )
+        except (TimeoutError, OSError) as e:
+            print(f"Could not dump LaTeX format: {e}")
+            returncode = 1
+
+        leftovers = [f"{job_name}.tex"]
+        if returncode == 0:
+            os.replace(self._format_path(job_name), self._format_path(fmt_name))
+            leftovers.append(f"{job_name}.log")
+        else:
+            leftovers.append(f"{job_name}.fmt")
+        for leftover in leftovers:
+            try:
+                os.remove(os.path.join(self.format_dir, leftover))
+            except FileNotFoundError:
+                pass
+        return returncode == 0
+
+    def _remember_format(self, digest: str, fmt_name: str | None) -> None:
+        self._formats[digest] = fmt_name
+        while len(self._formats) > self.max_formats:
+            evicted, _ = self._formats.popitem(last=False)
+            print(f"Evicting LaTeX format {self._format_name(evicted)}")
+            self._remove_format(evicted)
+
+
+_pool: LatexCompilePool | None = None
+
+
+def get_compile_pool() -> LatexCompilePool:
+    """
+    Process-wide compile pool, created on first use.
+    """
+    global _pool
+    if _pool is None:
+        _pool = LatexCompilePool()
+    return _pool
+
+
+async def close_compile_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
@@ -0,0 +1,278 @@
+import time
+import bisect
+import threading
+import functools
+import inspect
+from contextlib import contextmanager
+
+import redis
+import redis.asyncio
+
+# spans are optional, and no-ops unless an OpenTelemetry SDK is configured
+try:
+    from opentelemetry import trace
+    _tracer = trace.get_tracer("resumecompiler")
+except ImportError:
+    _tracer = None
+
+
+# Every process (web server and Celery workers) records into its own registry and
+# periodically adds the deltas to one Redis hash, whose fields are Prometheus series
+# lines (e.g. resume_stage_seconds_bucket{stage="compile",le="2.5"}) and whose values
+# are their totals. GET /metrics just prints that hash. Each metric's type and help are
+# stored in another hash (name -> "<type> <help>"), because the process serving
+# GET /metrics doesn't import every module that defines one.
+METRICS_KEY = "metrics"
+METRICS_META_KEY = "metrics:meta"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_registry: dict[str, "Metric"] = {}
+_lock = threading.Lock()
+
+
+def _series(name: str, labels: dict[str, str]) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        _registry[name] = self
+
+    def _labels(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def drain(self) -> dict[str, float]:
+        """
+        :return: series -> delta recorded since the last drain, resetting them
+        """
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...] = ()):
+        super().__init__(name, description, label_names)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._labels(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def drain(self) -> dict[str, float]:
+        values, self._values = self._values, {}
+        return {
+            _series(self.name, dict(zip(self.label_names, key))): value
+            for key, value in values.items()
+        }
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+            self,
+            name: str,
+            description: str,
+            label_names: tuple[str, ...] = (),
+            buckets: tuple[float, ...] = DEFAULT_BUCKETS
+        ):
+        super().__init__(name, description, label_names)
+        self.buckets = buckets
+        # per label set: [count per bucket (last is +Inf)], sum, count
+        self._values: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._labels(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def drain(self) -> dict[str, float]:
+        values, self._values = self._values, {}
+        deltas = {}
+        for key, (counts, total, count) in values.items():
+            labels = dict(zip(self.label_names, key))
+            # buckets are cumulative, so adding deltas keeps the stored totals cumulative too
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                deltas[_series(f"{self.name}_bucket", {**labels, "le": str(bound)})] = cumulative
+            deltas[_series(f"{self.name}_sum", labels)] = total
+            deltas[_series(f"{self.name}_count", labels)] = count
+        return deltas
+
+
+# ==================================================
+# ================ Pipeline metrics ================
+# ==================================================
+
+
+STAGE_SECONDS = Histogram(
+    "resume_stage_seconds",
+    "Time spent in each stage of the resume pipeline",
+    ("stage",)
+)
+LLM_TOKENS = Counter(
+    "resume_llm_tokens_total",
+    "Anthropic tokens used, by type (input, output, cache_read, cache_creation)",
+    ("type",)
+)
+CACHE_REQUESTS = Counter(
+    "resume_cache_requests_total",
+    "Cache lookups by cache (result, similarity, artifact) and outcome (hit, miss)",
+    ("cache", "result")
+)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Time a block as one pipeline stage, and trace it as a span if OpenTelemetry is installed.
+    """
+    start = time.perf_counter()
+    if _tracer is None:
+        try:
+            yield
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
+        return
+
+    with _tracer.start_as_current_span(f"resume.{name}"):
+        try:
+            yield
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
+
+
+def timed(name: str):
+    """
+    Decorator version of stage() for sync and async functions.
+    """
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+# ==================================================
+# ============= Aggregation & export ===============
+# ==================================================
+
+
+def _drain_all() -> tuple[dict[str, float], dict[str, str]]:
+    """
+    :return: series -> delta, and name -> "<type> <help>" of the metrics they belong to
+    """
+    deltas, meta = {}, {}
+    with _lock:
+        for metric in _registry.values():
+            drained = metric.drain()
+            if drained:
+                deltas.update(drained)
+                meta[metric.name] = f"{metric.kind} {metric.description}"
+    return deltas, meta
+
+
+def _queue_flush(pipe, deltas: dict[str, float], meta: dict[str, str]) -> None:
+    for series, delta in deltas.items():
+        pipe.hincrbyfloat(METRICS_KEY, series, delta)
+    pipe.hset(METRICS_META_KEY, mapping=meta)
+
+
+def flush(client: redis.Redis) -> None:
+    """
+    Add this process's recorded metrics to the shared totals in Redis.
+    """
+    deltas, meta = _drain_all()
+    if not deltas:
+        return
+    pipe = client.pipeline(transaction=False)
+    _queue_flush(pipe, deltas, meta)
+    pipe.execute()
+
+
+async def flush_async(client: redis.asyncio.Redis) -> None:
+    deltas, meta = _drain_all()
+    if not deltas:
+        return
+    pipe = client.pipeline(transaction=False)
+    _queue_flush(pipe, deltas, meta)
+    await pipe.execute()
+
+
+def _series_order(series: str) -> tuple:
+    # group a histogram's series by label set, with buckets in increasing order
+    name, _, labels = series.partition("{")
+    le = None
+    parts = []
+    for part in labels.rstrip("}").split(","):
+        if part.startswith("le="):
+            le = float(part[4:-1])
+        else:
+            parts.append(part)
+    return (",".join(parts), name.rsplit("_", 1)[-1] != "bucket", le if le is not None else 0.0, name)
+
+
+def _metric_name(series: str, kinds: dict[str, str]) -> str:
+    name = series.split("{")[0]
+    base, _, suffix = name.rpartition("_")
+    if suffix in ("bucket", "sum", "count") and kinds.get(base) == "histogram":
+        return base
+    return name
+
+
+def render_prometheus(totals: dict[bytes, bytes], meta: dict[bytes, bytes] | None = None) -> str:
+    """
+    Prometheus text exposition of the totals stored under METRICS_KEY.
+    :param meta: the types and help stored under METRICS_META_KEY, for metrics this process
+                 doesn't define itself
+    """
+    described = {name: f"{metric.kind} {metric.description}" for name, metric in _registry.items()}
+    for name, kind_and_help in (meta or {}).items():
+        described.setdefault(name.decode(), kind_and_help.decode())
+    kinds = {name: kind_and_help.split(" ", 1)[0] for name, kind_and_help in described.items()}
+
+    by_metric: dict[str, list[str]] = {}
+    for series in totals:
+        series = series.decode()
+        by_metric.setdefault(_metric_name(series, kinds), []).append(series)
+
+    lines = []
+    for name in sorted(by_metric, key=lambda name: (name not in _registry, name)):
+        if name in described:
+            kind, _, description = described[name].partition(" ")
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+        for series in sorted(by_metric[name], key=_series_order):
+            value = float(totals[series.encode()])
+            lines.append(f"{series} {int(value) if value.is_integer() else value}")
+    return "\n".join(lines) + "\n"
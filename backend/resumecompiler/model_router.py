@@ -0,0 +1,312 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from typing import Callable
+
+import anthropic
+
+from resumecompiler.models import *
+from resumecompiler.metrics import Counter, Histogram
+from resumecompiler.tenants import MODEL_TIERS
+
+
+# Fallbacks and hedges only ever go down MODEL_TIERS (kept with the tenants, so the web
+# server checks budgets without importing the SDK), so a slow or overloaded model is
+# replaced by a faster one.
+
+# start a faster model if the primary has produced nothing after this long
+HEDGE_AFTER_SECONDS = float(os.getenv("MODEL_HEDGE_SECONDS", 20))
+# retries of one model on 429 / 529 / connection errors before falling back
+MODEL_MAX_RETRIES = int(os.getenv("MODEL_MAX_RETRIES", 2))
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8.0
+
+# routing only trusts a model's stats once it has this many recent samples
+MIN_SAMPLES = 5
+# skip a model as primary while more than this share of its recent requests failed
+MAX_FAILURE_RATE = 0.5
+
+RETRYABLE_ERRORS = (
+    anthropic.RateLimitError,
+    anthropic.InternalServerError,
+    anthropic.APIConnectionError,
+)
+
+
+MODEL_REQUESTS = Counter(
+    "resume_model_requests_total",
+    "LLM attempts by model and outcome (ok, rate_limited, overloaded, error, cancelled)",
+    ("model", "outcome")
+)
+MODEL_SECONDS = Histogram(
+    "resume_model_seconds",
+    "Duration of successful LLM attempts by model",
+    ("model",)
+)
+
+
+def _outcome(error: BaseException) -> str:
+    if isinstance(error, anthropic.RateLimitError):
+        return "rate_limited"
+    if isinstance(error, anthropic.InternalServerError) and error.status_code == 529:
+        return "overloaded"
+    return "error"
+
+
+def _retry_after(error: BaseException) -> float | None:
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers["retry-after"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+class ModelStats:
+    """
+    Recent latencies and failures of one model in this process.
+    """
+
+    def __init__(self, window: int = 50):
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.failures: deque[bool] = deque(maxlen=window)
+
+    def record(self, seconds: float | None, failed: bool) -> None:
+        self.failures.append(failed)
+        if seconds is not None:
+            self.latencies.append(seconds)
+
+    def p95(self) -> float | None:
+        if len(self.latencies) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def failure_rate(self) -> float | None:
+        if len(self.failures) < MIN_SAMPLES:
+            return None
+        return sum(self.failures) / len(self.failures)
+
+    def summary(self) -> dict:
+        return {
+            'samples': len(self.latencies),
+            'p95_seconds': self.p95(),
+            'failure_rate': self.failure_rate(),
+        }
+
+
+_stats: dict[str, ModelStats] = {}
+_stats_lock = threading.Lock()
+
+
+def model_stats(model: str) -> ModelStats:
+    with _stats_lock:
+        if model not in _stats:
+            _stats[model] = ModelStats()
+        return _stats[model]
+
+
+def stats_summary() -> dict[str, dict]:
+    with _stats_lock:
+        return {model: stats.summary() for model, stats in _stats.items()}
+
+
+def _anthropic_interface(model: str) -> BaseAIInterface:
+    # the router does its own retries, so the SDK's are turned off
+    from resumecompiler.claude_interface import AnthropicAIInterface, get_async_client
+    client = get_async_client().with_options(
+        max_retries=0,
+        timeout=float(os.getenv("MODEL_TIMEOUT_SECONDS", 120))
+    )
+    return AnthropicAIInterface(client=client, model=model)
+
+
+class ModelRouter(BaseAIInterface):
+    """
+    Generates with the best model the request's budget allows, keeping tail latency bounded:
+    - models that are recently too slow for the deadline, or mostly failing, are skipped
+    - 429 / 529 / connection errors are retried with jittered backoff, then the next faster model is tried
+    - if the model has produced nothing after hedge_after seconds, the next faster model is started
+      too, and whichever streams first is kept (it alone reports to on_item) while the other is cancelled
+    - items a failed model already streamed aren't reported again by its fallback
+    used_model is the model that produced the last result.
+    """
+
+    def __init__(
+            self,
+            model: str | None = None,
+            deadline_seconds: float | None = None,
+            hedge_after: float | None = None,
+            interface_factory: Callable[[str], BaseAIInterface] = _anthropic_interface
+        ):
+        """
+        :param model: primary model, ANTHROPIC_MODEL (or Sonnet 4) by default
+        :param deadline_seconds: latency budget, hedges after half of it unless hedge_after is given
+        """
+        self.model = model or os.getenv("ANTHROPIC_MODEL", MODEL_TIERS[1])
+        self.deadline_seconds = deadline_seconds
+        if hedge_after is None:
+            hedge_after = HEDGE_AFTER_SECONDS if deadline_seconds is None else deadline_seconds / 2
+        self.hedge_after = hedge_after
+        self.interface_factory = interface_factory
+        self.used_model: str | None = None
+
+    def candidates(self) -> list[str]:
+        """
+        :return: models to try in order, the chosen primary followed by its faster fallbacks
+        """
+        if self.model in MODEL_TIERS:
+            index = MODEL_TIERS.index(self.model)
+            models = [self.model, *reversed(MODEL_TIERS[:index])]
+        else:
+            models = [self.model, MODEL_TIERS[0]]
+
+        # drop leading models the stats say won't do, keeping at least the fastest
+        while len(models) > 1:
+            stats = model_stats(models[0])
+            p95, failure_rate = stats.p95(), stats.failure_rate()
+            too_slow = self.deadline_seconds is not None and p95 is not None and p95 > self.deadline_seconds
+            failing = failure_rate is not None and failure_rate > MAX_FAILURE_RATE
+            if not (too_slow or failing):
+                break
+            print(f"Routing past {models[0]} ({'too slow' if too_slow else 'failing'})")
+            models.pop(0)
+        return models
+
+    async def generate_customized_resume(
+            self,
+            base_resume: Resume,
+            job_info: str,
+            on_item: ItemCallback | None = None
+        ) -> ResumeCustomizationResult:
+        models = self.candidates()
+        deadline = None if self.deadline_seconds is None else time.monotonic() + self.deadline_seconds
+
+        # (kind, index) of the items reported so far, which a fallback doesn't report again
+        reported = set()
+        def report_once(kind, index, item):
+            if (kind, index) not in reported:
+                reported.add((kind, index))
+                on_item(kind, index, item)
+
+        error = None
+        for i, model in enumerate(models):
+            hedge = models[i + 1] if i + 1 < len(models) else None
+            try:
+                return await self._hedged(
+                    model, hedge, base_resume, job_info, report_once if on_item is not None else None, deadline
+                )
+            except RETRYABLE_ERRORS as e:
+                error = e
+                if hedge is not None:
+                    print(f"{model} unavailable ({e.__class__.__name__}), falling back to {hedge}")
+        raise error
+
+    async def _hedged(
+            self,
+            model: str,
+            hedge: str | None,
+            base_resume: Resume,
+            job_info: str,
+            on_item: ItemCallback | None,
+            deadline: float | None = None
+        ) -> ResumeCustomizationResult:
+        attempts: dict[str, asyncio.Task] = {}
+        owner = None
+
+        def forward(source: str) -> ItemCallback:
+            def callback(kind, index, item):
+                nonlocal owner
+                if owner is None:
+                    # first attempt to stream wins, the others are no longer needed
+                    owner = source
+                    for other, task in attempts.items():
+                        if other != source:
+                            task.cancel()
+                if owner == source and on_item is not None:
+                    on_item(kind, index, item)
+            return callback
+
+        attempts[model] = asyncio.create_task(self._attempt(model, base_resume, job_info, forward(model), deadline))
+        done, _ = await asyncio.wait(attempts.values(), timeout=self.hedge_after)
+        if not done and owner is None and hedge is not None:
+            print(f"{model} slow to respond after {self.hedge_after:.1f}s, hedging with {hedge}")
+            attempts[hedge] = asyncio.create_task(self._attempt(hedge, base_resume, job_info, forward(hedge), deadline))
+
+        pending = set(attempts.values())
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled():
+                        continue
+                    if task.exception() is None:
+                        self.used_model = next(m for m, attempt in attempts.items() if attempt is task)
+                        return task.result()
+                    error = error or task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise error or RuntimeError(f"Every attempt with {model} was cancelled")
+
+    async def _attempt(
+            self,
+            model: str,
+            base_resume: Resume,
+            job_info: str,
+            on_item: ItemCallback,
+            deadline: float | None = None
+        ) -> ResumeCustomizationResult:
+        """
+        One model with retries. A response that already streamed items isn't retried, so
+        nothing is reported twice, and no retry waits past the deadline (time.monotonic()).
+        """
+        interface = self.interface_factory(model)
+        streamed = False
+        def callback(kind, index, item):
+            nonlocal streamed
+            streamed = True
+            on_item(kind, index, item)
+
+        stats = model_stats(model)
+        for retry in range(MODEL_MAX_RETRIES + 1):
+            start = time.perf_counter()
+            try:
+                result = await interface.generate_customized_resume(base_resume, job_info, on_item=callback)
+            except asyncio.CancelledError:
+                MODEL_REQUESTS.inc(model=model, outcome="cancelled")
+                raise
+            except RETRYABLE_ERRORS as e:
+                stats.record(None, failed=True)
+                MODEL_REQUESTS.inc(model=model, outcome=_outcome(e))
+                if streamed or retry == MODEL_MAX_RETRIES:
+                    raise
+                delay = min(
+                    _retry_after(e) or random.uniform(0, BACKOFF_BASE_SECONDS * 2 ** retry),
+                    BACKOFF_MAX_SECONDS
+                )
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        # out of time for this model, fall back right away
+                        raise
+                    delay = min(delay, remaining)
+                print(f"{model} {_outcome(e)}, retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            except Exception:
+                stats.record(None, failed=True)
+                MODEL_REQUESTS.inc(model=model, outcome="error")
+                raise
+
+            elapsed = time.perf_counter() - start
+            stats.record(elapsed, failed=False)
+            MODEL_REQUESTS.inc(model=model, outcome="ok")
+            MODEL_SECONDS.observe(elapsed, model=model)
+            return result
+
+    def name(self) -> str:
+        return f"Model Router ({self.model})"
@@ -1,5 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from abc import ABC, abstractmethod
+from typing import Callable
 
 
 # ==================================================
@@ -7,7 +8,10 @@ from abc import ABC, abstractmethod
 # ==================================================
 
 
+# Resume models are frozen, so one parsed base resume can be shared by every request
 class Education(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     university: str
     location: str
     degree: str
@@ -16,6 +20,8 @@ class Education(BaseModel):
 
 
 class Experience(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     title: str
     date: str
     company: str
@@ -24,16 +30,22 @@ class Experience(BaseModel):
 
 
 class Project(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     title: str
     skills: str
     bullets: list[str]
 
 
 class Skills(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     sections: dict[str, str]
 
 
 class Resume(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     education: Education
     experiences: list[Experience]
     projects: list[Project]
@@ -48,6 +60,22 @@ class ChangeLog(BaseModel):
 class ResumeCustomizationResult(BaseModel):
     resume: Resume
     changelog: list[ChangeLog]
+    # the response hit max_tokens, so anything after the cut-off is the base resume's
+    truncated: bool = False
+
+
+class Truncation(BaseModel):
+    max_tokens: int
+
+
+class ResumeEdit(BaseModel):
+    path: str
+    value: str | list[str] | dict[str, str]
+    reason: str
+
+
+class ResumePatchResult(BaseModel):
+    edits: list[ResumeEdit]
 
 
 # ==================================================
@@ -159,9 +187,18 @@ class ComponentCompiler:
 # ==================================================
 
 
+# called with (kind, index, model) for each piece of a result as soon as it is streamed,
+# e.g. ('experience', 2, Experience(...)) or ('change', 0, ChangeLog(...))
+ItemCallback = Callable[[str, int | None, BaseModel], None]
+
+
 class BaseResumeFieldPopulator(ABC):
     @abstractmethod
-    def get_resume_data(self, job_info: str) -> tuple[Resume, list[ChangeLog]]:
+    async def get_resume_data(
+        self,
+        job_info: str,
+        on_item: ItemCallback | None = None
+    ) -> tuple[Resume, list[ChangeLog]]:
         pass
 
     @abstractmethod
@@ -171,11 +208,15 @@ class BaseResumeFieldPopulator(ABC):
 
 class BaseAIInterface(ABC):
     @abstractmethod
-    def generate_customized_resume(
+    async def generate_customized_resume(
         self,
         base_resume: Resume,
-        job_info: str
+        job_info: str,
+        on_item: ItemCallback | None = None
     ) -> ResumeCustomizationResult:
+        """
+        :param on_item: called for each validated piece of the result as soon as it is streamed
+        """
         pass
 
     @abstractmethod
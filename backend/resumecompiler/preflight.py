@@ -0,0 +1,516 @@
+import re
+import math
+from dataclasses import dataclass, field
+
+from resumecompiler.models import *
+from resumecompiler.metrics import Counter
+from resumecompiler.repair import URL_COMMANDS, lint_latex
+
+
+PREFLIGHT = Counter(
+    "resume_preflight_total",
+    "Preflight checks of rendered resumes by outcome (ok, overflow, failed)",
+    ("outcome",)
+)
+
+
+# ================= issues =================
+
+
+@dataclass
+class LatexIssue:
+    """
+    Something that fails (or, as a warning, spoils) the compile, traced back to the .tex
+    source line and the Resume fields it came from, e.g. resume.experiences[0].bullets[1]
+    """
+    message: str
+    line: int | None = None
+    fields: tuple[str, ...] = ()
+    context: str = ""
+
+    def __str__(self) -> str:
+        where = " or ".join(self.fields) if self.fields else None
+        if where is None and self.line is not None:
+            where = f"line {self.line}"
+        return f"{self.message} ({where})" if where else self.message
+
+    def to_dict(self) -> dict:
+        return {'message': self.message, 'line': self.line, 'fields': list(self.fields), 'context': self.context}
+
+
+class PreflightError(ValueError):
+    """
+    The rendered resume can't compile, found without running pdflatex.
+    """
+
+    def __init__(self, issues: list[LatexIssue]):
+        super().__init__("; ".join(str(issue) for issue in issues[:3]))
+        self.issues = issues
+
+
+# ================= source map =================
+
+
+# (candidate fields, brace depth of their groups), for lines holding more than one field
+SourceLine = tuple[tuple[str, ...], int]
+
+SECTIONS = {
+    "\\section{Education}": "education",
+    "\\section{Experience}": "experiences",
+    "\\section{Projects}": "projects",
+    "\\section{Skills}": "skills",
+}
+HEADER_FIELDS = {
+    "education": (("university", "location"), ("degree", "date")),
+    "experiences": (("title", "date"), ("company", "location")),
+}
+SKILLS_LINE = re.compile(r'\\textbf\{(.*?)\}\{: ')
+
+
+def source_map(tex_source: str) -> dict[int, SourceLine]:
+    """
+    Which Resume fields each line of a rendered resume holds, from the layouts in models.py.
+    Works on the source alone, so a compile worker can map errors without the Resume.
+    :return: 1-based line number -> SourceLine, lines of the template and markup are left out
+    """
+    mapping: dict[int, SourceLine] = {}
+    section, index, row, bullet = None, -1, 0, -1
+    current: SourceLine | None = None
+    for number, line in enumerate(tex_source.splitlines(), 1):
+        stripped = line.strip()
+        if stripped.startswith("\\section{"):
+            section, index, current = SECTIONS.get(stripped), -1, None
+            continue
+        if section is None:
+            continue
+        if stripped in ("\\resumeSubheading", "\\resumeProjectHeading"):
+            index, row, bullet, current = index + 1, 0, -1, None
+            continue
+
+        base = "resume.education" if section == "education" else f"resume.{section}[{max(index, 0)}]"
+        skill = SKILLS_LINE.match(stripped) if section == "skills" else None
+        if stripped.startswith("\\resumeItem{"):
+            bullet += 1
+            current = ((f"{base}.bullets[{bullet}]",), 0)
+        elif skill:
+            current = ((f"resume.skills.sections.{skill.group(1)}",), 0)
+        elif stripped.startswith("{") and section == "projects":
+            # {\textbf{title} $|$ \emph{skills}}{}
+            current = ((f"{base}.title", f"{base}.skills"), 1)
+        elif stripped.startswith("{") and section in HEADER_FIELDS:
+            names = HEADER_FIELDS[section][min(row, 1)]
+            current = (tuple(f"{base}.{name}" for name in names), 0)
+            row += 1
+        elif stripped.startswith(("\\resume", "\\begin", "\\end", "\\small", "}")):
+            current = None
+        # anything else continues a field that spans lines
+        if current is not None:
+            mapping[number] = current
+    return mapping
+
+
+def _narrow(source_line: SourceLine, before: str | None) -> tuple[str, ...]:
+    """
+    Pick the field of a multi-field line that the text before the error ends in.
+    """
+    fields, depth = source_line
+    if len(fields) == 1 or before is None:
+        return fields
+    level, closed = 0, 0
+    escaped = False
+    for char in before:
+        if escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == '{':
+            level += 1
+        elif char == '}':
+            level -= 1
+            if level == depth:
+                closed += 1
+    return (fields[min(closed, len(fields) - 1)],)
+
+
+# ================= pdflatex log =================
+
+
+LOG_LINE = re.compile(r'^l\.(\d+) ?(.*)$')
+
+
+def parse_log(log: str) -> list[tuple[str, int | None, str]]:
+    """
+    :return: (message, line, text before the error on that line) of each "! ..." error in a pdflatex log
+    """
+    errors = []
+    lines = log.splitlines()
+    for i, line in enumerate(lines):
+        if not line.startswith("! "):
+            continue
+        message = line[2:].strip()
+        if message == "Emergency stop." and errors:
+            continue
+        number, context = None, ""
+        for following in lines[i + 1:i + 30]:
+            if following.startswith("! "):
+                break
+            match = LOG_LINE.match(following)
+            if match:
+                number, context = int(match.group(1)), match.group(2)
+                break
+        errors.append((message, number, context))
+    return errors
+
+
+def compile_errors(log: str, tex_source: str) -> list[LatexIssue]:
+    """
+    Errors of a failed compile of tex_source, mapped back to the Resume fields they came from.
+    """
+    lines = tex_source.splitlines()
+    mapping = source_map(tex_source)
+    issues = []
+    for message, number, context in parse_log(log):
+        fields: tuple[str, ...] = ()
+        if number is not None:
+            source_line = mapping.get(number)
+            if source_line is not None:
+                # the log only shows the end of long lines, find where it is in the source
+                text = lines[number - 1] if 0 < number <= len(lines) else ""
+                shown = context[3:] if context.startswith("...") else context
+                at = text.rfind(shown) if shown else -1
+                fields = _narrow(source_line, text[:at + len(shown)] if at != -1 else None)
+        issues.append(LatexIssue(message, number, fields, context))
+    if not issues:
+        issues.append(LatexIssue("pdflatex failed without reporting an error"))
+    return issues
+
+
+# ================= syntax =================
+
+
+ENVIRONMENT = re.compile(r'\\(begin|end)\{([^}]*)\}')
+# \href{...} and \url{...}, whose URL may hold # and % as they are
+URL_ARGUMENT = re.compile(r'\\(%s)\{[^}]*\}' % '|'.join(sorted(URL_COMMANDS)))
+
+
+def _field_values(resume: Resume):
+    """
+    :return: (path, value) of every string field, with the paths sanitize_resume reports
+    """
+    def walk(path: str, value):
+        if isinstance(value, str):
+            yield path, value
+        elif isinstance(value, list):
+            for i, item in enumerate(value):
+                yield from walk(f"{path}[{i}]", item)
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                yield from walk(f"{path}.{key}", item)
+    yield from walk("resume", resume.model_dump())
+
+
+def check_fields(resume: Resume) -> list[LatexIssue]:
+    """
+    Unescaped special characters, unbalanced braces and unknown commands in any field.
+    """
+    return [
+        LatexIssue(problem, fields=(path,))
+        for path, value in _field_values(resume)
+        for problem in lint_latex(value)
+    ]
+
+
+def check_document(tex_source: str) -> list[LatexIssue]:
+    """
+    Brace and environment balance of the document body, which includes the template's heading.
+    """
+    issues = []
+    mapping = source_map(tex_source)
+    environments: list[tuple[str, int]] = []
+    braces: list[int] = []
+    begun = ended = False
+    for number, line in enumerate(tex_source.splitlines(), 1):
+        if not begun:
+            begun = "\\begin{document}" in line
+            if not begun:
+                continue
+        fields = mapping.get(number, ((), 0))[0]
+
+        # drop URLs (as escape_latex keeps them), escaped characters, then comments
+        code = URL_ARGUMENT.sub(r'\\\1{}', line)
+        code = re.sub(r'\\[\\{}%$&#_]', '', code)
+        code = re.sub(r'%.*', '', code)
+        for match in ENVIRONMENT.finditer(code):
+            kind, name = match.groups()
+            if kind == "begin":
+                environments.append((name, number))
+            elif not environments:
+                issues.append(LatexIssue(f"\\end{{{name}}} without \\begin{{{name}}}", number, fields))
+            else:
+                opened, opened_at = environments.pop()
+                if opened != name:
+                    issues.append(LatexIssue(
+                        f"\\begin{{{opened}}} on line {opened_at} ended by \\end{{{name}}}", number, fields
+                    ))
+                ended = ended or name == "document"
+        for char in code:
+            if char == '{':
+                braces.append(number)
+            elif char == '}':
+                if braces:
+                    braces.pop()
+                else:
+                    issues.append(LatexIssue("unbalanced }", number, fields))
+        if '#' in code:
+            issues.append(LatexIssue("unescaped #", number, fields))
+
+    for number in braces:
+        issues.append(LatexIssue("unbalanced {", number, mapping.get(number, ((), 0))[0]))
+    for name, number in environments:
+        if name != "document":
+            issues.append(LatexIssue(f"\\begin{{{name}}} is never ended", number, mapping.get(number, ((), 0))[0]))
+    if not begun or not ended:
+        issues.append(LatexIssue("missing \\begin{document} or \\end{document}"))
+    return issues
+
+
+# ================= page fit =================
+
+
+# Advance widths of Computer Modern Roman (cmr10.tfm) in ems, what the template typesets in.
+# Bold is wider by about BOLD_SCALE, anything else counts as DEFAULT_WIDTH.
+CHAR_WIDTHS = {
+    **dict(zip(
+        "abcdefghijklmnopqrstuvwxyz",
+        (0.500, 0.556, 0.444, 0.556, 0.444, 0.306, 0.500, 0.556, 0.278, 0.306, 0.528, 0.278, 0.833,
+         0.556, 0.500, 0.556, 0.528, 0.392, 0.394, 0.389, 0.556, 0.528, 0.722, 0.528, 0.528, 0.444)
+    )), **dict(zip(
+        "ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+        (0.750, 0.708, 0.722, 0.764, 0.681, 0.653, 0.785, 0.750, 0.361, 0.514, 0.778, 0.625, 0.917,
+         0.750, 0.778, 0.681, 0.778, 0.736, 0.556, 0.722, 0.750, 0.750, 1.028, 0.750, 0.750, 0.611)
+    )),
+    **dict.fromkeys("0123456789", 0.500),
+    **dict.fromkeys(".,:;!'`|[]", 0.278),
+    **dict.fromkeys("()", 0.389),
+    **dict.fromkeys("%#&+=@", 0.778),
+    "-": 0.333, "/": 0.500, "\"": 0.500, "?": 0.472, "*": 0.500, "$": 0.500, "\\": 0.500,
+    " ": 0.333,
+}
+DEFAULT_WIDTH = 0.500
+BOLD_SCALE = 1.14
+
+# Sizes in pt of the template (11pt article, letter paper, fullpage with its margins widened
+# by 0.5in on each side). The vertical sizes are each macro's height including the list
+# spacing and \vspace it adds, tuned so the base resume comes out just under one page.
+NORMAL_SIZE = 10.95
+SMALL_SIZE = 10.0
+TEXT_WIDTH_PT = 542.0
+TEXT_HEIGHT_PT = 723.0
+SUBHEADING_WIDTH_PT = 0.97 * TEXT_WIDTH_PT
+# less the 0.15in of \resumeSubHeadingListStart and the nested itemize's indent
+BULLET_WIDTH_PT = TEXT_WIDTH_PT - 10.8 - 24.1
+SKILLS_WIDTH_PT = TEXT_WIDTH_PT - 10.8
+
+HEADING_PT = 56.0
+SECTION_PT = 28.0
+SUBHEADING_PT = 25.0
+PROJECT_HEADING_PT = 13.0
+ITEM_LIST_PT = 3.0
+LINE_PT = 12.0
+BULLET_GAP_PT = 1.0
+
+# a bullet whose last line is at most this full can lose a line by trimming a few words
+SHORT_LAST_LINE = 0.3
+
+
+def _glyphs(latex: str) -> list[tuple[str, bool]]:
+    """
+    Visible characters of a field's LaTeX, and whether each is bold.
+    """
+    glyphs: list[tuple[str, bool]] = []
+    bold_depths: list[int] = []
+    depth = 0
+    i = 0
+    while i < len(latex):
+        char = latex[i]
+        if char == '\\':
+            match = re.match(r'[A-Za-z]+', latex[i + 1:])
+            if not match:
+                glyphs.append((latex[i + 1:i + 2], bool(bold_depths)))
+                i += 2
+                continue
+            command = match.group()
+            i += 1 + len(command)
+            if command == "textbf" and latex.startswith('{', i):
+                bold_depths.append(depth + 1)
+            elif command == "href" and latex.startswith('{', i) and '}' in latex[i:]:
+                # the URL isn't shown, only the text after it
+                i = latex.index('}', i) + 1
+            elif command == "textbackslash":
+                glyphs.append(("\\", bool(bold_depths)))
+            elif command not in URL_COMMANDS:
+                # \textit{...}, \underline{...} and the like keep their argument's width
+                while latex.startswith(' ', i):
+                    i += 1
+            continue
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            if bold_depths and bold_depths[-1] == depth:
+                bold_depths.pop()
+            depth -= 1
+        elif char not in '$~':
+            glyphs.append((char, bool(bold_depths)))
+        elif char == '~':
+            glyphs.append((' ', bool(bold_depths)))
+        i += 1
+    return glyphs
+
+
+def _width(glyphs: list[tuple[str, bool]], size: float) -> float:
+    return sum(
+        CHAR_WIDTHS.get(char, DEFAULT_WIDTH) * (BOLD_SCALE if bold else 1.0)
+        for char, bold in glyphs
+    ) * size
+
+
+def text_width(latex: str, size: float = SMALL_SIZE, bold: bool = False) -> float:
+    """
+    :return: width in pt of a field typeset on one line
+    """
+    return _width([(char, bold or b) for char, b in _glyphs(latex)], size)
+
+
+def wrap_lines(latex: str, width: float, size: float = SMALL_SIZE) -> tuple[int, float]:
+    """
+    Greedy word wrap, like the template's \\raggedright.
+    :return: (number of lines, how full the last line is from 0 to 1)
+    """
+    space = CHAR_WIDTHS[" "] * size
+    lines, used = 1, 0.0
+    word: list[tuple[str, bool]] = []
+    for glyph in _glyphs(latex) + [(" ", False)]:
+        if glyph[0] != " ":
+            word.append(glyph)
+            continue
+        if not word:
+            continue
+        word_width = _width(word, size)
+        if used and used + space + word_width > width:
+            lines, used = lines + 1, word_width
+        else:
+            used += (space if used else 0.0) + word_width
+        word = []
+    return lines, min(1.0, used / width)
+
+
+@dataclass
+class PageEstimate:
+    """
+    Predicted vertical space the resume takes on the page.
+    """
+    height_pt: float
+    available_pt: float
+    # field path -> lines, of every bullet
+    bullet_lines: dict[str, int] = field(default_factory=dict)
+    # bullets that would lose a line if a few words were cut, emptiest last line first
+    short_bullets: list[str] = field(default_factory=list)
+    # header rows too long for their line, which pdflatex lets run into the margin
+    overfull: list[LatexIssue] = field(default_factory=list)
+
+    @property
+    def pages(self) -> float:
+        return self.height_pt / self.available_pt
+
+    @property
+    def overflows(self) -> bool:
+        return self.height_pt > self.available_pt
+
+    def overflow_lines(self) -> int:
+        """
+        :return: bullet lines to cut for the resume to fit on one page
+        """
+        return max(0, math.ceil((self.height_pt - self.available_pt) / LINE_PT))
+
+
+def estimate_page(resume: Resume, available_pt: float = TEXT_HEIGHT_PT) -> PageEstimate:
+    """
+    Estimate how much of the page the rendered resume fills, from font metrics and the
+    sizes of the template's macros (\\resumeSubheading, \\resumeProjectHeading, \\resumeItem).
+    """
+    estimate = PageEstimate(HEADING_PT + 4 * SECTION_PT, available_pt)
+    short: list[tuple[float, str]] = []
+
+    def bullets(path: str, items: list[str]) -> None:
+        estimate.height_pt += ITEM_LIST_PT
+        for i, bullet in enumerate(items):
+            lines, last = wrap_lines(bullet, BULLET_WIDTH_PT)
+            estimate.bullet_lines[f"{path}.bullets[{i}]"] = lines
+            estimate.height_pt += lines * LINE_PT + BULLET_GAP_PT
+            if lines > 1 and last <= SHORT_LAST_LINE:
+                short.append((last, f"{path}.bullets[{i}]"))
+
+    def row(path: str, left: str, right: str, size: float, bold: bool, names: tuple[str, str]) -> None:
+        width = text_width(left, size, bold) + text_width(right, size)
+        if width > SUBHEADING_WIDTH_PT:
+            over = width - SUBHEADING_WIDTH_PT
+            estimate.overfull.append(LatexIssue(
+                f"too long for its line by {over:.0f}pt", fields=(f"{path}.{names[0]}", f"{path}.{names[1]}")
+            ))
+
+    def subheading(path: str, section: Education | Experience, fields: tuple[tuple[str, str], ...]) -> None:
+        estimate.height_pt += SUBHEADING_PT
+        (top_left, top_right), (bottom_left, bottom_right) = fields
+        row(path, getattr(section, top_left), getattr(section, top_right), NORMAL_SIZE, True, (top_left, top_right))
+        row(path, getattr(section, bottom_left), getattr(section, bottom_right), SMALL_SIZE, False, (bottom_left, bottom_right))
+        bullets(path, section.bullets)
+
+    subheading("resume.education", resume.education, HEADER_FIELDS["education"])
+    for i, experience in enumerate(resume.experiences):
+        subheading(f"resume.experiences[{i}]", experience, HEADER_FIELDS["experiences"])
+    for i, project in enumerate(resume.projects):
+        path = f"resume.projects[{i}]"
+        estimate.height_pt += PROJECT_HEADING_PT
+        row(path, f"\\textbf{{{project.title}}} | ", project.skills, SMALL_SIZE, False, ("title", "skills"))
+        bullets(path, project.bullets)
+    for name, items in resume.skills.sections.items():
+        lines, _ = wrap_lines(f"\\textbf{{{name}}}: {items}", SKILLS_WIDTH_PT)
+        estimate.height_pt += lines * LINE_PT
+
+    estimate.short_bullets = [path for _, path in sorted(short)]
+    return estimate
+
+
+# ================= preflight =================
+
+
+@dataclass
+class PreflightReport:
+    estimate: PageEstimate
+    # what would spoil the PDF without failing the compile
+    warnings: list[str] = field(default_factory=list)
+
+
+def preflight(resume: Resume, tex_source: str) -> PreflightReport:
+    """
+    Check a rendered resume before spending a pdflatex run on it.
+    :raises PreflightError: if it can't compile
+    :return: page estimate and warnings, e.g. that it runs onto a second page
+    """
+    issues = check_fields(resume) + check_document(tex_source)
+    if issues:
+        PREFLIGHT.inc(outcome="failed")
+        raise PreflightError(issues)
+
+    estimate = estimate_page(resume)
+    report = PreflightReport(estimate)
+    if estimate.overflows:
+        warning = f"Resume is estimated at {estimate.pages:.2f} pages, " \
+                  f"{estimate.overflow_lines()} line(s) over one page."
+        if estimate.short_bullets:
+            warning += f" Shortest to trim: {', '.join(estimate.short_bullets[:3])}"
+        report.warnings.append(warning)
+    for issue in estimate.overfull:
+        report.warnings.append(f"Header {issue}")
+    PREFLIGHT.inc(outcome="overflow" if estimate.overflows else "ok")
+    return report
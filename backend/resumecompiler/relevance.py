@@ -0,0 +1,271 @@
+import os
+import re
+import math
+from collections import Counter as TermCounter
+from dataclasses import dataclass
+from functools import lru_cache
+
+from resumecompiler.models import *
+from resumecompiler.metrics import Counter, stage
+from resumecompiler.resume_patch import format_path
+
+
+# bullets (and project skill lines) the model may edit, best scoring first; 0 lists every field
+RELEVANCE_TOP_K = int(os.getenv("RELEVANCE_TOP_K", 8))
+# an item scoring below this shares nothing specific with the posting; 0 never skips the model
+RELEVANCE_MIN_SCORE = float(os.getenv("RELEVANCE_MIN_SCORE", 4.0))
+
+# BM25 term frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+RELEVANCE = Counter(
+    "resume_relevance_total",
+    "Generations by relevance outcome: focused prompt, or skipped (nothing in the posting worth changing)",
+    ("outcome",)
+)
+
+
+LATEX_LINK = re.compile(r"\\href\{[^}]*\}")
+LATEX_COMMAND = re.compile(r"\\[A-Za-z]+")
+# c++, c#, node.js, scikit-learn, ci/cd and 2.0 each match as one token
+TOKEN = re.compile(r"[a-z0-9][a-z0-9+#]*(?:[./\-][a-z0-9+#]+)*")
+STOPWORDS = frozenset("""
+a about above after all also an and any are as at be been being both but by can could did do does doing
+during each either etc for from had has have having he her here how i if in into is it its itself just
+least less like many may me might more most must my no nor not of off on once only or other our out over
+own per same she should so some such than that the their them then there these they this those through
+to too under until up upon us very via was we were what when where which while who whom why will with
+within without would you your yours
+ability able across already based best candidate company day etc experience familiar familiarity
+highly ideal including join knowledge looking new plus preferred product proficiency proficient
+qualification related required requirement responsibility role skill strong team understanding
+using utilized well work working year
+""".split())
+# spellings that should match each other
+ALIASES = {
+    "js": "javascript",
+    "ts": "typescript",
+    "py": "python",
+    "postgres": "postgresql",
+    "k8s": "kubernetes",
+    "golang": "go",
+    "react.js": "react",
+    "reactjs": "react",
+    "vue.js": "vue",
+    "vuejs": "vue",
+    "next.js": "next",
+    "nextjs": "next",
+    "node.js": "node",
+    "nodejs": "node",
+    "amazon": "aws",
+    "gcp": "google",
+    "llm": "llms",
+    "apis": "api",
+    "rest": "restful",
+}
+SUFFIXES = ("ing", "ed", "es", "s")
+
+
+def _stem(word: str) -> str:
+    """
+    Cheap suffix stripping so "developed", "develops" and "developing" match.
+    """
+    word = ALIASES.get(word, word)
+    if not word.isalpha():
+        return word
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4 and not word.endswith("ss"):
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercased, stemmed terms of a bullet, skill or posting, without LaTeX markup or stopwords.
+    Compound terms like scikit-learn or ci/cd count as their parts, numbers don't count.
+    """
+    text = LATEX_COMMAND.sub(" ", LATEX_LINK.sub(" ", text)).replace("\\", "").lower()
+    terms = []
+    for token in TOKEN.findall(text):
+        if token in STOPWORDS or token.isdigit():
+            continue
+        parts = []
+        if token not in ALIASES and re.search(r"[./\-]", token):
+            parts = [part for part in re.split(r"[./\-]", token) if len(part) > 1 and part not in STOPWORDS]
+        terms += [_stem(part) for part in parts] or [_stem(token)]
+    return terms
+
+
+def split_skills(skills: str) -> list[str]:
+    """
+    Split a comma separated skills line, keeping groups like "AWS (EC2, Lambda)" whole.
+    """
+    items, depth, start = [], 0, 0
+    for i, char in enumerate(skills):
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth = max(depth - 1, 0)
+        elif char == "," and depth == 0:
+            items.append(skills[start:i].strip())
+            start = i + 1
+    items.append(skills[start:].strip())
+    return [item for item in items if item]
+
+
+@dataclass(frozen=True)
+class Item:
+    # address of the field the item is (or is part of, for skills) as resume_patch formats it
+    path: str
+    # "bullet", "project_skills" or "skill"
+    kind: str
+    text: str
+
+
+@dataclass(frozen=True)
+class ScoredItem:
+    item: Item
+    score: float
+
+
+@dataclass(frozen=True)
+class Ranking:
+    """
+    Every item of a base resume scored against one posting, best first.
+    """
+    items: tuple[ScoredItem, ...]
+
+    def focus(self, top_k: int | None = None, min_score: float | None = None) -> frozenset[str]:
+        """
+        :return: paths of the bullets and project skill lines worth tailoring to the posting
+        """
+        top_k = RELEVANCE_TOP_K if top_k is None else top_k
+        min_score = RELEVANCE_MIN_SCORE if min_score is None else min_score
+        editable = [s.item.path for s in self.items if s.item.kind != "skill" and s.score >= min_score]
+        return frozenset(editable[:top_k])
+
+    def best_score(self) -> float:
+        return max((s.score for s in self.items if s.item.kind != "skill"), default=0.0)
+
+    def skill_scores(self) -> dict[tuple[str, str], float]:
+        """
+        :return: score of each skill by (section path, skill)
+        """
+        return {(s.item.path, s.item.text): s.score for s in self.items if s.item.kind == "skill"}
+
+
+def resume_items(resume: Resume) -> list[Item]:
+    items = []
+    for i, bullet in enumerate(resume.education.bullets):
+        items.append(Item(f"education.bullets[{i}]", "bullet", bullet))
+    for name, entries in (("experiences", resume.experiences), ("projects", resume.projects)):
+        for i, entry in enumerate(entries):
+            if isinstance(entry, Project):
+                items.append(Item(f"{name}[{i}].skills", "project_skills", entry.skills))
+            for j, bullet in enumerate(entry.bullets):
+                items.append(Item(f"{name}[{i}].bullets[{j}]", "bullet", bullet))
+    for section, skills in resume.skills.sections.items():
+        path = format_path(["skills", "sections", section])
+        items += [Item(path, "skill", skill) for skill in split_skills(skills)]
+    return items
+
+
+class RelevanceIndex:
+    """
+    BM25 index over the bullets, project skill lines and individual skills of one base
+    resume, built once when the resume is loaded. Each item's term weights are computed
+    up front into an inverted index, so scoring a posting only touches the postings of
+    terms it shares with the resume.
+    """
+
+    def __init__(self, resume: Resume):
+        self.items = resume_items(resume)
+        documents = [TermCounter(tokenize(item.text)) for item in self.items]
+        lengths = [sum(terms.values()) for terms in documents]
+        average = sum(lengths) / len(lengths) if lengths else 1.0
+        frequencies = TermCounter(term for terms in documents for term in terms)
+
+        self.postings: dict[str, list[tuple[int, float]]] = {}
+        for i, terms in enumerate(documents):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[i] / (average or 1.0))
+            for term, tf in terms.items():
+                df = frequencies[term]
+                idf = math.log(1 + (len(documents) - df + 0.5) / (df + 0.5))
+                self.postings.setdefault(term, []).append((i, idf * tf * (BM25_K1 + 1) / (tf + norm)))
+        # the same posting is ranked by the relevance wrapper and again when building the prompt
+        self.rank = lru_cache(maxsize=32)(self._rank)
+
+    def _rank(self, job_info: str) -> Ranking:
+        """
+        Score every item against the posting. Terms repeated in the posting count for more,
+        with diminishing returns.
+        """
+        scores = [0.0] * len(self.items)
+        for term, count in TermCounter(tokenize(job_info)).items():
+            weight = 1 + math.log(count)
+            for i, term_weight in self.postings.get(term, ()):
+                scores[i] += weight * term_weight
+        order = sorted(range(len(self.items)), key=lambda i: -scores[i])
+        return Ranking(tuple(ScoredItem(self.items[i], scores[i]) for i in order))
+
+
+def reorder_skills(resume: Resume, ranking: Ranking) -> tuple[Resume, list[ChangeLog]]:
+    """
+    List the skills the posting names first in each skills section, otherwise keeping their
+    order. Done locally since it never needs the model.
+    """
+    scores = ranking.skill_scores()
+    sections, changelog = {}, []
+    for section, skills in resume.skills.sections.items():
+        path = format_path(["skills", "sections", section])
+        items = split_skills(skills)
+        ordered = sorted(items, key=lambda skill: -scores.get((path, skill), 0.0))
+        sections[section] = skills
+        if ordered != items:
+            sections[section] = ", ".join(ordered)
+            changelog.append(ChangeLog(
+                before=skills,
+                after=sections[section],
+                reason="Listed the skills this posting asks for first."
+            ))
+    if not changelog:
+        return resume, []
+    return resume.model_copy(update={"skills": Skills(sections=sections)}), changelog
+
+
+class RelevanceAIInterface(BaseAIInterface):
+    """
+    Wraps another AI interface with the local relevance scorer. Skills are reordered
+    without the model, and postings that share nothing specific with any bullet skip
+    the model altogether, keeping the base resume (so its PDF can be reused).
+    Patch mode prompts only list the focused fields, see AnthropicAIInterface.
+    """
+
+    def __init__(self, ai_interface: BaseAIInterface):
+        self.ai_interface = ai_interface
+
+    async def generate_customized_resume(
+            self,
+            base_resume: Resume,
+            job_info: str,
+            on_item: ItemCallback | None = None
+        ) -> ResumeCustomizationResult:
+        # imported here since the repository builds the index this module defines
+        from resumecompiler.resume_repository import resume_entry
+
+        with stage("relevance"):
+            ranking = resume_entry(base_resume).relevance.rank(job_info)
+        if ranking.best_score() < RELEVANCE_MIN_SCORE:
+            print("Nothing in the posting is worth tailoring bullets for, skipping the model.")
+            RELEVANCE.inc(outcome="skipped")
+            resume, changelog = reorder_skills(base_resume, ranking)
+            return ResumeCustomizationResult(resume=resume, changelog=changelog)
+
+        RELEVANCE.inc(outcome="focused")
+        result = await self.ai_interface.generate_customized_resume(base_resume, job_info, on_item=on_item)
+        resume, changelog = reorder_skills(result.resume, ranking)
+        return result.model_copy(update={"resume": resume, "changelog": result.changelog + changelog})
+
+    def name(self) -> str:
+        return f"Relevance Ranked {self.ai_interface.name()}"
@@ -0,0 +1,95 @@
+import hashlib
+import os
+
+from resumecompiler.models import *
+
+
+TEMPLATE_PATH = os.path.join(".", "static", "template.tex")
+
+
+class LatexRenderer:
+    """
+    Renders Resume objects into the .tex template.
+
+    The template is read once and only re-read when its mtime changes.
+    Other templates (e.g. tenants') can be passed to the render methods.
+    Sections are formatted on every render: hashing a section to look it up would
+    cost as much as formatting it.
+    """
+
+    def __init__(self, template_path: str = TEMPLATE_PATH):
+        self.template_path = template_path
+        self._template: str | None = None
+        self._template_mtime: int | None = None
+        self._template_digest: str | None = None
+
+    def template(self) -> str:
+        """
+        :return: template source, reloaded if the file changed since it was last read
+        """
+        mtime = os.stat(self.template_path).st_mtime_ns
+        if self._template is None or mtime != self._template_mtime:
+            with open(self.template_path) as f:
+                self._template = f.read()
+            self._template_mtime = mtime
+            self._template_digest = hashlib.sha256(self._template.encode('utf-8')).hexdigest()
+            print(f"Loaded LaTeX template {self.template_path}")
+        return self._template
+
+    def template_digest(self) -> str:
+        self.template()
+        return self._template_digest
+
+    def render_parts(self, resume: Resume, template: str | None = None) -> list[str]:
+        """
+        :param template: preamble and heading to use instead of the template file
+        :return: pieces of the document, in order, to be joined by newlines
+        """
+        return [
+            template if template is not None else self.template(),
+            ComponentCompiler.compile_education(resume.education),
+            '\\section{Experience}\n\\resumeSubHeadingListStart',
+            *(ComponentCompiler.compile_experience(e) for e in resume.experiences),
+            '\\resumeSubHeadingListEnd',
+            '\\section{Projects}\n\\resumeSubHeadingListStart',
+            *(ComponentCompiler.compile_project(p) for p in resume.projects),
+            '\\resumeSubHeadingListEnd',
+            ComponentCompiler.compile_skills(resume.skills),
+            '\\end{document}',
+        ]
+
+    def render(self, resume: Resume, template: str | None = None) -> str:
+        """
+        :return: full .tex source of the resume
+        """
+        return "\n".join(self.render_parts(resume, template))
+
+    def render_bytes(self, resume: Resume, template: str | None = None) -> bytes:
+        """
+        :return: full .tex source as UTF-8, for compiling without a file in tex/
+        """
+        return self.render(resume, template).encode('utf-8')
+
+    def write(self, resume: Resume, path: str, template: str | None = None) -> None:
+        """
+        Write the .tex source to path without building it as one string first.
+        """
+        with open(path, "w") as f:
+            parts = iter(self.render_parts(resume, template))
+            f.write(next(parts))
+            for part in parts:
+                f.write("\n")
+                f.write(part)
+
+
+_renderer: LatexRenderer | None = None
+
+
+def get_renderer() -> LatexRenderer:
+    """
+    Process-wide renderer, so the template is shared between jobs.
+    """
+    global _renderer
+    if _renderer is None:
+        _renderer = LatexRenderer()
+    return _renderer
@@ -0,0 +1,458 @@
+import re
+import json
+from dataclasses import dataclass, field
+
+from pydantic import ValidationError
+
+from resumecompiler.models import *
+from resumecompiler.metrics import Counter
+
+
+# Local repairs for LLM output, so a small mistake costs a few milliseconds instead of a
+# regeneration or a failed compile:
+# - recover_json: malformed or truncated JSON
+# - repair_patch / repair_full: schema-guided fixes, falling back to the base resume
+# - escape_latex / sanitize_resume: LaTeX special characters, run on every field before rendering
+# Whatever can't be fixed here is returned as an InvalidFragment, to be re-asked on its own.
+
+REPAIRS = Counter(
+    "resume_repairs_total",
+    "Local and model repairs of LLM output by kind (json, schema, latex, fragment, fragment_failed)",
+    ("kind",)
+)
+
+
+# ==================================================
+# ================ JSON recovery ===================
+# ==================================================
+
+
+JSON_ESCAPES = set('"\\/bfnrtu')
+
+
+def recover_json(text: str) -> str:
+    """
+    Best-effort repair of one JSON object: skips anything around it (e.g. ```json fences),
+    doubles invalid escapes like \\% (LaTeX escapes the model forgot to double), escapes raw
+    control characters in strings, drops trailing commas, and closes truncated output. The
+    value it was cut off in is kept if it is valid as far as it goes (an open string is
+    closed), otherwise everything after the last complete element is dropped.
+    :raises ValueError: if there is no object at all
+    """
+    start = text.find('{')
+    if start == -1:
+        raise ValueError("No JSON object in the response")
+
+    out: list[str] = []
+    # per open container: closer, length of out after its last complete element, and
+    # for objects whether the next string is a key
+    stack: list[_Container] = []
+    in_string = is_key = False
+    i = start
+    while i < len(text):
+        char = text[i]
+        if in_string:
+            if char == '\\':
+                following = text[i + 1:i + 2]
+                if not following:
+                    # cut off in the middle of an escape
+                    break
+                if following in JSON_ESCAPES and (
+                    following != 'u' or re.fullmatch(r'[0-9a-fA-F]{4}', text[i + 2:i + 6])
+                ):
+                    out.append(text[i:i + 2])
+                    i += 2
+                    continue
+                out.append('\\\\')
+            elif char == '"':
+                in_string = False
+                out.append(char)
+                if not is_key:
+                    stack[-1].complete = len(out)
+            elif char in '\n\r\t':
+                out.append({'\n': '\\n', '\r': '\\r', '\t': '\\t'}[char])
+            elif ord(char) < 0x20:
+                out.append(f'\\u{ord(char):04x}')
+            else:
+                out.append(char)
+            i += 1
+            continue
+
+        if char == '"':
+            in_string = True
+            is_key = stack[-1].expecting_key
+            out.append(char)
+        elif char in '{[':
+            out.append(char)
+            stack.append(_Container('}' if char == '{' else ']', len(out), char == '{'))
+        elif char in '}]':
+            _strip_trailing_comma(out)
+            out.append(stack.pop().closer)
+            if not stack:
+                return "".join(out)
+            stack[-1].complete = len(out)
+        elif char == ':':
+            stack[-1].expecting_key = False
+            out.append(char)
+        elif char == ',':
+            container = stack[-1]
+            container.complete = len(out)
+            container.expecting_key = container.closer == '}'
+            out.append(char)
+        else:
+            out.append(char)
+        i += 1
+
+    # truncated: keep the last value if closing everything makes valid JSON
+    if in_string and not is_key:
+        out.append('"')
+    closed = _close(out, stack)
+    try:
+        json.loads(closed)
+        return closed
+    except ValueError:
+        pass
+
+    # otherwise cut back to the innermost container's last complete element
+    del out[stack[-1].complete:]
+    return _close(out, stack)
+
+
+def _close(out: list[str], stack: list["_Container"]) -> str:
+    closed = out[:]
+    for container in reversed(stack):
+        _strip_trailing_comma(closed)
+        closed.append(container.closer)
+    return "".join(closed)
+
+
+@dataclass
+class _Container:
+    closer: str
+    complete: int
+    expecting_key: bool
+
+
+def _strip_trailing_comma(out: list[str]) -> None:
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ',':
+        out.pop()
+
+
+def loads_tolerant(text: str) -> dict:
+    """
+    json.loads, falling back to recover_json
+    :raises ValueError: if the text can't be recovered into an object
+    """
+    start, end = text.find('{'), text.rfind('}')
+    try:
+        data = json.loads(text[start:end + 1] if start != -1 else text)
+    except ValueError:
+        data = json.loads(recover_json(text))
+        REPAIRS.inc(kind="json")
+        print("Recovered malformed JSON response")
+    if not isinstance(data, dict):
+        raise ValueError("Response is not a JSON object")
+    return data
+
+
+# ==================================================
+# ============= Schema-guided repair ===============
+# ==================================================
+
+
+@dataclass
+class InvalidFragment:
+    """
+    Part of a response that still doesn't meet the schema after local repair.
+    """
+    kind: str
+    index: int | None
+    schema: type[BaseModel]
+    raw: str
+    error: str
+
+
+@dataclass
+class RepairResult:
+    value: BaseModel | None
+    invalid: list[InvalidFragment] = field(default_factory=list)
+
+
+def _coerce_strings(value, like):
+    """
+    Shape value like the base field it replaces: numbers become strings,
+    a lone string becomes a one-item list, None keeps the base value.
+    """
+    if value is None:
+        return like
+    if isinstance(like, str):
+        if isinstance(value, (int, float)):
+            return str(value)
+        if isinstance(value, list) and all(isinstance(v, str) for v in value):
+            return " ".join(value)
+        return value
+    if isinstance(like, list):
+        if isinstance(value, str):
+            return [value]
+        if isinstance(value, list):
+            return [str(v) if isinstance(v, (int, float)) else v for v in value]
+    if isinstance(like, dict) and isinstance(value, dict):
+        return {k: str(v) if isinstance(v, (int, float)) else v for k, v in value.items()}
+    return value
+
+
+def _repair_model(schema: type[BaseModel], data, base: BaseModel | None) -> BaseModel:
+    """
+    Validate data as schema, filling missing or mistyped fields from base where possible.
+    :raises ValidationError: if that isn't enough
+    """
+    try:
+        return schema.model_validate(data)
+    except ValidationError:
+        if not isinstance(data, dict) or base is None:
+            raise
+    fixed = {}
+    for name, like in base.model_dump().items():
+        fixed[name] = _coerce_strings(data.get(name), like)
+    item = schema.model_validate(fixed)
+    REPAIRS.inc(kind="schema")
+    return item
+
+
+Fixes = dict[tuple[str, int | None], BaseModel]
+
+
+def repair_patch(data: dict, fixes: Fixes | None = None) -> RepairResult:
+    """
+    ResumePatchResult from parsed JSON, keeping every edit that validates
+    (reasons default to empty, numbers become strings) and returning the rest as invalid.
+    :param fixes: re-asked replacements of earlier invalid fragments, by (kind, index)
+    """
+    fixes = fixes or {}
+    edits = data.get('edits')
+    if not isinstance(edits, list):
+        raise ValueError("Response has no edits list")
+
+    valid, invalid = [], []
+    for i, edit in enumerate(edits):
+        if ('edit', i) in fixes:
+            valid.append(fixes[('edit', i)])
+            continue
+        if isinstance(edit, dict) and 'value' not in edit:
+            # cut off by truncation, nothing to repair
+            REPAIRS.inc(kind="schema")
+            continue
+        if isinstance(edit, dict):
+            edit = {'reason': '', **edit}
+            if isinstance(edit.get('value'), (int, float)):
+                edit['value'] = str(edit['value'])
+        try:
+            valid.append(ResumeEdit.model_validate(edit))
+        except ValidationError as e:
+            invalid.append(InvalidFragment('edit', i, ResumeEdit, json.dumps(edit), str(e)))
+    return RepairResult(ResumePatchResult(edits=valid), invalid)
+
+
+def repair_full(data: dict, base_resume: Resume, fixes: Fixes | None = None) -> RepairResult:
+    """
+    ResumeCustomizationResult from parsed JSON. Sections that are missing, or can't be fixed
+    from the base resume's fields, keep the base resume's version, and the latter are also
+    returned as invalid so they can be re-asked. Malformed changelog entries are dropped.
+    :param fixes: re-asked replacements of earlier invalid fragments, by (kind, index)
+    """
+    fixes = fixes or {}
+    resume = data.get('resume') if isinstance(data.get('resume'), dict) else {}
+    invalid = []
+
+    def section(kind: str, schema: type[BaseModel], raw, base: BaseModel | None, index: int | None = None):
+        if (kind, index) in fixes:
+            return fixes[(kind, index)]
+        if raw is None:
+            return base
+        try:
+            return _repair_model(schema, raw, base)
+        except ValidationError as e:
+            invalid.append(InvalidFragment(kind, index, schema, json.dumps(raw), str(e)))
+            return base
+
+    def sections(kind: str, schema: type[BaseModel], raws, bases: list) -> list:
+        if not isinstance(raws, list):
+            return list(bases)
+        items = []
+        for i, raw in enumerate(raws):
+            item = section(kind, schema, raw, bases[i] if i < len(bases) else None, i)
+            if item is not None:
+                items.append(item)
+        return items
+
+    repaired = Resume(
+        education=section('education', Education, resume.get('education'), base_resume.education),
+        experiences=sections('experience', Experience, resume.get('experiences'), base_resume.experiences),
+        projects=sections('project', Project, resume.get('projects'), base_resume.projects),
+        skills=section('skills', Skills, resume.get('skills'), base_resume.skills),
+    )
+
+    changelog = []
+    raw_changelog = data.get('changelog') if isinstance(data.get('changelog'), list) else []
+    for change in raw_changelog:
+        if isinstance(change, dict):
+            change = {'before': '', 'after': '', 'reason': '', **change}
+        try:
+            changelog.append(ChangeLog.model_validate(change))
+        except ValidationError:
+            REPAIRS.inc(kind="schema")
+    return RepairResult(ResumeCustomizationResult(resume=repaired, changelog=changelog), invalid)
+
+
+# ==================================================
+# ================ LaTeX escaping ==================
+# ==================================================
+
+
+LATEX_SPECIALS = "#%&_"
+# commands the resume fields may use, anything else is printed as text
+KNOWN_COMMANDS = {
+    "href", "url", "underline", "textbf", "textit", "emph", "texttt", "textsc", "small",
+    "textbackslash", "textasciitilde", "textasciicircum", "textbar", "ldots", "LaTeX", "TeX",
+}
+# their first argument is a URL, where specials are fine as they are
+URL_COMMANDS = {"href", "url"}
+COMMAND_NAME = re.compile(r'[A-Za-z]+')
+# commands kept inside $...$ math (like $\sim$ or $\times$), any other makes the $ text
+MATH_COMMANDS = {
+    "sim", "times", "cdot", "approx", "pm", "leq", "geq", "le", "ge", "to", "rightarrow",
+    "leftarrow", "uparrow", "downarrow", "mid", "bullet", "cdots", "ldots", "infty", "mu",
+}
+MATH_ESCAPE = re.compile(r'\\([A-Za-z]+|.?)')
+
+
+def _safe_math(math: str) -> bool:
+    """
+    True for math that can only typeset symbols: MATH_COMMANDS, escaped characters and
+    balanced braces. Anything else (\\input, \\def, undefined commands, ^^5c spelling a
+    backslash) could read files or break the compile.
+    """
+    if not math.strip() or "^^" in math:
+        return False
+    for match in MATH_ESCAPE.finditer(math):
+        name = match.group(1)
+        if name not in MATH_COMMANDS and (len(name) != 1 or name not in LATEX_SPECIALS + "{},;! "):
+            return False
+    depth = 0
+    for char in re.sub(r'\\.', '', math):
+        depth += {'{': 1, '}': -1}.get(char, 0)
+        if depth < 0:
+            return False
+    return depth == 0
+
+
+def _scan_latex(text: str, issues: list[str] | None = None) -> str:
+    out: list[str] = []
+    open_braces: list[int] = []
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == '\\':
+            following = text[i + 1] if i + 1 < len(text) else ''
+            if following and following in LATEX_SPECIALS + "${}\\ ":
+                # already escaped
+                out.append(text[i:i + 2])
+                i += 2
+                continue
+            match = COMMAND_NAME.match(text, i + 1)
+            if match and match.group() in KNOWN_COMMANDS:
+                out.append(text[i:match.end()])
+                i = match.end()
+                if match.group() in URL_COMMANDS and text.startswith('{', i) and '}' in text[i:]:
+                    end = text.index('}', i) + 1
+                    out.append(text[i:end])
+                    i = end
+                continue
+            if issues is not None:
+                issues.append(f"unknown command \\{match.group() if match else following}")
+            out.append('\\textbackslash{}')
+        elif char in LATEX_SPECIALS:
+            if issues is not None:
+                issues.append(f"unescaped {char}")
+            out.append('\\' + char)
+        elif char == '$':
+            close = text.find('$', i + 1)
+            if close != -1 and not text[i + 1:i + 2].isdigit() and text[close - 1] != '\\' \
+                    and _safe_math(text[i + 1:close]):
+                # inline math like $|$, kept as is
+                out.append(text[i:close + 1])
+                i = close + 1
+                continue
+            if issues is not None:
+                issues.append("unescaped $")
+            out.append('\\$')
+        elif char == '^':
+            if issues is not None:
+                issues.append("unescaped ^")
+            out.append('\\textasciicircum{}')
+        elif char == '{':
+            open_braces.append(len(out))
+            out.append(char)
+        elif char == '}':
+            if open_braces:
+                open_braces.pop()
+                out.append(char)
+            else:
+                if issues is not None:
+                    issues.append("unbalanced }")
+                out.append('\\}')
+        else:
+            out.append(char)
+        i += 1
+
+    for position in open_braces:
+        if issues is not None:
+            issues.append("unbalanced {")
+        out[position] = '\\{'
+    return "".join(out)
+
+
+def escape_latex(text: str) -> str:
+    """
+    Escape what would break pdflatex in a resume field, keeping what is already valid:
+    escaped characters, the commands in KNOWN_COMMANDS (with raw URLs in \\href/\\url) and
+    $...$ math using only MATH_COMMANDS. Escaping an escaped field changes nothing.
+    """
+    return _scan_latex(text)
+
+
+def lint_latex(text: str) -> list[str]:
+    """
+    :return: what escape_latex would fix in the field, empty if it is fine
+    """
+    issues: list[str] = []
+    _scan_latex(text, issues)
+    return issues
+
+
+def sanitize_resume(resume: Resume) -> tuple[Resume, list[str]]:
+    """
+    Run escape_latex on every field of the resume.
+    :return: (escaped resume, paths of the fields that changed)
+    """
+    fixed: list[str] = []
+
+    def escape(path: str, value):
+        if isinstance(value, str):
+            escaped = escape_latex(value)
+            if escaped != value:
+                fixed.append(path)
+            return escaped
+        if isinstance(value, list):
+            return [escape(f"{path}[{i}]", v) for i, v in enumerate(value)]
+        if isinstance(value, dict):
+            return {k: escape(f"{path}.{k}", v) for k, v in value.items()}
+        return value
+
+    data = escape("resume", resume.model_dump())
+    if not fixed:
+        return resume, []
+    REPAIRS.inc(len(fixed), kind="latex")
+    return Resume.model_validate(data), fixed
@@ -1,40 +1,66 @@
-import os
-
 from resumecompiler.models import *
-from resumecompiler.claude_interface import AnthropicAIInterface
+from resumecompiler.metrics import stage
+from resumecompiler.resume_repository import DEFAULT_RESUME, ResumeRepository, get_resume_repository
 
 
 class DefaultResumeFieldPopulator(BaseResumeFieldPopulator):
-    def get_resume_data(self, job_info: str) -> tuple[Resume, list[ChangeLog]]:
+    def __init__(self, resume_name: str = DEFAULT_RESUME, repository: ResumeRepository | None = None):
+        """
+        :param resume_name: base resume to serve, static/base_resume.json by default
+        """
+        self.resume_name = resume_name
+        self.repository = repository or get_resume_repository()
+
+    async def get_resume_data(
+            self,
+            job_info: str,
+            on_item: ItemCallback | None = None
+        ) -> tuple[Resume, list[ChangeLog]]:
         """
         Get Abhinav Uppala default resume info (as of 8-9-25)
         Does NOT customize it to the job info
         """
-        with open(os.path.join('static', 'base_resume.json'), 'r') as f:
-            json_str = f.read()
-        resume = Resume.model_validate_json(json_str)
-        return resume
+        return self.repository.get(self.resume_name).resume, []
     
     def name(self) -> str:
         return "Default Resume Populator"
     
 
 class AIResumeFieldPopulator(BaseResumeFieldPopulator):
-    def get_resume_data(
+    def __init__(
+            self,
+            ai_interface: BaseAIInterface | None = None,
+            resume_name: str = DEFAULT_RESUME,
+            repository: ResumeRepository | None = None
+        ):
+        """
+        :param ai_interface: interface used to tailor the resume, Anthropic by default
+        :param resume_name: base resume to tailor, static/base_resume.json by default
+        """
+        if ai_interface is None:
+            # imported here so the Anthropic client is only set up when actually used
+            from resumecompiler.claude_interface import AnthropicAIInterface
+            ai_interface = AnthropicAIInterface()
+        self.ai_interface = ai_interface
+        self.resume_name = resume_name
+        self.repository = repository or get_resume_repository()
+
+    async def get_resume_data(
             self,
             job_info: str,
-            ai_interface: BaseAIInterface = AnthropicAIInterface()
+            on_item: ItemCallback | None = None
         ) -> tuple[Resume, list[ChangeLog]]:
         """
         Generates a tailored version of Abhinav's Resume (8-9-25) to the job info.
         Also prints out a log of the changes made to the resume by the LLM
         """
-        with open(os.path.join('static', 'base_resume.json'), 'r') as f:
-            json_str = f.read()
-        base_resume = Resume.model_validate_json(json_str)
+        with stage("base_resume_load"):
+            base_resume = self.repository.get(self.resume_name).resume
 
         # use injected AI interface to generate tailored resume
-        result: ResumeCustomizationResult = ai_interface.generate_customized_resume(base_resume, job_info)
+        result: ResumeCustomizationResult = await self.ai_interface.generate_customized_resume(
+            base_resume, job_info, on_item=on_item
+        )
         changelog = result.changelog
         tailored_resume = result.resume
 
@@ -0,0 +1,200 @@
+import json
+import re
+import copy
+from typing import Collection
+
+from pydantic import ValidationError
+
+from resumecompiler.models import *
+
+
+# experiences[2].bullets[1], skills.sections["Programming Languages"], ...
+PATH_TOKEN = re.compile(r'\.?([A-Za-z_]\w*)|\[(\d+)\]|\[("(?:[^"\\]|\\.)*")\]')
+
+
+class PatchError(ValueError):
+    pass
+
+
+def parse_path(path: str) -> list[str | int]:
+    """
+    Split a field address like experiences[2].bullets[1] into ['experiences', 2, 'bullets', 1]
+    """
+    tokens, pos = [], 0
+    while pos < len(path):
+        match = PATH_TOKEN.match(path, pos)
+        if match is None or match.end() == pos:
+            raise PatchError(f"Malformed path {path!r} at position {pos}")
+        name, index, quoted = match.groups()
+        if name is not None:
+            tokens.append(name)
+        elif index is not None:
+            tokens.append(int(index))
+        else:
+            tokens.append(json.loads(quoted))
+        pos = match.end()
+    if not tokens:
+        raise PatchError("Empty path")
+    return tokens
+
+
+def format_path(tokens: list[str | int]) -> str:
+    """
+    Inverse of parse_path. Skill section names are always quoted since they may contain spaces.
+    """
+    path = ""
+    for i, token in enumerate(tokens):
+        if isinstance(token, int):
+            path += f"[{token}]"
+        elif i > 0 and tokens[i - 1] == "sections":
+            path += f"[{json.dumps(token)}]"
+        else:
+            path += f".{token}" if path else token
+    return path
+
+
+def _resolve(data: dict, tokens: list[str | int]) -> tuple[dict | list, str | int]:
+    """
+    Walk to the container holding the addressed field. Every step must already exist.
+    """
+    container = data
+    for depth, token in enumerate(tokens):
+        is_last = depth == len(tokens) - 1
+        if isinstance(token, int):
+            if not isinstance(container, list) or not 0 <= token < len(container):
+                raise PatchError(f"No item {format_path(tokens[:depth + 1])}")
+        elif not isinstance(container, dict) or token not in container:
+            raise PatchError(f"No field {format_path(tokens[:depth + 1])}")
+        if is_last:
+            return container, token
+        container = container[token]
+
+
+def _editable(tokens: list[str | int]) -> bool:
+    """
+    True for the fields the model may edit: single bullets, project skill lines and skill
+    sections, a whole bullet list (a reorder) and the skill sections (a regrouping).
+    Headings, dates and whole entries are never edited.
+    """
+    match tokens:
+        case ["education", "bullets", int()] | ["education", "bullets"]:
+            return True
+        case ["experiences" | "projects", int(), "bullets", int()] | ["experiences" | "projects", int(), "bullets"]:
+            return True
+        case ["projects", int(), "skills"] | ["skills", "sections", str()] | ["skills", "sections"]:
+            return True
+    return False
+
+
+def _matches_type(old, new) -> bool:
+    if isinstance(old, str):
+        return isinstance(new, str)
+    if isinstance(old, list):
+        return all(isinstance(item, str) for item in old) \
+            and isinstance(new, list) and all(isinstance(item, str) for item in new)
+    if isinstance(old, dict):
+        return all(isinstance(item, str) for item in old.values()) \
+            and isinstance(new, dict) and all(isinstance(item, str) for item in new.values())
+    return False
+
+
+def _as_text(value: str | list[str] | dict[str, str]) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        return "; ".join(value)
+    return "; ".join(f"{k}: {v}" for k, v in value.items())
+
+
+def apply_edit(data: dict, edit: ResumeEdit) -> ChangeLog:
+    """
+    Apply one edit in place to a dumped Resume dict.
+    :return: changelog entry describing the edit
+    :raises PatchError: if the path doesn't exist, can't be edited or the value has the wrong shape
+    """
+    tokens = parse_path(edit.path)
+    if not _editable(tokens):
+        raise PatchError(f"{edit.path} can't be edited")
+    container, last = _resolve(data, tokens)
+    old = container[last]
+    if not _matches_type(old, edit.value):
+        raise PatchError(f"Value for {edit.path} must be a {type(old).__name__} of strings")
+    container[last] = edit.value
+    return ChangeLog(before=_as_text(old), after=_as_text(edit.value), reason=edit.reason)
+
+
+def preview_edit(base_resume: Resume, edit: ResumeEdit, allowed: Collection[str] | None = None) -> ChangeLog:
+    """
+    Changelog entry for an edit without applying it, validating the path on the way.
+    """
+    if allowed is not None and not _is_allowed(edit.path, allowed):
+        raise PatchError(f"{edit.path} is not one of the listed fields")
+    return apply_edit(base_resume.model_dump(), edit)
+
+
+def apply_edits(
+        base_resume: Resume,
+        edits: list[ResumeEdit],
+        allowed: Collection[str] | None = None
+    ) -> tuple[Resume, list[ChangeLog]]:
+    """
+    Apply edits to a copy of base_resume. Edits with invalid paths or values are
+    skipped (and printed) rather than failing the whole generation.
+    :param allowed: only these fields may change, e.g. the ones the prompt listed
+    """
+    data = base_resume.model_dump()
+    resume, changelog = base_resume, []
+    for edit in edits:
+        try:
+            if allowed is not None and not _is_allowed(edit.path, allowed):
+                raise PatchError("not one of the listed fields")
+            # edits go to a copy, so one that leaves an invalid resume is dropped on its own
+            edited = copy.deepcopy(data)
+            change = apply_edit(edited, edit)
+            resume = _validate(edited)
+        except PatchError as e:
+            print(f"Rejected edit to {edit.path!r}: {e}")
+            continue
+        data = edited
+        changelog.append(change)
+    return resume, changelog
+
+
+def _validate(data: dict) -> Resume:
+    try:
+        return Resume.model_validate(data)
+    except ValidationError as e:
+        raise PatchError(f"edited resume is invalid: {e.errors()[0]['msg']}") from e
+
+
+def _is_allowed(path: str, allowed: Collection[str]) -> bool:
+    return format_path(parse_path(path)) in allowed
+
+
+def addressed_fields(resume: Resume, paths: Collection[str] | None = None) -> str:
+    """
+    One line per editable field as `path: value`, giving the model stable addresses to edit.
+    :param paths: only list these fields (and the headings of their entries)
+    """
+    def listed(path: str) -> bool:
+        return paths is None or path in paths
+
+    lines = []
+    for i, bullet in enumerate(resume.education.bullets):
+        if listed(f"education.bullets[{i}]"):
+            lines.append(f"education.bullets[{i}]: {json.dumps(bullet)}")
+    for name, items in (("experiences", resume.experiences), ("projects", resume.projects)):
+        for i, item in enumerate(items):
+            fields = []
+            if isinstance(item, Project) and listed(f"{name}[{i}].skills"):
+                fields.append(f"{name}[{i}].skills: {json.dumps(item.skills)}")
+            for j, bullet in enumerate(item.bullets):
+                if listed(f"{name}[{i}].bullets[{j}]"):
+                    fields.append(f"{name}[{i}].bullets[{j}]: {json.dumps(bullet)}")
+            if fields:
+                lines += [f"# {name}[{i}]: {item.title}", *fields]
+    for section, items in resume.skills.sections.items():
+        path = format_path(['skills', 'sections', section])
+        if listed(path):
+            lines.append(f"{path}: {json.dumps(items)}")
+    return "\n".join(lines)
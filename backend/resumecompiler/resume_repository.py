@@ -0,0 +1,172 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable
+
+from resumecompiler.models import *
+from resumecompiler.resume_patch import addressed_fields
+from resumecompiler.relevance import RelevanceIndex
+
+
+RESUME_DIR = os.path.join("static")
+DEFAULT_RESUME = "base_resume"
+
+
+def resume_digest(resume: Resume) -> str:
+    """
+    Hash of a resume's canonical JSON. Structurally equal resumes have the same digest,
+    whichever posting they were tailored to.
+    """
+    return hashlib.sha256(resume.model_dump_json().encode('utf-8')).hexdigest()
+
+
+@dataclass(frozen=True)
+class BaseResume:
+    """
+    One version of a parsed base resume, with the serialized forms the pipeline
+    needs computed once instead of on every request.
+    """
+    name: str
+    resume: Resume
+    # hash of the canonical JSON, stable across whitespace-only edits of the file
+    digest: str
+    # prompt forms: full-mode JSON and patch-mode addressed fields
+    prompt_json: str
+    prompt_fields: str
+    # BM25 index of its bullets and skills, to rank them against postings
+    relevance: RelevanceIndex
+
+    @classmethod
+    def build(cls, name: str, resume: Resume) -> "BaseResume":
+        return cls(
+            name=name,
+            resume=resume,
+            digest=resume_digest(resume),
+            prompt_json=resume.model_dump_json(indent=2),
+            prompt_fields=addressed_fields(resume),
+            relevance=RelevanceIndex(resume),
+        )
+
+
+# id(resume) -> entry for every resume served by any repository, to find its cached prompt forms
+_served: dict[int, BaseResume] = {}
+
+
+def resume_entry(resume: Resume) -> BaseResume:
+    """
+    Cached forms of a resume served by a repository. Other resumes
+    (e.g. tailored ones) get theirs computed on the spot.
+    """
+    entry = _served.get(id(resume))
+    if entry is not None and entry.resume is resume:
+        return entry
+    return BaseResume.build("", resume)
+
+
+@dataclass
+class _FileState:
+    mtime_ns: int
+    size: int
+    file_hash: str
+
+
+class ResumeRepository:
+    """
+    Parses and validates each base resume once and serves the same immutable
+    instance to every request. Resumes on disk (root/<name>.json) are reloaded
+    when their mtime or size changes and their content hash differs, so edits
+    show up without a restart. Other resumes are registered from memory or
+    fetched through loader(name) -> JSON, e.g. from Redis for tenants.
+    At most max_entries resumes are kept, least recently used are dropped first.
+    """
+
+    def __init__(
+            self,
+            root: str = RESUME_DIR,
+            max_entries: int | None = None,
+            loader: Callable[[str], str | bytes | None] | None = None
+        ):
+        self.root = root
+        self.max_entries = max_entries or int(os.getenv("RESUME_CACHE_SIZE", 256))
+        self.loader = loader
+        self._entries: OrderedDict[str, BaseResume] = OrderedDict()
+        self._files: dict[str, _FileState] = {}
+        self._lock = threading.Lock()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, f"{name}.json")
+
+    def get(self, name: str = DEFAULT_RESUME) -> BaseResume:
+        """
+        :return: current version of the named resume
+        :raises KeyError: if it is neither registered nor on disk
+        """
+        entry = self._entries.get(name)
+        state = self._files.get(name)
+        if entry is not None and state is None:
+            # registered from memory or loaded, never changes
+            self._entries.move_to_end(name)
+            return entry
+
+        try:
+            stat = os.stat(self.path(name))
+        except FileNotFoundError:
+            raw = self.loader(name) if self.loader is not None else None
+            if raw is None:
+                raise KeyError(f"Unknown resume {name}")
+            return self.put(name, raw)
+        if entry is not None and (stat.st_mtime_ns, stat.st_size) == (state.mtime_ns, state.size):
+            self._entries.move_to_end(name)
+            return entry
+
+        with self._lock:
+            with open(self.path(name), "rb") as f:
+                raw = f.read()
+            file_hash = hashlib.sha256(raw).hexdigest()
+            state = self._files.get(name)
+            entry = self._entries.get(name)
+            if entry is None or state is None or state.file_hash != file_hash:
+                entry = self._store(name, Resume.model_validate_json(raw))
+                print(f"Loaded base resume {name} ({entry.digest[:12]})")
+            self._files[name] = _FileState(stat.st_mtime_ns, stat.st_size, file_hash)
+            return entry
+
+    def put(self, name: str, resume_json: str | bytes) -> BaseResume:
+        """
+        Register (or replace) a resume that doesn't live on disk.
+        :raises pydantic.ValidationError: if it isn't a valid Resume
+        """
+        resume = Resume.model_validate_json(resume_json)
+        with self._lock:
+            self._files.pop(name, None)
+            return self._store(name, resume)
+
+    def _store(self, name: str, resume: Resume) -> BaseResume:
+        entry = BaseResume.build(name, resume)
+        self._drop(name)
+        self._entries[name] = entry
+        _served[id(resume)] = entry
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+        return entry
+
+    def _drop(self, name: str) -> None:
+        old = self._entries.pop(name, None)
+        self._files.pop(name, None)
+        if old is not None and _served.get(id(old.resume)) is old:
+            del _served[id(old.resume)]
+
+
+_repository: ResumeRepository | None = None
+
+
+def get_resume_repository() -> ResumeRepository:
+    """
+    Process-wide repository, so every job shares the parsed base resumes.
+    """
+    global _repository
+    if _repository is None:
+        _repository = ResumeRepository()
+    return _repository
@@ -0,0 +1,244 @@
+import hashlib
+import html
+import os
+import re
+from array import array
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import redis
+import redis.asyncio
+
+from resumecompiler.models import *
+from resumecompiler.metrics import record_cache
+from resumecompiler.resume_repository import resume_entry
+
+
+# ==================================================
+# ================= Normalization ==================
+# ==================================================
+
+
+TRACKING_PARAMS = re.compile(r"^(utm_.*|gclid|fbclid|msclkid|trk.*|ref|refid|src|source|campaign.*)$", re.I)
+URL_PATTERN = re.compile(r"https?://\S+")
+BOILERPLATE_LINES = re.compile(
+    r"^(apply( now)?|save( job)?|share( this job)?|report( this)? job|show (more|less)|"
+    r"easy apply|sign in|see who .* hired for this role|\d+ applicants?|posted \d+ \w+ ago)$"
+)
+
+
+def _strip_tracking(match: re.Match) -> str:
+    parts = urlsplit(match.group(0))
+    query = [(k, v) for k, v in parse_qsl(parts.query) if not TRACKING_PARAMS.match(k)]
+    return urlunsplit((parts.scheme, parts.netloc, parts.path.rstrip('/'), urlencode(query), ""))
+
+
+def normalize_job_info(job_info: str) -> str:
+    """
+    Canonical form of a pasted job posting: unescaped, lowercased, tracking
+    parameters removed from URLs, job-board chrome lines dropped, whitespace collapsed.
+    """
+    text = html.unescape(job_info).lower()
+    text = URL_PATTERN.sub(_strip_tracking, text)
+    lines = []
+    for line in text.splitlines():
+        line = " ".join(line.split())
+        if line and not BOILERPLATE_LINES.match(line):
+            lines.append(line)
+    return "\n".join(lines)
+
+
+# ==================================================
+# ================= MinHash + LSH ==================
+# ==================================================
+
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+WORD_PATTERN = re.compile(r"[a-z0-9+#.]+")
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def shingles(text: str, size: int = 5) -> set[str]:
+    """
+    Overlapping word n-grams of the text. Short texts fall back to single words.
+    """
+    words = WORD_PATTERN.findall(text)
+    if len(words) < size:
+        return set(words)
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 128, seed: int = 42):
+        # deterministic permutation coefficients so signatures are stable across processes
+        self.num_perm = num_perm
+        self.permutations = [
+            (_hash64(f"{seed}:a:{i}") % (MERSENNE_PRIME - 1) + 1, _hash64(f"{seed}:b:{i}") % MERSENNE_PRIME)
+            for i in range(num_perm)
+        ]
+
+    def signature(self, tokens: set[str]) -> array:
+        hashes = [_hash64(token) for token in tokens]
+        if not hashes:
+            return array('Q', [MAX_HASH] * self.num_perm)
+        return array('Q', (
+            min(((a * h + b) % MERSENNE_PRIME) & MAX_HASH for h in hashes)
+            for a, b in self.permutations
+        ))
+
+    @staticmethod
+    def similarity(sig_a: array, sig_b: array) -> float:
+        """
+        Estimated Jaccard similarity of the two shingle sets.
+        """
+        return sum(a == b for a, b in zip(sig_a, sig_b)) / len(sig_a)
+
+
+def similarity_threshold() -> float:
+    return float(os.getenv("SIMILARITY_THRESHOLD", 0.85))
+
+
+class SimilarityIndex:
+    """
+    Redis-backed LSH index from job postings to the customization they produced.
+    Postings whose estimated shingle similarity is above the threshold reuse the stored result.
+    """
+
+    def __init__(
+            self,
+            client: redis.Redis,
+            threshold: float | None = None,
+            num_perm: int = 128,
+            bands: int = 32,
+            ttl_seconds: int | None = None,
+            prefix: str = "simcache"
+        ):
+        assert num_perm % bands == 0, "num_perm must be divisible by bands"
+        self.r = client
+        self.threshold = threshold if threshold is not None else similarity_threshold()
+        self.ttl_seconds = ttl_seconds or int(os.getenv("SIMILARITY_CACHE_TTL", 7 * 24 * 3600))
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.prefix = prefix
+        self.stats_key = f"{prefix}:stats"
+
+    def _band_keys(self, namespace: str, signature: array) -> list[str]:
+        keys = []
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            keys.append(f"{self.prefix}:{namespace}:band:{band}:{hashlib.blake2b(chunk, digest_size=8).hexdigest()}")
+        return keys
+
+    def lookup(self, namespace: str, job_info: str) -> tuple[ResumeCustomizationResult | None, float]:
+        """
+        Find the most similar previously customized posting.
+        :return: (stored result if above threshold else None, best similarity seen)
+        """
+        signature = self.hasher.signature(shingles(normalize_job_info(job_info)))
+
+        pipe = self.r.pipeline()
+        for band_key in self._band_keys(namespace, signature):
+            pipe.smembers(band_key)
+        candidates = set().union(*pipe.execute())
+
+        best_id, best_similarity = None, 0.0
+        if candidates:
+            candidates = sorted(candidates)
+            stored = self.r.mget([f"{self.prefix}:{namespace}:sig:{c.decode()}" for c in candidates])
+            for candidate, raw_signature in zip(candidates, stored):
+                if raw_signature is None:
+                    continue
+                similarity = MinHasher.similarity(signature, array('Q', raw_signature))
+                if similarity > best_similarity:
+                    best_id, best_similarity = candidate.decode(), similarity
+
+        result = None
+        if best_id is not None and best_similarity >= self.threshold:
+            raw_result = self.r.get(f"{self.prefix}:{namespace}:result:{best_id}")
+            if raw_result is not None:
+                result = ResumeCustomizationResult.model_validate_json(raw_result)
+
+        self._record(result is not None, best_similarity)
+        return result, best_similarity
+
+    def store(self, namespace: str, job_info: str, result: ResumeCustomizationResult) -> None:
+        normalized = normalize_job_info(job_info)
+        entry_id = hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:32]
+        signature = self.hasher.signature(shingles(normalized))
+
+        pipe = self.r.pipeline()
+        pipe.set(f"{self.prefix}:{namespace}:sig:{entry_id}", signature.tobytes(), ex=self.ttl_seconds)
+        pipe.set(f"{self.prefix}:{namespace}:result:{entry_id}", result.model_dump_json(), ex=self.ttl_seconds)
+        for band_key in self._band_keys(namespace, signature):
+            pipe.sadd(band_key, entry_id)
+            pipe.expire(band_key, self.ttl_seconds)
+        pipe.execute()
+
+    def _record(self, hit: bool, similarity: float) -> None:
+        # similarity histogram in 0.05 buckets, to tune SIMILARITY_THRESHOLD
+        bucket = f"similarity_le_{min(1.0, (int(similarity * 20) + 1) / 20):.2f}"
+        pipe = self.r.pipeline()
+        pipe.hincrby(self.stats_key, "hits" if hit else "misses", 1)
+        pipe.hincrby(self.stats_key, bucket, 1)
+        pipe.execute()
+        record_cache("similarity", hit)
+        print(f"Similarity cache {'hit' if hit else 'miss'} (best similarity {similarity:.3f}, threshold {self.threshold})")
+
+    def stats(self) -> dict[str, int]:
+        return {k.decode(): int(v) for k, v in self.r.hgetall(self.stats_key).items()}
+
+
+async def read_similarity_stats(client: redis.asyncio.Redis, prefix: str = "simcache") -> dict[str, int]:
+    """
+    SimilarityIndex.stats through an async client, for the web server
+    """
+    return {k.decode(): int(v) for k, v in (await client.hgetall(f"{prefix}:stats")).items()}
+
+
+# ==================================================
+# ============ Caching AI interface ================
+# ==================================================
+
+
+def cache_namespace(resume_digest: str, model: str) -> str:
+    return hashlib.sha256(f"{resume_digest}:{model}".encode('utf-8')).hexdigest()[:16] if model else resume_digest[:16]
+
+
+class SimilarityCachedAIInterface(BaseAIInterface):
+    """
+    Wraps another AI interface, skipping the LLM for near-duplicate postings.
+    Entries are namespaced by the base resume and the model that produced them, so
+    each tenant's resume gets its own entries and editing it invalidates them.
+    """
+
+    def __init__(self, ai_interface: BaseAIInterface, index: SimilarityIndex):
+        self.ai_interface = ai_interface
+        self.index = index
+
+    async def generate_customized_resume(
+            self,
+            base_resume: Resume,
+            job_info: str,
+            on_item: ItemCallback | None = None
+        ) -> ResumeCustomizationResult:
+        digest = resume_entry(base_resume).digest
+        model = getattr(self.ai_interface, "model", "")
+        cached, _ = self.index.lookup(cache_namespace(digest, model), job_info)
+        if cached is not None:
+            return cached
+
+        result = await self.ai_interface.generate_customized_resume(base_resume, job_info, on_item=on_item)
+        if result.truncated:
+            # incomplete, so not worth handing to similar postings
+            return result
+        # a model router may have fallen back to another model, whose results are kept apart
+        produced_by = getattr(self.ai_interface, "used_model", None) or model
+        self.index.store(cache_namespace(digest, produced_by), job_info, result)
+        return result
+
+    def name(self) -> str:
+        return f"Similarity Cached {self.ai_interface.name()}"
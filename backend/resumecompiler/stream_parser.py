@@ -0,0 +1,171 @@
+import json
+from dataclasses import dataclass, field
+from typing import Callable
+
+from pydantic import BaseModel, ValidationError
+
+from resumecompiler.models import *
+
+
+JSONPath = tuple[str | int, ...]
+
+
+@dataclass
+class _Frame:
+    is_object: bool
+    start: int
+    path: JSONPath
+    key: str | None = None
+    index: int = 0
+    expecting_key: bool = field(default=True)
+
+
+class IncrementalJSONParser:
+    """
+    Incremental scanner for a single streamed JSON document.
+
+    Text can be fed in arbitrary chunks; whenever an object or array closes,
+    on_value is called with its path from the root and its raw JSON text.
+    Anything before the first '{' (e.g. a ```json fence) is skipped.
+    """
+
+    def __init__(self, on_value: Callable[[JSONPath, str], None]):
+        self.on_value = on_value
+        self.buffer: list[str] = []
+        self.stack: list[_Frame] = []
+        self.started = False
+        self.done = False
+
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+
+    def feed(self, text: str) -> None:
+        for char in text:
+            self._consume(char)
+
+    def _consume(self, char: str) -> None:
+        if self.done:
+            return
+        if not self.started:
+            if char != '{':
+                return
+            self.started = True
+        self.buffer.append(char)
+
+        if self._in_string:
+            if self._escaped:
+                self._escaped = False
+            elif char == '\\':
+                self._escaped = True
+            elif char == '"':
+                self._in_string = False
+                frame = self.stack[-1] if self.stack else None
+                if frame is not None and frame.is_object and frame.expecting_key:
+                    raw_key = "".join(self.buffer[self._string_start:])
+                    try:
+                        frame.key = json.loads(raw_key)
+                    except ValueError:
+                        # e.g. an invalid escape, left to the repair stage
+                        frame.key = raw_key[1:-1]
+            return
+
+        if char == '"':
+            self._in_string = True
+            self._string_start = len(self.buffer) - 1
+        elif char in '{[':
+            self.stack.append(_Frame(char == '{', len(self.buffer) - 1, self._child_path()))
+        elif char in '}]':
+            frame = self.stack.pop()
+            self.on_value(frame.path, "".join(self.buffer[frame.start:]))
+            if not self.stack:
+                self.done = True
+        elif char == ':':
+            self.stack[-1].expecting_key = False
+        elif char == ',':
+            frame = self.stack[-1]
+            if frame.is_object:
+                frame.expecting_key = True
+            else:
+                frame.index += 1
+
+    def _child_path(self) -> JSONPath:
+        if not self.stack:
+            return ()
+        parent = self.stack[-1]
+        return parent.path + ((parent.key,) if parent.is_object else (parent.index,))
+
+    @property
+    def text(self) -> str:
+        return "".join(self.buffer)
+
+
+class StreamingResultParser:
+    """
+    Validates pieces of a streamed ResumeCustomizationResult (or ResumePatchResult) as soon as they close,
+    and reports each one through on_item(kind, index, model).
+    If strict, raises ValueError from feed() on the first fragment that doesn't meet the schema,
+    so a bad generation can be aborted without waiting for the rest of it. Otherwise such
+    fragments are just not reported, and left to be repaired once the response is complete.
+    A response cut off at max_tokens is reported as on_item("truncated", None, Truncation) by truncate().
+    """
+
+    OBJECT_PATHS: dict[JSONPath, tuple[str, type[BaseModel]]] = {
+        ('resume', 'education'): ('education', Education),
+        ('resume', 'skills'): ('skills', Skills),
+    }
+    LIST_PATHS: dict[JSONPath, tuple[str, type[BaseModel]]] = {
+        ('resume', 'experiences'): ('experience', Experience),
+        ('resume', 'projects'): ('project', Project),
+        ('changelog',): ('change', ChangeLog),
+        ('edits',): ('edit', ResumeEdit),
+    }
+
+    def __init__(self, on_item: ItemCallback | None = None, strict: bool = True):
+        self.on_item = on_item
+        self.strict = strict
+        self.parser = IncrementalJSONParser(self._on_value)
+        self.counts: dict[str, int] = {}
+        self.truncated = False
+
+    def feed(self, text: str) -> None:
+        self.parser.feed(text)
+
+    def truncate(self, max_tokens: int) -> None:
+        """
+        Mark the response as cut off at max_tokens, as soon as the stop reason says so.
+        """
+        if self.truncated:
+            return
+        self.truncated = True
+        if self.on_item is not None:
+            self.on_item("truncated", None, Truncation(max_tokens=max_tokens))
+
+    @property
+    def complete(self) -> bool:
+        return self.parser.done
+
+    @property
+    def text(self) -> str:
+        return self.parser.text
+
+    def _on_value(self, path: JSONPath, raw: str) -> None:
+        # list items are addressed by their parent path plus an index
+        index = None
+        match = self.OBJECT_PATHS.get(path)
+        if match is None and path and isinstance(path[-1], int):
+            index = path[-1]
+            match = self.LIST_PATHS.get(path[:-1])
+        if match is None:
+            return
+
+        kind, model = match
+        try:
+            item = model.model_validate_json(raw)
+        except ValidationError as e:
+            if not self.strict:
+                return
+            raise ValueError(f"Streamed {kind} did not meet the schema: {e}") from e
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        if self.on_item is not None:
+            self.on_item(kind, index, item)
@@ -0,0 +1,346 @@
+import os
+import re
+import hmac
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+
+import redis
+import redis.asyncio
+
+from resumecompiler.models import *
+from resumecompiler.renderer import get_renderer
+from resumecompiler.history import DEFAULT_RETENTION_TIER, RETENTION_TIERS
+from resumecompiler.resume_repository import DEFAULT_RESUME, ResumeRepository, get_resume_repository
+
+
+# Each tenant (user) has its own base resume, LaTeX template and model. Their contents are
+# stored in Redis under their digest, so every web server and worker can load them and
+# they never change once written:
+#   tenant:<id>                    hash {resume, template, model, retention} -> current digests, model
+#                                  and history retention tier
+#   tenantdata:resume:<digest>     base resume JSON
+#   tenantdata:template:<digest>   LaTeX template
+# Tenants that haven't uploaded anything use static/base_resume.json and static/template.tex.
+DEFAULT_TENANT = "default"
+DEFAULT_TEMPLATE = "template"
+TENANT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+# TeX primitives and commands that read or write files other than a package found by name,
+# or that could spell one of those out; a tenant's template may use none of them.
+# \input and \include are allowed with a bare file name, e.g. \input{glyphtounicode}
+TEMPLATE_FILE_ACCESS = re.compile(
+    r"\\(?:input|include)(?![A-Za-z])(?!\s*\{[A-Za-z0-9_-]+\})"
+    r"|\\(?:openin|openout|read|readline|write|immediate|newread|newwrite|closein|closeout"
+    r"|InputIfFileExists|IfFileExists|includegraphics|lstinputlisting|verbatiminput|VerbatimInput"
+    r"|catcode|csname|scantokens|pdffilesize|pdffilemoddate|pdffiledump|pdfmdfivesum"
+    r"|pdfximage|pdfobj|pdfannot|special|directlua|ShellEscape|write18)(?![A-Za-z])"
+    r"|\^\^"
+)
+
+# Each tenant authenticates with a token derived from TENANT_SECRET (see tenant_token), sent
+# as "Authorization: Bearer <token>". Without a secret only the default tenant exists.
+TENANT_SECRET = os.getenv("TENANT_SECRET")
+
+# requests that start new jobs (a whole batch counts once), per tenant per minute
+TENANT_RATE_LIMIT = int(os.getenv("TENANT_RATE_LIMIT", 30))
+RATE_LIMIT_WINDOW_SECONDS = 60
+
+# jobs of one tenant that may use an LLM or compile worker at the same time
+TENANT_MAX_LLM_JOBS = int(os.getenv("TENANT_MAX_LLM_JOBS", 4))
+TENANT_MAX_COMPILE_JOBS = int(os.getenv("TENANT_MAX_COMPILE_JOBS", 2))
+
+
+# Models from fastest and cheapest to most capable, see ModelRouter
+MODEL_TIERS = (
+    "claude-3-5-haiku-20241022",
+    "claude-sonnet-4-20250514",
+    "claude-opus-4-1-20250805",
+)
+# per-request budget names -> primary model
+BUDGET_TIERS = {
+    "fast": MODEL_TIERS[0],
+    "balanced": MODEL_TIERS[1],
+    "best": MODEL_TIERS[2],
+}
+
+
+def default_model() -> str:
+    return os.getenv("ANTHROPIC_MODEL", MODEL_TIERS[1])
+
+
+def valid_tenant(tenant: str) -> bool:
+    return bool(TENANT_ID_PATTERN.match(tenant))
+
+
+def tenant_token(tenant: str, secret: str | None = None) -> str:
+    """
+    API token of a tenant, given to it by whoever runs the server:
+        python -m resumecompiler.tenants <tenant>
+    :raises ValueError: if there is no TENANT_SECRET
+    """
+    secret = secret or TENANT_SECRET
+    if not secret:
+        raise ValueError("TENANT_SECRET is not set")
+    return hmac.new(secret.encode('utf-8'), tenant.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def authenticated(tenant: str, token: str | None) -> bool:
+    """
+    Whether token proves the caller is tenant. Without TENANT_SECRET, every caller is the
+    default tenant and no other tenant can be used.
+    """
+    if not TENANT_SECRET:
+        return tenant == DEFAULT_TENANT
+    return token is not None and hmac.compare_digest(token, tenant_token(tenant))
+
+
+def tenant_key(tenant: str) -> str:
+    return f"tenant:{tenant}"
+
+
+def resume_data_key(digest: str) -> str:
+    return f"tenantdata:resume:{digest}"
+
+
+def template_data_key(digest: str) -> str:
+    return f"tenantdata:template:{digest}"
+
+
+def content_digest(text: str | bytes) -> str:
+    if isinstance(text, str):
+        text = text.encode('utf-8')
+    return hashlib.sha256(text).hexdigest()
+
+
+@dataclass(frozen=True)
+class TenantProfile:
+    """
+    What a tenant's resumes are generated from. Passed to the workers with each job.
+    resume and template name what to load: the default files, or a digest in Redis.
+    """
+    tenant: str
+    resume: str
+    resume_digest: str
+    template: str
+    template_digest: str
+    model: str
+    # how long the tenant's results stay in its history, see resumecompiler.history
+    retention: str = DEFAULT_RETENTION_TIER
+
+    def job_key(self, normalized_job_info: str) -> str:
+        """
+        Cache key of a job posting for this profile. Tenants with the same resume,
+        template and model share results, and changing any of them gets new ones.
+        """
+        parts = (self.resume_digest, self.template_digest, self.model, normalized_job_info)
+        return hashlib.sha256("\0".join(parts).encode('utf-8')).hexdigest()
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def default_profile(tenant: str = DEFAULT_TENANT) -> TenantProfile:
+    return TenantProfile(
+        tenant=tenant,
+        resume=DEFAULT_RESUME,
+        resume_digest=get_resume_repository().get(DEFAULT_RESUME).digest,
+        template=DEFAULT_TEMPLATE,
+        template_digest=get_renderer().template_digest(),
+        model=default_model(),
+    )
+
+
+def _profile_from_fields(tenant: str, fields: dict[bytes, bytes]) -> TenantProfile:
+    profile = default_profile(tenant)
+    fields = {k.decode(): v.decode() for k, v in fields.items()}
+    resume = fields.get('resume')
+    template = fields.get('template')
+    return TenantProfile(
+        tenant=tenant,
+        resume=resume or profile.resume,
+        resume_digest=resume or profile.resume_digest,
+        template=template or profile.template,
+        template_digest=template or profile.template_digest,
+        model=fields.get('model') or profile.model,
+        retention=fields.get('retention') or profile.retention,
+    )
+
+
+async def get_profile(client: redis.asyncio.Redis, tenant: str) -> TenantProfile:
+    return _profile_from_fields(tenant, await client.hgetall(tenant_key(tenant)))
+
+
+async def put_resume(client: redis.asyncio.Redis, tenant: str, resume_json: str | bytes) -> str:
+    """
+    Store a tenant's base resume.
+    :return: its digest
+    :raises pydantic.ValidationError: if it isn't a valid Resume
+    """
+    # canonical JSON, so formatting-only changes keep the same digest and cached results
+    canonical = Resume.model_validate_json(resume_json).model_dump_json()
+    digest = content_digest(canonical)
+    pipe = client.pipeline(transaction=False)
+    pipe.set(resume_data_key(digest), canonical)
+    pipe.hset(tenant_key(tenant), 'resume', digest)
+    await pipe.execute()
+    return digest
+
+
+async def put_template(client: redis.asyncio.Redis, tenant: str, template: str) -> str:
+    """
+    Store a tenant's LaTeX template: the preamble and heading, up to where the sections start.
+    :return: its digest
+    :raises ValueError: if it doesn't begin the document or reads or writes files
+    """
+    if "\\begin{document}" not in template or "\\end{document}" in template:
+        raise ValueError("Template must contain \\begin{document} and must not end the document")
+    if match := TEMPLATE_FILE_ACCESS.search(template):
+        raise ValueError(f"Template must not read or write files, found {match.group()}")
+    digest = content_digest(template)
+    pipe = client.pipeline(transaction=False)
+    pipe.set(template_data_key(digest), template)
+    pipe.hset(tenant_key(tenant), 'template', digest)
+    await pipe.execute()
+    return digest
+
+
+async def set_model(client: redis.asyncio.Redis, tenant: str, model: str) -> str:
+    """
+    :param model: one of MODEL_TIERS or a BUDGET_TIERS name
+    :return: the model ID stored
+    :raises ValueError: if model is neither
+    """
+    model = BUDGET_TIERS.get(model, model)
+    if model not in MODEL_TIERS and model != default_model():
+        raise ValueError(
+            f"Unknown model {model}, expected one of {', '.join((*MODEL_TIERS, *BUDGET_TIERS))}"
+        )
+    await client.hset(tenant_key(tenant), 'model', model)
+    return model
+
+
+async def set_retention(client: redis.asyncio.Redis, tenant: str, tier: str) -> None:
+    """
+    :raises ValueError: if tier isn't one of RETENTION_TIERS
+    """
+    if tier not in RETENTION_TIERS:
+        raise ValueError(f"Unknown retention tier {tier}, expected one of {', '.join(RETENTION_TIERS)}")
+    await client.hset(tenant_key(tenant), 'retention', tier)
+
+
+# ==================================================
+# ================ Worker-side store ===============
+# ==================================================
+
+
+class TenantStore:
+    """
+    Loads tenants' resumes and templates for the workers, keeping the most recently used
+    ones in memory (RESUME_CACHE_SIZE / TEMPLATE_CACHE_SIZE each), so memory stays bounded
+    however many tenants there are. Contents are addressed by digest, so cached
+    entries never need to be invalidated.
+    """
+
+    def __init__(self, client: redis.Redis, max_resumes: int | None = None, max_templates: int | None = None):
+        self.r = client
+        self.resumes = ResumeRepository(max_entries=max_resumes, loader=self._load_resume)
+        self.max_templates = max_templates or int(os.getenv("TEMPLATE_CACHE_SIZE", 256))
+        self._templates: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load_resume(self, digest: str) -> bytes | None:
+        return self.r.get(resume_data_key(digest))
+
+    def template(self, name: str) -> str:
+        """
+        :raises KeyError: if the template isn't stored
+        """
+        if name == DEFAULT_TEMPLATE:
+            return get_renderer().template()
+        with self._lock:
+            template = self._templates.get(name)
+            if template is not None:
+                self._templates.move_to_end(name)
+                return template
+
+        raw = self.r.get(template_data_key(name))
+        if raw is None:
+            raise KeyError(f"Unknown template {name}")
+        template = raw.decode('utf-8')
+        with self._lock:
+            self._templates[name] = template
+            while len(self._templates) > self.max_templates:
+                self._templates.popitem(last=False)
+        return template
+
+
+# ==================================================
+# =============== Rate & concurrency ===============
+# ==================================================
+
+
+class TenantBusyError(Exception):
+    """
+    The tenant already has as many jobs in this stage as it may, try again later.
+    """
+    pass
+
+
+async def check_rate_limit(
+        client: redis.asyncio.Redis,
+        tenant: str,
+        cost: int = 1,
+        limit: int = TENANT_RATE_LIMIT
+    ) -> bool:
+    """
+    Count cost new jobs against the tenant's limit for the current minute.
+    :return: False if that exceeds the limit (nothing is counted then)
+    """
+    if cost <= 0:
+        return True
+    window = int(time.time() // RATE_LIMIT_WINDOW_SECONDS)
+    key = f"ratelimit:{tenant}:{window}"
+    pipe = client.pipeline(transaction=True)
+    pipe.incrby(key, cost)
+    pipe.expire(key, RATE_LIMIT_WINDOW_SECONDS * 2)
+    used, _ = await pipe.execute()
+    if used > limit:
+        await client.decrby(key, cost)
+        return False
+    return True
+
+
+# holders are a sorted set scored by expiry, so slots of crashed workers free themselves
+ACQUIRE_SLOT_SCRIPT = """
+local now = tonumber(ARGV[1])
+redis.call('zremrangebyscore', KEYS[1], '-inf', now)
+if redis.call('zscore', KEYS[1], ARGV[2]) or redis.call('zcard', KEYS[1]) < tonumber(ARGV[3]) then
+    redis.call('zadd', KEYS[1], now + tonumber(ARGV[4]), ARGV[2])
+    redis.call('expire', KEYS[1], tonumber(ARGV[4]))
+    return 1
+end
+return 0
+"""
+
+
+def slots_key(tenant: str, kind: str) -> str:
+    return f"tenant:{tenant}:slots:{kind}"
+
+
+def acquire_slot(client: redis.Redis, tenant: str, kind: str, holder: str, limit: int, ttl_seconds: int) -> bool:
+    """
+    Take one of the tenant's limit slots for a stage (e.g. 'llm', 'compile') for up to ttl_seconds.
+    """
+    return bool(client.eval(ACQUIRE_SLOT_SCRIPT, 1, slots_key(tenant, kind), time.time(), holder, limit, ttl_seconds))
+
+
+def release_slot(client: redis.Redis, tenant: str, kind: str, holder: str) -> None:
+    client.zrem(slots_key(tenant, kind), holder)
+
+
+if __name__ == "__main__":
+    import sys
+    print(tenant_token(sys.argv[1]))
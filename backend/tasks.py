@@ -1,23 +1,362 @@
-from celery import Celery
-import shutil
+from celery import Task
+from contextlib import contextmanager
+from celery.signals import task_postrun, worker_process_shutdown
+from celery.utils.time import get_exponential_backoff_interval
+import redis
+import asyncio
+import json
+import time
+import sys
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
-assert os.getenv("REDIS_URL"), "Missing REDIS_URL environment variable"
-celery_app = Celery(
-    "worker",
-    broker=os.getenv("REDIS_URL"),
-    backend=os.getenv("REDIS_URL")
+
+from resumecompiler.job_queue import RESULT_TTL_SECONDS, celery_app
+from resumecompiler.construct_latex import (
+    compile_latex_source, compile_latex_source_async, populate_resume, render_resume_source
+)
+from resumecompiler.resume_field_populator import AIResumeFieldPopulator, DefaultResumeFieldPopulator
+from resumecompiler.resume_repository import resume_digest
+from resumecompiler.artifact_store import RenderIndex, cached_artifact, create_artifact_store, render_digest, tex_digest
+from resumecompiler.similarity_cache import SimilarityCachedAIInterface, SimilarityIndex
+from resumecompiler.relevance import RelevanceAIInterface
+from resumecompiler.job_state import JobStore, QUEUED_LEASE_SECONDS
+from resumecompiler.history import HistoryStore
+from resumecompiler.latex_pool import close_compile_pool
+from resumecompiler.tenants import (
+    TENANT_MAX_COMPILE_JOBS, TENANT_MAX_LLM_JOBS, TenantBusyError, TenantProfile, TenantStore,
+    acquire_slot, default_profile, release_slot
 )
+from resumecompiler.models import Resume
+from resumecompiler import metrics
 
-@celery_app.task
-def cleanup_directory(dir_path: str):
+# Redis clients connect on first use, once per worker process (redis-py starts a new
+# pool in each forked child). The LLM SDK is only imported by the first generation,
+# so compile workers never load it.
+r = redis.Redis.from_url(os.getenv("REDIS_URL"))
+jobs = JobStore(r)
+artifacts = create_artifact_store(r)
+rendered = RenderIndex(r)
+history = HistoryStore(r)
+tenant_store = TenantStore(r)
+
+# a tenant at its concurrency limit gets its task re-queued, freeing the worker for others
+TENANT_BUSY_RETRY_SECONDS = 5
+TENANT_BUSY_MAX_RETRIES = 720
+
+# LLM errors are retried with exponential backoff up to this many times
+GENERATE_MAX_RETRIES = 3
+
+
+_loop: asyncio.AbstractEventLoop | None = None
+_similarity_index: SimilarityIndex | None = None
+
+
+def run_async(coro):
+    """
+    Run a coroutine on this worker process's event loop.
+    The loop is kept between tasks so the shared async clients and compile pool stay usable.
+    """
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop.run_until_complete(coro)
+
+
+@worker_process_shutdown.connect
+def shutdown_worker_process(**kwargs) -> None:
+    # stop warm pdflatex workers so no TeX processes outlive the worker
+    if _loop is not None:
+        _loop.run_until_complete(close_compile_pool())
+    metrics.flush(r)
+
+
+@task_postrun.connect
+def flush_metrics(**kwargs) -> None:
+    # one pipelined round trip per task, so stage timings reach GET /metrics promptly
+    try:
+        metrics.flush(r)
+    except redis.RedisError as e:
+        print(f"Could not flush metrics: {e}")
+
+
+def get_ai_interface(model: str, deadline_seconds: float | None = None) -> RelevanceAIInterface:
+    """
+    Local relevance ranking, then the similarity cache in front of a model router, which
+    picks, retries, hedges and falls back between models for this job's budget.
+    """
+    from resumecompiler.model_router import ModelRouter
+
+    global _similarity_index
+    if _similarity_index is None:
+        _similarity_index = SimilarityIndex(r)
+    return RelevanceAIInterface(
+        SimilarityCachedAIInterface(ModelRouter(model, deadline_seconds), _similarity_index)
+    )
+
+
+@contextmanager
+def tenant_slot(profile: TenantProfile, kind: str, token: str, limit: int, ttl_seconds: int):
+    """
+    Hold one of the tenant's slots for a stage, so one tenant can't take every worker.
+    :raises TenantBusyError: if the tenant already uses all of them
+    """
+    if not acquire_slot(r, profile.tenant, kind, token, limit, ttl_seconds):
+        raise TenantBusyError(f'Waiting for your other resumes to finish ({kind})...')
+    try:
+        yield
+    finally:
+        release_slot(r, profile.tenant, kind, token)
+
+
+async def with_lease(key: str, token: str, coro):
+    """
+    Await coro while heartbeating the job's lease, so the job isn't taken over as stalled.
+    """
+    heartbeat = asyncio.create_task(jobs.hold_lease(key, token))
+    try:
+        return await coro
+    finally:
+        heartbeat.cancel()
+
+
+def change_string(change) -> str:
+    return f'>> Original: {change.before}\n' \
+         + f'>> After: {change.after}\n' \
+         + f'>> Reason: {change.reason}'
+
+
+class ResumeJobTask(Task):
+    """
+    Publishes an 'error' event to the job's stream once a task has given up.
+    """
+    failure_message = "Resume job failed"
+
+    def on_retry(self, exc, task_id, args, kwargs, einfo):
+        # keep the key while waiting out the backoff
+        jobs.renew_lease(kwargs['key'], kwargs['token'], QUEUED_LEASE_SECONDS)
+        if isinstance(exc, TenantBusyError):
+            jobs.publish(kwargs['key'], 'progress', str(exc))
+        else:
+            jobs.publish(kwargs['key'], 'progress', f'{exc.__class__.__name__}, retrying...')
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        jobs.publish(kwargs['key'], 'error', f'{self.failure_message}: {exc}')
+
+    def retry_busy(self, exc: TenantBusyError, busy_retries: int):
+        """
+        Re-queue a task whose tenant is at its concurrency limit. These requeues are counted in
+        the busy_retries kwarg and don't use up the task's own max_retries.
+        """
+        return self.retry(
+            exc=exc,
+            countdown=TENANT_BUSY_RETRY_SECONDS,
+            kwargs={**self.request.kwargs, 'busy_retries': busy_retries + 1},
+            max_retries=TENANT_BUSY_MAX_RETRIES + self.request.retries - busy_retries
+        )
+
+
+def _profile(profile: dict | None) -> TenantProfile:
+    # jobs queued before tenants existed carry no profile
+    return TenantProfile(**profile) if profile else default_profile()
+
+
+@celery_app.task(
+    bind=True,
+    base=ResumeJobTask,
+    max_retries=GENERATE_MAX_RETRIES,
+    failure_message="Failed to generate resume"
+)
+def generate_resume_task(
+        self,
+        key: str,
+        job_info: str,
+        token: str,
+        profile: dict | None = None,
+        deadline_seconds: float | None = None,
+        busy_retries: int = 0
+    ) -> str | None:
+    """
+    Generate the tailored .tex source for a job posting with the LLM.
+    :return: rendered .tex source, or None if the PDF already exists or the job was taken over
+    """
+    if not jobs.renew_lease(key, token):
+        print(f"Job {key[:12]} was taken over by another worker, skipping.")
+        return None
+
+    # idempotent: a redelivered or duplicate job doesn't pay for the LLM again
+    artifact = cached_artifact(r.get(key))
+    if artifact and artifacts.exists(artifact):
+        metrics.record_cache("result", True)
+        jobs.publish(key, 'done', json.dumps({'key': key}))
+        return None
+
+    # a posting generated before (whose key expired) is taken from the history, not the LLM
+    profile = _profile(profile)
+    record = history.find(key)
+    if record is not None:
+        jobs.publish(key, 'progress', 'Restoring resume from history...')
+        for change in record.changelog:
+            jobs.publish(key, 'progress', change_string(change))
+        if record.tenant != profile.tenant:
+            # tenants with identical profiles share job keys, but each keeps its own history
+            history.stage(key, profile.tenant, record.job_info, record.resume, record.changelog, profile.retention)
+        return finish_or_render(key, record.resume, profile)
+
+    jobs.set_state(key, 'generating')
+    jobs.publish(key, 'progress', 'Generating AI resume...')
+
+    # stream changes as the model writes them
+    streamed_changes = 0
+    def on_item(kind, index, item):
+        nonlocal streamed_changes
+        if kind == 'change':
+            streamed_changes += 1
+            jobs.publish(key, 'progress', change_string(item))
+        elif kind in ('experience', 'project'):
+            jobs.publish(key, 'progress', f'Tailored {kind}: {item.title}')
+        elif kind == 'truncated':
+            jobs.publish(key, 'truncated', f'Response cut off at {item.max_tokens} tokens, the rest of the resume is left as it was.')
+
+    try:
+        with tenant_slot(profile, 'llm', token, TENANT_MAX_LLM_JOBS, ttl_seconds=600):
+            with metrics.stage("construct"):
+                resume, changelog = run_async(with_lease(key, token, populate_resume(
+                    AIResumeFieldPopulator(
+                        get_ai_interface(profile.model, deadline_seconds),
+                        resume_name=profile.resume,
+                        repository=tenant_store.resumes
+                    ),
+                    job_info=job_info,
+                    on_item=on_item
+                )))
+    except TenantBusyError as e:
+        raise self.retry_busy(e, busy_retries)
+    except Exception as e:
+        # imported by the generation above, so checking costs nothing
+        from resumecompiler.model_router import RETRYABLE_ERRORS
+        if not isinstance(e, RETRYABLE_ERRORS):
+            raise
+        retries = self.request.retries - busy_retries
+        countdown = get_exponential_backoff_interval(factor=1, retries=retries, maximum=600, full_jitter=True)
+        raise self.retry(exc=e, countdown=countdown, max_retries=GENERATE_MAX_RETRIES + busy_retries)
+
+    # send changes that weren't streamed (e.g. reused from the similarity cache)
+    for change in changelog[streamed_changes:]:
+        jobs.publish(key, 'progress', change_string(change))
+
+    history.stage(key, profile.tenant, job_info, resume, changelog, profile.retention)
+    return finish_or_render(key, resume, profile)
+
+
+def finish_or_render(key: str, resume: Resume, profile: TenantProfile) -> str | None:
+    """
+    Finish the job if the resume was compiled before (most often the unchanged base resume,
+    compiled by prewarm_base_task), without rendering it or queueing a compile.
+    :return: rendered .tex source for the compile task, or None if the job is done
     """
-    rm -rf the specified directory. CAREFUL when you call this.
+    render_key = render_digest(resume_digest(resume), profile.template_digest)
+    artifact = rendered.get(render_key)
+    reused = artifact is not None and artifacts.exists(artifact)
+    metrics.record_cache("render", reused)
+    if reused:
+        jobs.publish(key, 'progress', 'Identical resume already compiled, reusing PDF.')
+        finish_job(key, artifact)
+        return None
+
+    # the compile worker may be on another machine, so hand over the source itself
+    tex_source = render_resume_source(
+        resume,
+        template=tenant_store.template(profile.template),
+        on_warning=lambda warning: jobs.publish(key, 'progress', f'Warning: {warning}')
+    )
+    rendered.put(render_key, tex_digest(tex_source))
+    return tex_source
+
+
+@celery_app.task(bind=True, base=ResumeJobTask, failure_message="Failed to compile LaTeX")
+def compile_resume_task(
+        self,
+        tex_source: str | None,
+        key: str,
+        token: str,
+        profile: dict | None = None,
+        busy_retries: int = 0
+    ) -> str | None:
     """
-    if os.path.exists(dir_path) and os.path.isdir(dir_path):
-        shutil.rmtree(dir_path)
-        print(f"Deleted directory: {dir_path}")
+    Compile .tex source to a PDF, store it and point the job key at it.
+    :return: artifact digest of the PDF
+    """
+    if tex_source is None or not jobs.renew_lease(key, token):
+        return None
+
+    # identical renders share one stored PDF
+    digest = tex_digest(tex_source)
+    exists = artifacts.exists(digest)
+    metrics.record_cache("artifact", exists)
+    if exists:
+        jobs.publish(key, 'progress', 'Identical resume already compiled, reusing PDF.')
     else:
-        print(f"Directory not found: {dir_path}")
\ No newline at end of file
+        jobs.set_state(key, 'compiling')
+        jobs.publish(key, 'progress', 'Compiling LaTeX to PDF...')
+
+        # compile in a scratch dir and keep the PDF in memory (blocking on windows)
+        name = f"Resume_{key[:16]}"
+        try:
+            with tenant_slot(_profile(profile), 'compile', token, TENANT_MAX_COMPILE_JOBS, ttl_seconds=120):
+                if sys.platform.startswith("win"):
+                    pdf_bytes = compile_latex_source(tex_source, name)
+                else:
+                    pdf_bytes = run_async(with_lease(key, token, compile_latex_source_async(tex_source, name)))
+        except TenantBusyError as e:
+            raise self.retry_busy(e, busy_retries)
+        with metrics.stage("artifact_write"):
+            artifacts.put(digest, pdf_bytes)
+
+    finish_job(key, digest)
+    return digest
+
+
+@celery_app.task
+def prewarm_base_task(profile: dict | None = None) -> str:
+    """
+    Compile a tenant's base resume as it is, so generations that leave it unchanged
+    are served its PDF straight away. Does nothing if it is already stored.
+    :return: artifact digest of the base resume's PDF
+    """
+    profile = _profile(profile)
+    resume, _ = run_async(populate_resume(
+        DefaultResumeFieldPopulator(profile.resume, repository=tenant_store.resumes)
+    ))
+    render_key = render_digest(resume_digest(resume), profile.template_digest)
+    digest = rendered.get(render_key)
+    if digest is not None and artifacts.exists(digest):
+        return digest
+
+    tex_source = render_resume_source(resume, template=tenant_store.template(profile.template))
+    digest = tex_digest(tex_source)
+    if not artifacts.exists(digest):
+        name = f"Base_{render_key[:16]}"
+        if sys.platform.startswith("win"):
+            pdf_bytes = compile_latex_source(tex_source, name)
+        else:
+            pdf_bytes = run_async(compile_latex_source_async(tex_source, name))
+        with metrics.stage("artifact_write"):
+            artifacts.put(digest, pdf_bytes)
+    rendered.put(render_key, digest)
+    print(f"Base resume of {profile.tenant} compiled ({digest[:12]})")
+    return digest
+
+
+def finish_job(key: str, digest: str) -> None:
+    """
+    Point the job key at its PDF, keep the job in its tenant's history and tell the
+    job's followers it is done.
+    """
+    r.set(key, json.dumps({'artifact': digest}), ex=RESULT_TTL_SECONDS)
+    history.commit(key, digest)
+    created = jobs.get(key).get('created')
+    if created:
+        # from the POST that queued the job to its PDF being available
+        metrics.STAGE_SECONDS.observe(time.time() - float(created), stage="job_total")
+    jobs.publish(key, 'done', json.dumps({'key': key}))
+
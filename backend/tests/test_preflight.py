@@ -0,0 +1,28 @@
+import pytest
+
+from resumecompiler.preflight import check_document
+
+
+def document(body: str) -> str:
+    return "\\documentclass{article}\n\\begin{document}\n" + body + "\n\\end{document}\n"
+
+
+@pytest.mark.parametrize("body", [
+    "\\href{https://example.com/#projects}{\\underline{Portfolio}}",
+    "\\href{https://example.com/a%20b#top}{Site} % a comment",
+    "\\url{https://example.com/#contact}",
+    "Saved 20\\% \\& more \\#1",
+])
+def test_check_document_accepts(body):
+    assert check_document(document(body)) == []
+
+
+@pytest.mark.parametrize("body, message", [
+    ("Ranked #1", "unescaped #"),
+    ("\\href{https://example.com}{#1}", "unescaped #"),
+    ("\\textbf{open", "unbalanced {"),
+    ("closed}", "unbalanced }"),
+    ("\\begin{itemize}\n\\end{enumerate}", "\\begin{itemize} on line 3 ended by \\end{enumerate}"),
+])
+def test_check_document_rejects(body, message):
+    assert [issue.message for issue in check_document(document(body))] == [message]
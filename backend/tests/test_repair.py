@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from resumecompiler.repair import escape_latex, recover_json
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1}', {"a": 1}),
+    ('Sure! Here it is:\n```json\n{"a": [1, 2]}\n```', {"a": [1, 2]}),
+    ('{"a": 1, }', {"a": 1}),
+    ('{"a": [1, 2,]}', {"a": [1, 2]}),
+    ('```json\n{"a": "5\\% off", }\n```', {"a": "5\\% off"}),
+    # truncated: keep whatever was complete
+    ('{"a": 12', {"a": 12}),
+    ('{"a": "unterminated', {"a": "unterminated"}),
+    ('{"a": "x\\', {"a": "x"}),
+    ('{"a": 1, "b"', {"a": 1}),
+    ('{"a": 1, "b": ', {"a": 1}),
+    ('{"a": 1.5e', {}),
+    ('{"a": tr', {}),
+    ('{"a": [1, 2,', {"a": [1, 2]}),
+    ('{"a": {"c": "x", "d', {"a": {"c": "x"}}),
+])
+def test_recover_json(text, expected):
+    assert json.loads(recover_json(text)) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Saved 20% & more", "Saved 20\\% \\& more"),
+    ("C# and F#", "C\\# and F\\#"),
+    ("a_b", "a\\_b"),
+    ("x^2", "x\\textasciicircum{}2"),
+    ("unbalanced {brace", "unbalanced \\{brace"),
+    ("$5 cost", "\\$5 cost"),
+    ("100\\%", "100\\%"),
+    ("\\textbf{bold}", "\\textbf{bold}"),
+    ("\\foo bar", "\\textbackslash{}foo bar"),
+    ("\\href{https://x.com/a_b#c}{link}", "\\href{https://x.com/a_b#c}{link}"),
+    ("$\\sim$5x", "$\\sim$5x"),
+    ("$\\input{/app/.env}$", "\\$\\textbackslash{}input{/app/.env}\\$"),
+])
+def test_escape_latex(text, expected):
+    assert escape_latex(text) == expected
+    assert escape_latex(expected) == expected
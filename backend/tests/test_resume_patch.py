@@ -0,0 +1,63 @@
+import pytest
+
+from resumecompiler.models import Education, Experience, Project, Resume, ResumeEdit, Skills
+from resumecompiler.resume_patch import apply_edits
+
+RESUME = Resume(
+    education=Education(university="State", location="Town", degree="BSc", date="2020", bullets=["GPA 3.9"]),
+    experiences=[Experience(title="Engineer", date="2021", company="Acme", location="Town", bullets=["Built X", "Ran Y"])],
+    projects=[Project(title="Tool", skills="Python", bullets=["Wrote Z"])],
+    skills=Skills(sections={"Languages": "Python, Go"}),
+)
+
+
+def edit(path, value):
+    return ResumeEdit(path=path, value=value, reason="test")
+
+
+@pytest.mark.parametrize("path, value, get", [
+    ("experiences[0].bullets[1]", "Ran Y faster", lambda r: r.experiences[0].bullets[1]),
+    ("experiences[0].bullets", ["Ran Y", "Built X"], lambda r: r.experiences[0].bullets),
+    ("education.bullets[0]", "GPA 4.0", lambda r: r.education.bullets[0]),
+    ("projects[0].skills", "Python, Rust", lambda r: r.projects[0].skills),
+    ("projects[0].bullets[0]", "Wrote Z in Rust", lambda r: r.projects[0].bullets[0]),
+    ('skills.sections["Languages"]', "Python, Go, Rust", lambda r: r.skills.sections["Languages"]),
+    ("skills.sections", {"Backend": "Python, Go"}, lambda r: r.skills.sections),
+])
+def test_apply_edits_applies(path, value, get):
+    resume, changelog = apply_edits(RESUME, [edit(path, value)])
+    assert get(resume) == value
+    assert len(changelog) == 1
+    assert changelog[0].before != changelog[0].after
+
+
+@pytest.mark.parametrize("path, value", [
+    ("experiences[0].title", "CTO"),
+    ("experiences[0]", "anything"),
+    ("experiences", []),
+    ("experiences[3].bullets[0]", "missing entry"),
+    ("experiences[0].bullets[0]", ["wrong", "type"]),
+    ("experiences[0].bullets", "not a list"),
+    ("skills.sections", ["Python"]),
+    ("experiences[0.bullets", "malformed"),
+])
+def test_apply_edits_rejects(path, value):
+    resume, changelog = apply_edits(RESUME, [edit(path, value)])
+    assert resume == RESUME
+    assert changelog == []
+
+
+def test_apply_edits_keeps_valid_edits_next_to_rejected_ones():
+    edits = [edit("experiences[0].title", "CTO"), edit("experiences[0].bullets[0]", "Built X twice")]
+    resume, changelog = apply_edits(RESUME, edits)
+    assert resume.experiences[0].title == "Engineer"
+    assert resume.experiences[0].bullets[0] == "Built X twice"
+    assert len(changelog) == 1
+
+
+def test_apply_edits_allowed():
+    edits = [edit("experiences[0].bullets[0]", "Built X twice"), edit("projects[0].skills", "Rust")]
+    resume, changelog = apply_edits(RESUME, edits, allowed={"projects[0].skills"})
+    assert resume.experiences[0].bullets[0] == "Built X"
+    assert resume.projects[0].skills == "Rust"
+    assert len(changelog) == 1
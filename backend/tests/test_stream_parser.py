@@ -0,0 +1,44 @@
+import pytest
+
+from resumecompiler.models import Truncation
+from resumecompiler.stream_parser import IncrementalJSONParser, StreamingResultParser
+
+DOCUMENT = '```json\n{"a": [1, {"b": "x}\\""}], "c": {"d": [2]}}\n```'
+
+EXPECTED = [
+    (("a", 1), '{"b": "x}\\""}'),
+    (("a",), '[1, {"b": "x}\\""}]'),
+    (("c", "d"), '[2]'),
+    (("c",), '{"d": [2]}'),
+    ((), '{"a": [1, {"b": "x}\\""}], "c": {"d": [2]}}'),
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, len(DOCUMENT)])
+def test_incremental_parser_chunking(chunk_size):
+    values = []
+    parser = IncrementalJSONParser(lambda path, raw: values.append((path, raw)))
+    for start in range(0, len(DOCUMENT), chunk_size):
+        parser.feed(DOCUMENT[start:start + chunk_size])
+    assert values == EXPECTED
+    assert parser.done
+
+
+@pytest.mark.parametrize("text", ['{"a": [1, 2', '{"a": "}', 'no json here'])
+def test_incremental_parser_incomplete(text):
+    values = []
+    parser = IncrementalJSONParser(lambda path, raw: values.append((path, raw)))
+    parser.feed(text)
+    assert not parser.done
+    assert all(path for path, _ in values)
+
+
+def test_streaming_parser_truncate_reports_once():
+    items = []
+    parser = StreamingResultParser(lambda kind, index, item: items.append((kind, index, item)), strict=False)
+    parser.feed('{"edits": [{"path": "skills.sections", "value": {}, "reason": "x"}, {"pa')
+    parser.truncate(4096)
+    parser.truncate(4096)
+    assert parser.truncated
+    assert [(kind, index) for kind, index, _ in items] == [("edit", 0), ("truncated", None)]
+    assert items[-1][2] == Truncation(max_tokens=4096)